@@ -12,6 +12,7 @@ from fastapi.staticfiles import StaticFiles
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
 from typing import Optional, Dict, Any
+import asyncio
 import os
 import time
 import uuid
@@ -19,12 +20,13 @@ from collections import defaultdict
 from dataclasses import dataclass
 import threading
 from gwplot import Gw, GLFW
+from gwplot.trace import TraceRecorder
 
 
 @dataclass
 class GwInstance:
     plot: object
-    log: list
+    log_cursor: int
     position: str
     last_access: int
 
@@ -33,29 +35,38 @@ class GwInstance:
 gw_instances = defaultdict(GwInstance)
 instance_lock = threading.Lock()
 root = os.path.abspath(os.path.dirname(__file__)).replace("/examples/fastapi_demo", "")
+trace_dir = os.environ.get("GWPLOT_TRACE_DIR")  # Record interaction traces for replay with gwplot.trace
 
 # Template setup
 templates = Jinja2Templates(directory="templates")
 
 
-def flush_gw_log(session_id):
-    if session_id in gw_instances:
-        log_output = gw_instances[session_id].plot.flush_log()
-        if log_output:
-            with instance_lock:
-                gw_instances[session_id].log.append(log_output + "\n")
+def new_log(session_id):
+    """Return GW log messages not yet sent to this session. Only new entries are read from the log"""
+    instance = gw_instances[session_id]
+    entries, instance.log_cursor = instance.plot.log_since(instance.log_cursor)
+    return "".join(e["payload"] + "\n" for e in entries)
 
 
 def create_gw_instance(root, width=800, height=500):
     """Create a new Gw instance with the provided arguments"""
     fa = root + "/tests/ref.fa"
     plot = Gw(fa, canvas_width=width, canvas_height=height, theme="slate", threads=1)
+    plot.set_interaction_quality(scale=0.5, settle_time=0.25)  # Fast frames while scrolling
     plot.add_bam(root + "/tests/small.bam")
     plot.add_track(root + "/tests/test.gff3")
     plot.add_region("chr1", 1, 20000)
+    if trace_dir:
+        plot = TraceRecorder(plot)
     return plot
 
 
+def save_trace(session_id):
+    """Write the interaction trace for a session, if recording"""
+    if trace_dir and session_id in gw_instances and isinstance(gw_instances[session_id].plot, TraceRecorder):
+        gw_instances[session_id].plot.save(os.path.join(trace_dir, f"{session_id}.json"))
+
+
 def cleanup_old_sessions(max_age=3600):
     current_time = time.time()
     to_remove = []
@@ -93,7 +104,7 @@ def get_or_create_gw_instance(sid, width=800, height=500):
     with instance_lock:
         if sid not in gw_instances:
             plot = create_gw_instance(root, width, height)
-            gw_instances[sid] = GwInstance(plot=plot, log=[], position="", last_access=time.time())
+            gw_instances[sid] = GwInstance(plot=plot, log_cursor=0, position="", last_access=time.time())
         gw_instances[sid].last_access = time.time()
         return gw_instances[sid]
 
@@ -104,12 +115,19 @@ def get_image(sid, quality=80):
         return None
     plot = gw_instances[sid].plot
     plot.draw()
-    flush_gw_log(sid)
     img_data = plot.encode_as_jpeg(quality=quality)
     # img_data = plot.encode_as_png(compression_level=6)
     return img_data
 
 
+def iter_images(sid, quality=80):
+    """Yield a quick preview image then the full-detail image, e.g. after jumping to a new locus"""
+    if sid not in gw_instances:
+        return
+    for frame in gw_instances[sid].plot.draw_progressive():
+        yield frame.encode_as_jpeg(quality=quality)
+
+
 # Start cleanup thread
 cleanup_thread = threading.Thread(target=cleanup_task, daemon=True)
 cleanup_thread.start()
@@ -181,7 +199,7 @@ async def home(request: Request):
 async def update_canvas_size(data: CanvasSizeUpdate, session_id: str = Depends(get_session_id)):
     if session_id not in gw_instances:
         plot = create_gw_instance(root)
-        gw_instances[session_id] = GwInstance(plot=plot, log=[], position="", last_access=time.time())
+        gw_instances[session_id] = GwInstance(plot=plot, log_cursor=0, position="", last_access=time.time())
     else:
         plot = gw_instances[session_id].plot
 
@@ -197,7 +215,6 @@ async def update_canvas_size(data: CanvasSizeUpdate, session_id: str = Depends(g
 
     # Use the physical dimensions for the actual canvas rendering
     plot.set_canvas_size(physical_width, physical_height)
-    flush_gw_log(session_id)
     plot.apply_command("refresh")
 
     response = JSONResponse({
@@ -215,12 +232,12 @@ async def update_canvas_size(data: CanvasSizeUpdate, session_id: str = Depends(g
 async def get_output(session_id: str = Depends(get_session_id)):
     if session_id not in gw_instances:
         plot = create_gw_instance(root)
-        gw_instances[session_id] = GwInstance(plot=plot, log=[], position="", last_access=time.time())
+        gw_instances[session_id] = GwInstance(plot=plot, log_cursor=0, position="", last_access=time.time())
 
     output = ""
     if session_id in gw_instances:
-        with instance_lock:
-            output = "".join(gw_instances[session_id].log)
+        entries, _ = gw_instances[session_id].plot.log_since(0)
+        output = "".join(e["payload"] + "\n" for e in entries)
 
     response = JSONResponse({"output": output})
     response.set_cookie(key="session_id", value=session_id)
@@ -231,11 +248,11 @@ async def get_output(session_id: str = Depends(get_session_id)):
 async def clear_output(session_id: str = Depends(get_session_id)):
     if session_id not in gw_instances:
         plot = create_gw_instance(root)
-        gw_instances[session_id] = GwInstance(plot=plot, log=[], position="", last_access=time.time())
+        gw_instances[session_id] = GwInstance(plot=plot, log_cursor=0, position="", last_access=time.time())
 
     if session_id in gw_instances:
-        with instance_lock:
-            gw_instances[session_id].log.clear()
+        instance = gw_instances[session_id]
+        instance.log_cursor = instance.plot.log_cursor
 
     response = JSONResponse({"success": True})
     response.set_cookie(key="session_id", value=session_id)
@@ -283,6 +300,14 @@ class ConnectionManager:
 manager = ConnectionManager()
 
 
+async def send_frame(client_id):
+    """Send a frame drawn at reduced resolution while events are streaming. The scale is sent first so the client can upscale it"""
+    image_data, scale = gw_instances[client_id].plot.encode_frame()
+    await manager.send_json(client_id, {"scale": scale})
+    await manager.send_binary(client_id, image_data)
+    await manager.send_json(client_id, {"log": new_log(client_id), "append": True})
+
+
 @app.websocket("/ws")
 async def websocket_endpoint(websocket: WebSocket):
     print(f"WebSocket endpoint", flush=True)
@@ -310,8 +335,19 @@ async def websocket_endpoint(websocket: WebSocket):
                 await manager.send_json(client_id, {"type": "ping"})
                 last_ping_time = current_time
 
-            # Receive data with a timeout
-            data = await websocket.receive_json()
+            # Receive data, or send the full-resolution frame once events have stopped
+            settle_delay = instance.plot.settle_delay if instance is not None else None
+            if settle_delay is None:
+                data = await websocket.receive_json()
+            else:
+                try:
+                    data = await asyncio.wait_for(websocket.receive_json(), timeout=settle_delay)
+                except asyncio.TimeoutError:
+                    image_data = instance.plot.settle()
+                    if image_data is not None:
+                        await manager.send_json(client_id, {"scale": 1.0})
+                        await manager.send_binary(client_id, image_data)
+                    continue
 
             # Handle ping response
             if data.get("type") == "pong":
@@ -347,13 +383,12 @@ async def websocket_endpoint(websocket: WebSocket):
 
                 # Set the physical dimensions and refresh
                 instance.plot.set_canvas_size(physical_width, physical_height)
-                flush_gw_log(client_id)
                 instance.plot.apply_command("refresh")
 
                 # Generate and send the image
                 image_data = get_image(client_id)
                 await manager.send_binary(client_id, image_data)
-                await manager.send_json(client_id, {"log": "".join(instance.log)})
+                await manager.send_json(client_id, {"log": new_log(client_id), "append": True})
 
             # For all other events, ensure we have an instance
             elif instance is None:
@@ -370,11 +405,8 @@ async def websocket_endpoint(websocket: WebSocket):
                     glfw_action = GLFW.PRESS if data.get("action", "press") == "press" else GLFW.RELEASE
                     glfw_key, scancode = keys[key]
                     instance.plot.key_press(glfw_key, scancode, glfw_action, 0)
-                    flush_gw_log(client_id)
                     if instance.plot.clear_buffer or instance.plot.redraw:
-                        image_data = get_image(client_id)
-                        await manager.send_binary(client_id, image_data)
-                        await manager.send_json(client_id, {"log": "".join(instance.log)})
+                        await send_frame(client_id)
 
             elif event_type == "mouse_event":
                 x_pos = data.get("x")
@@ -384,21 +416,15 @@ async def websocket_endpoint(websocket: WebSocket):
                 if button == "left":
                     glfw_action = GLFW.PRESS if action == "press" else GLFW.RELEASE
                     instance.plot.mouse_event(x_pos, y_pos, GLFW.MOUSE_BUTTON_LEFT, glfw_action)
-                    flush_gw_log(client_id)
                     if glfw_action == GLFW.RELEASE and (instance.plot.clear_buffer or instance.plot.redraw):
-                        image_data = get_image(client_id)
-                        await manager.send_binary(client_id, image_data)
-                        await manager.send_json(client_id, {"log": "".join(instance.log)})
+                        await send_frame(client_id)
                 elif button == "wheel_up" or button == "wheel_down":
                     glfw_action = GLFW.PRESS if data.get("action", "press") == "press" else GLFW.RELEASE
                     arrow_key = "ArrowUp" if button == "wheel_up" else "ArrowDown"
                     glfw_key, scancode = keys[arrow_key]
                     instance.plot.key_press(glfw_key, scancode, glfw_action, 0)
-                    flush_gw_log(client_id)
                     if instance.plot.clear_buffer or instance.plot.redraw:
-                        image_data = get_image(client_id)
-                        await manager.send_binary(client_id, image_data)
-                        await manager.send_json(client_id, {"log": "".join(instance.log)})
+                        await send_frame(client_id)
 
             elif event_type == "update_canvas_size":
                 width = data.get("width", 800)
@@ -413,40 +439,39 @@ async def websocket_endpoint(websocket: WebSocket):
 
                 # Set the physical dimensions for the actual canvas
                 instance.plot.set_canvas_size(physical_width, physical_height)
-                flush_gw_log(client_id)
                 instance.plot.apply_command("refresh")
                 image_data = get_image(client_id)
                 await manager.send_binary(client_id, image_data)
-                await manager.send_json(client_id, {"log": "".join(instance.log)})
+                await manager.send_json(client_id, {"log": new_log(client_id), "append": True})
 
             elif event_type == "command":
                 user_input = data.get("command", "")
                 instance.plot.apply_command(user_input)
-                flush_gw_log(client_id)
 
                 if instance.plot.clear_buffer or instance.plot.redraw:
-                    image_data = get_image(client_id)
-                    await manager.send_binary(client_id, image_data)
-                    await manager.send_json(client_id, {"log": "".join(instance.log)})
+                    for image_data in iter_images(client_id):
+                        await manager.send_binary(client_id, image_data)
+                    await manager.send_json(client_id, {"log": new_log(client_id), "append": True})
                 else:
-                    await manager.send_json(client_id, {"log": "".join(instance.log)})
+                    await manager.send_json(client_id, {"log": new_log(client_id), "append": True})
 
             elif event_type == "clear_output":
-                with instance_lock:
-                    instance.log.clear()
+                instance.log_cursor = instance.plot.log_cursor
                 await manager.send_json(client_id, {"log": ""})
 
             elif event_type == "refresh_image":
                 image_data = get_image(client_id)
                 await manager.send_binary(client_id, image_data)
-                await manager.send_json(client_id, {"log": "".join(instance.log)})
+                await manager.send_json(client_id, {"log": new_log(client_id), "append": True})
 
 
     except WebSocketDisconnect:
         print(f"WebSocket disconnected for client {client_id}")
+        save_trace(client_id)
         manager.disconnect(client_id)
     except Exception as e:
         print(f"WebSocket error for client {client_id}: {str(e)}")
+        save_trace(client_id)
         manager.disconnect(client_id)
 
 
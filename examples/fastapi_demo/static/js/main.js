@@ -371,8 +371,9 @@ function adjustOutputBoxHeight() {
     outputContainer.style.height = (windowHeight - usedHeight) + 'px';
 }
 
-// Process binary image data and draw to canvas
-function processBinaryImage(binaryData) {
+// Process binary image data and draw to canvas. Frames rendered at a reduced scale during
+// interaction are upscaled to the full canvas size
+function processBinaryImage(binaryData, scale = 1) {
     console.log("Processing binary data:", {
         type: Object.prototype.toString.call(binaryData),
         byteLength: binaryData.byteLength || (binaryData.length ? binaryData.length : "unknown"),
@@ -463,8 +464,8 @@ function processBinaryImage(binaryData) {
         const context = canvasManager.context;
 
         // Set canvas dimensions
-        canvas.width = bitmap.width;
-        canvas.height = bitmap.height;
+        canvas.width = Math.round(bitmap.width / scale);
+        canvas.height = Math.round(bitmap.height / scale);
 
         // Calculate CSS dimensions for proper scaling
         const dimensions = getCanvasDimensions();
@@ -486,7 +487,7 @@ function processBinaryImage(binaryData) {
 
         // Draw the bitmap
         context.clearRect(0, 0, canvas.width, canvas.height);
-        context.drawImage(bitmap, 0, 0);
+        context.drawImage(bitmap, 0, 0, canvas.width, canvas.height);
 
         // Update performance metrics
         const renderTime = performance.now() - renderStartTime;
@@ -591,12 +592,21 @@ function updateCanvasSize() {
     adjustOutputBoxHeight();
 }
 
-// Update the output box with new content
-function updateOutputBox(text) {
+// Update the output box with new content. When append is true, text holds only new log lines
+const MAX_OUTPUT_CHARS = 100000;
+function updateOutputBox(text, append = false) {
     const outputBox = document.getElementById('outputBox');
     const isScrolledToBottom = (outputBox.scrollHeight - outputBox.clientHeight) <= (outputBox.scrollTop + 5);
 
-    outputBox.textContent = text;
+    if (append) {
+        if (!text) {
+            return;
+        }
+        const content = outputBox.textContent + text;
+        outputBox.textContent = content.length > MAX_OUTPUT_CHARS ? content.slice(-MAX_OUTPUT_CHARS) : content;
+    } else {
+        outputBox.textContent = text;
+    }
 
     // Auto-scroll if user was at the bottom
     if (isScrolledToBottom) {
@@ -812,6 +822,7 @@ function initializeWebSocket() {
     const maxAttempts = 5;
     const baseRetryDelay = 1000; // Start with 1 second
     let dimensionsSent = false;
+    let frameScale = 1;  // Scale of the next image, sent by the server before the image data
 
     // Handle connection open
     socket.onopen = function() {
@@ -899,9 +910,13 @@ function initializeWebSocket() {
                     }
                 }
 
+                if (jsonData.scale !== undefined) {
+                    frameScale = jsonData.scale;
+                }
+
                 // Update output log
                 if (jsonData.log !== undefined) {
-                    updateOutputBox(jsonData.log);
+                    updateOutputBox(jsonData.log, jsonData.append);
                 }
 
                 return;
@@ -915,6 +930,8 @@ function initializeWebSocket() {
         // Handle binary data (image)
         if (event.data instanceof Blob) {
             console.log("Received binary data", event.data.size, "bytes");
+            const scale = frameScale;
+            frameScale = 1;
 
             // Calculate response time
             const now = performance.now();
@@ -936,7 +953,7 @@ function initializeWebSocket() {
             try {
                 event.data.arrayBuffer().then(buffer => {
                     if (buffer.byteLength > 0) {
-                        processBinaryImage(buffer);
+                        processBinaryImage(buffer, scale);
                         // Record response AFTER image is processed
                         throttleManager.recordResponse(responseTime);
                     } else {
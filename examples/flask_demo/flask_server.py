@@ -8,44 +8,57 @@ from flask import Flask, request, render_template, jsonify, session
 from flask_socketio import SocketIO, emit
 import os
 from gwplot import Gw, GLFW
+from gwplot.trace import TraceRecorder
 import threading
 import time
 import uuid
 from collections import defaultdict
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 
 
 @dataclass
 class GwInstance:
     plot: object
-    log: list
+    log_cursor: int
     position: str
     last_access: int
+    settle_scheduled: bool = False
+    lock: threading.Lock = field(default_factory=threading.Lock)  # Gw is not thread-safe, hold this while using plot
 
 
 gw_instances = defaultdict(GwInstance)
 instance_lock = threading.Lock()
 root = os.path.abspath(os.path.dirname(__file__)).replace("/examples/flask_demo", "")
+trace_dir = os.environ.get("GWPLOT_TRACE_DIR")  # Record interaction traces for replay with gwplot.trace
 
 
-def flush_gw_log(session_id):
-    if session_id in gw_instances:
-        log_output = gw_instances[session_id].plot.flush_log()
-        if log_output:
-            with instance_lock:
-                gw_instances[session_id].log.append(log_output + "\n")
+def new_log(session_id):
+    """Return GW log messages not yet sent to this session. Only new entries are read from the log"""
+    instance = gw_instances[session_id]
+    entries, instance.log_cursor = instance.plot.log_since(instance.log_cursor)
+    return "".join(e["payload"] + "\n" for e in entries)
 
 
 def create_gw_instance(root):
     """Create a new Gw instance with the provided arguments"""
     fa = root + "/tests/ref.fa"
     plot = Gw(fa, canvas_width=1900, canvas_height=600, theme="igv")
+    plot.set_interaction_quality(scale=0.5, settle_time=0.25)  # Fast frames while scrolling
     plot.add_bam(root + "/tests/small.bam")
     plot.add_track(root + "/tests/test.gff3")
     plot.add_region("chr1", 1, 20000)
+    if trace_dir:
+        plot = TraceRecorder(plot)
     return plot
 
 
+def save_trace(session_id):
+    """Write the interaction trace for a session, if recording"""
+    if trace_dir and session_id in gw_instances and isinstance(gw_instances[session_id].plot, TraceRecorder):
+        with gw_instances[session_id].lock:
+            gw_instances[session_id].plot.save(os.path.join(trace_dir, f"{session_id}.json"))
+
+
 def cleanup_old_sessions(max_age=3600):
     current_time = time.time()
     to_remove = []
@@ -97,7 +110,7 @@ def create_app():
         with instance_lock:
             if sid not in gw_instances:
                 plot = create_gw_instance(root)
-                gw_instances[sid] = GwInstance(plot=plot, log=[], position="", last_access=time.time())
+                gw_instances[sid] = GwInstance(plot=plot, log_cursor=0, position="", last_access=time.time())
             gw_instances[sid].last_access = time.time()
             return gw_instances[sid]
 
@@ -119,11 +132,43 @@ def create_app():
         # t0 = time.time()
         plot = gw_instances[sid].plot
         plot.draw()
-        flush_gw_log(sid)
         img_data = plot.encode_as_jpeg(quality=quality)
         # print("Get_image time", time.time() - t0)
         return img_data
 
+    def iter_images(sid, quality=80):
+        """Yield a quick preview image then the full-detail image, e.g. after jumping to a new locus"""
+        if sid not in gw_instances:
+            return
+        for frame in gw_instances[sid].plot.draw_progressive():
+            yield frame.encode_as_jpeg(quality=quality)
+
+    def settle_frame(sid):
+        """Send the full-resolution frame once key and mouse events have stopped"""
+        while sid in gw_instances:
+            instance = gw_instances[sid]
+            with instance.lock:  # Socket handlers may be drawing on the same plot
+                delay = instance.plot.settle_delay
+                if delay is None:
+                    instance.settle_scheduled = False
+                    return
+                if delay <= 0:
+                    image_data = instance.plot.settle()
+                    if image_data is not None:
+                        socketio.emit('image_update', (image_data, {"log": new_log(sid), "append": True, "scale": 1.0}), to=sid)
+                    instance.settle_scheduled = False
+                    return
+            socketio.sleep(delay)
+
+    def emit_frame(sid):
+        """Emit a frame drawn at reduced resolution while events are streaming, then schedule the full-resolution frame"""
+        instance = gw_instances[sid]
+        image_data, scale = instance.plot.encode_frame()
+        emit('image_update', (image_data, {"log": new_log(sid), "append": True, "scale": scale}), binary=True)
+        if scale < 1 and not instance.settle_scheduled:
+            instance.settle_scheduled = True
+            socketio.start_background_task(settle_frame, sid)
+
     @app.route('/update-canvas-size', methods=['POST'])
     def update_canvas_size():
         if 'session_id' not in session:
@@ -131,7 +176,7 @@ def create_app():
         session_id = session['session_id']
         if session_id not in gw_instances:
             plot = create_gw_instance(root)
-            gw_instances[session_id] = GwInstance(plot=plot, log=[], position="", last_access=time.time())
+            gw_instances[session_id] = GwInstance(plot=plot, log_cursor=0, position="", last_access=time.time())
         else:
             plot = gw_instances[session_id].plot
 
@@ -139,12 +184,12 @@ def create_app():
         width = data.get('width', 800)
         height = data.get('height', 500)
         dpr = data.get('dpr', 1.0)
-        if dpr > 1.0:
-            font_size = min(int(12 * min(dpr, 2.0)), 24)
-            plot.set_font_size(font_size)
-        plot.set_canvas_size(int(width), int(height))
-        flush_gw_log(session_id)
-        plot.apply_command("refresh")
+        with gw_instances[session_id].lock:
+            if dpr > 1.0:
+                font_size = min(int(12 * min(dpr, 2.0)), 24)
+                plot.set_font_size(font_size)
+            plot.set_canvas_size(int(width), int(height))
+            plot.apply_command("refresh")
         return jsonify({
             "message": "Canvas size updated successfully",
             "width": width,
@@ -159,11 +204,12 @@ def create_app():
         session_id = session['session_id']
         if session_id not in gw_instances:
             plot = create_gw_instance(root)
-            gw_instances[session_id] = GwInstance(plot=plot, log=[], position="", last_access=time.time())
+            gw_instances[session_id] = GwInstance(plot=plot, log_cursor=0, position="", last_access=time.time())
 
         if session_id in gw_instances:
-            with instance_lock:
-                output = "".join(gw_instances[session_id].log)
+            with gw_instances[session_id].lock:
+                entries, _ = gw_instances[session_id].plot.log_since(0)
+            output = "".join(e["payload"] + "\n" for e in entries)
             return jsonify({"output": output})
         return jsonify({"output": ""})
 
@@ -174,10 +220,11 @@ def create_app():
         session_id = session['session_id']
         if session_id not in gw_instances:
             plot = create_gw_instance(root)
-            gw_instances[session_id] = GwInstance(plot=plot, log=[], position="", last_access=time.time())
+            gw_instances[session_id] = GwInstance(plot=plot, log_cursor=0, position="", last_access=time.time())
         if session_id in gw_instances:
-            with instance_lock:
-                gw_instances[session_id].log.clear()
+            instance = gw_instances[session_id]
+            with instance.lock:
+                instance.log_cursor = instance.plot.log_cursor
         return jsonify({"success": True})
 
     @app.route('/session-info')
@@ -195,8 +242,13 @@ def create_app():
     def handle_connect():
         sid = request.sid
         instance = get_or_create_gw_instance(sid)
-        image_data = get_image(sid)
-        emit('image_update', (image_data, {"log": "".join(instance.log)}), binary=True)
+        with instance.lock:
+            image_data = get_image(sid)
+            emit('image_update', (image_data, {"log": new_log(sid), "append": True}), binary=True)
+
+    @socketio.on('disconnect')
+    def handle_disconnect():
+        save_trace(request.sid)
 
     @socketio.on('key_event')
     def handle_key_event(data):
@@ -208,11 +260,10 @@ def create_app():
         if key not in keys:
             return
 
-        plot.key_press(*keys[key])
-        flush_gw_log(sid)
-        if plot.clear_buffer or plot.redraw:
-            image_data = get_image(sid)
-            emit('image_update', (image_data, {"log": "".join(instance.log)}), binary=True)
+        with instance.lock:
+            plot.key_press(*keys[key])
+            if plot.clear_buffer or plot.redraw:
+                emit_frame(sid)
 
     @socketio.on('mouse_event')
     def handle_mouse_event(data):
@@ -228,12 +279,10 @@ def create_app():
         if button not in keys or action not in keys:
             return
 
-        plot.mouse_event(x_pos, y_pos, keys[button], keys[action])
-        flush_gw_log(sid)
-
-        if keys[action] == GLFW.RELEASE and (plot.clear_buffer or plot.redraw):
-            image_data = get_image(sid)
-            emit('image_update', (image_data, {"log": "".join(instance.log)}), binary=True)
+        with instance.lock:
+            plot.mouse_event(x_pos, y_pos, keys[button], keys[action])
+            if keys[action] == GLFW.RELEASE and (plot.clear_buffer or plot.redraw):
+                emit_frame(sid)
 
     @socketio.on('update_canvas_size')
     def handle_canvas_resize(data):
@@ -245,16 +294,16 @@ def create_app():
         height = data.get('height', 500)
         dpr = data.get('dpr', 1.0)
 
-        if dpr > 1.0:
-            font_size = min(int(12 * min(dpr, 2.0)), 24)
-            plot.set_font_size(font_size)
+        with instance.lock:
+            if dpr > 1.0:
+                font_size = min(int(12 * min(dpr, 2.0)), 24)
+                plot.set_font_size(font_size)
 
-        plot.set_canvas_size(int(width), int(height))
-        flush_gw_log(sid)
-        plot.apply_command("refresh")
+            plot.set_canvas_size(int(width), int(height))
+            plot.apply_command("refresh")
 
-        image_data = get_image(sid)
-        emit('image_update', (image_data, {"log": "".join(instance.log)}), binary=True)
+            image_data = get_image(sid)
+            emit('image_update', (image_data, {"log": new_log(sid), "append": True}), binary=True)
 
     @socketio.on('command')
     def handle_command(data):
@@ -263,29 +312,30 @@ def create_app():
         plot = instance.plot
 
         user_input = data.get('command', '')
-        plot.apply_command(user_input)
-        flush_gw_log(sid)
+        with instance.lock:
+            plot.apply_command(user_input)
 
-        if plot.clear_buffer or plot.redraw:
-            image_data = get_image(sid)
-            emit('image_update', (image_data, {"log": "".join(instance.log)}), binary=True)
-        else:
-            emit('log_update', {'log': "".join(instance.log)})
+            if plot.clear_buffer or plot.redraw:
+                for image_data in iter_images(sid):
+                    emit('image_update', (image_data, {"log": new_log(sid), "append": True}), binary=True)
+            else:
+                emit('log_update', {'log': new_log(sid), 'append': True})
 
     @socketio.on('clear_output')
     def handle_clear_output():
         sid = request.sid
         if sid in gw_instances:
-            with instance_lock:
-                gw_instances[sid].log.clear()
+            with gw_instances[sid].lock:
+                gw_instances[sid].log_cursor = gw_instances[sid].plot.log_cursor
             emit('log_update', {'log': ""})
 
     @socketio.on('refresh_image')
     def handle_refresh_image():
         sid = request.sid
         instance = get_or_create_gw_instance(sid)
-        image_data = get_image(sid)
-        emit('image_update', (image_data, {"log": "".join(instance.log)}), binary=True)
+        with instance.lock:
+            image_data = get_image(sid)
+            emit('image_update', (image_data, {"log": new_log(sid), "append": True}), binary=True)
 
     return app, socketio
 
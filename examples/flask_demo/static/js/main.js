@@ -202,9 +202,9 @@ function adjustOutputBoxHeight() {
     outputContainer.style.height = (windowHeight - usedHeight) + 'px';
 }
 
-// Process binary image data and draw to canvas
-// Process binary image data and draw to canvas
-function processBinaryImage(binaryData) {
+// Process binary image data and draw to canvas. Frames rendered at a reduced scale during
+// interaction are upscaled to the full canvas size
+function processBinaryImage(binaryData, scale = 1) {
     console.log("Processing binary image data:", {
         type: Object.prototype.toString.call(binaryData),
         byteLength: binaryData.byteLength || (binaryData.length ? binaryData.length : "unknown"),
@@ -224,19 +224,21 @@ function processBinaryImage(binaryData) {
             height: bitmap.height
         });
 
-        // Ensure canvas dimensions match the bitmap
-        if (canvasManager.canvas.width !== bitmap.width ||
-            canvasManager.canvas.height !== bitmap.height) {
+        // Ensure canvas dimensions match the full-resolution image
+        const width = Math.round(bitmap.width / scale);
+        const height = Math.round(bitmap.height / scale);
+        if (canvasManager.canvas.width !== width ||
+            canvasManager.canvas.height !== height) {
             console.log("Resizing canvas to match bitmap dimensions");
-            canvasManager.canvas.width = bitmap.width;
-            canvasManager.canvas.height = bitmap.height;
+            canvasManager.canvas.width = width;
+            canvasManager.canvas.height = height;
         }
 
         // Clear the canvas before drawing
         canvasManager.context.clearRect(0, 0, canvasManager.canvas.width, canvasManager.canvas.height);
 
         // Draw the bitmap on the canvas
-        canvasManager.context.drawImage(bitmap, 0, 0);
+        canvasManager.context.drawImage(bitmap, 0, 0, width, height);
         console.log("Bitmap drawn to canvas");
 
         // Record render time
@@ -272,13 +274,13 @@ function initializeWebSocket() {
         });
 
         // First argument is binary data, second has the JSON metadata
-        processBinaryImage(binaryData);
+        processBinaryImage(binaryData, (jsonData && jsonData.scale) || 1);
 
         // Handle any other data like logs
         if (jsonData && jsonData.log) {
             console.log("Log:", jsonData.log);
             // Make sure to update the output box with the log content
-            updateOutputBox(jsonData.log);
+            updateOutputBox(jsonData.log, jsonData.append);
         }
     });
 
@@ -343,12 +345,21 @@ function updateCanvasSize() {
     adjustOutputBoxHeight();
 }
 
-// Update the output box with new content
-function updateOutputBox(text) {
+// Update the output box with new content. When append is true, text holds only new log lines
+const MAX_OUTPUT_CHARS = 100000;
+function updateOutputBox(text, append = false) {
     const outputBox = document.getElementById('outputBox');
     const isScrolledToBottom = (outputBox.scrollHeight - outputBox.clientHeight) <= (outputBox.scrollTop + 5);
 
-    outputBox.textContent = text;
+    if (append) {
+        if (!text) {
+            return;
+        }
+        const content = outputBox.textContent + text;
+        outputBox.textContent = content.length > MAX_OUTPUT_CHARS ? content.slice(-MAX_OUTPUT_CHARS) : content;
+    } else {
+        outputBox.textContent = text;
+    }
 
     // Auto-scroll if user was at the bottom
     if (isScrolledToBottom) {
@@ -21,17 +21,12 @@ for region in rois:
     gw.add_region(*region)
 
 
-# We need to collect reads and hold them in memory for Gw
-# Also the panel index (row, column) is collected
-collections = []
+# Reads are copied into compact storage owned by Gw, so the fetch
+# iterator can be consumed lazily without holding pysam objects in memory
+# The panel index (column, row) is given by the region and bam index
 for region_idx, region in enumerate(rois):
     for bam_idx, bam in enumerate(bams):
-        reads = list(bam.fetch(*region))
-        collections.append((reads, region_idx, bam_idx))
-
-# Now add them to Gw
-for col in collections:
-    gw.add_pysam_alignments(*col)
+        gw.add_pysam_alignments(bam.fetch(*region), region_idx, bam_idx, copy=True)
 
 # Finally draw the screen
 gw.draw()
@@ -3,7 +3,10 @@ from gwplot.glfw_interface import GLFW
 
 from gwplot.interface import (
     Gw,
-    GwPalette
+    GwPalette,
+    ReadFilter,
+    set_core_budget,
+    core_budget
 )
 
 import importlib.metadata
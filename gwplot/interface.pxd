@@ -3,17 +3,24 @@
 from libcpp.string cimport string
 from libcpp.vector cimport vector
 from libcpp.utility cimport pair
-from libc.stdint cimport uint8_t, uint16_t, uint32_t, uint64_t, int32_t
+from libc.stdint cimport uint8_t, uint16_t, uint32_t, uint64_t, int8_t, int32_t, int64_t
 
 cdef extern from "utils.h" namespace "Utils" nogil:
     cdef struct Dims:
         int x, y
 
+    cdef cppclass TrackBlock:
+        string chrom, name, parent, vartype
+        int start, end, strand, level
+        float value
+
     cdef cppclass Region:
         Region() nogil
         string chrom
         int start, end
         int markerPos, markerPosEnd
+        vector[vector[TrackBlock]] featuresInView
+        vector[int] featureLevels
 
 
 cdef extern from "themes.h" namespace "Themes" nogil:
@@ -41,7 +48,7 @@ cdef extern from "themes.h" namespace "Themes" nogil:
 
         int canvas_width, canvas_height;
         int indel_length, ylim, split_view_size, threads, pad, link_op, max_coverage, max_tlen
-        bint log2_cov, tlen_yscale, expand_tracks, vcf_as_tracks, sv_arcs
+        bint log2_cov, tlen_yscale, expand_tracks, vcf_as_tracks, sv_arcs, parse_mods
         float scroll_speed, tab_track_height
         int scroll_right, scroll_left, scroll_down, scroll_up
         int next_region_view, previous_region_view
@@ -75,6 +82,8 @@ cdef extern from "segments.h" namespace "Segs" nogil:
     cdef cppclass Align:
         Align(bam1_t *src)
         bam1_t *delegate
+        int y
+        uint32_t pos, reference_end
 
     void align_init(Align *self, int parse_mods_threshold, bint add_clip_space)
     void align_clear(Align *self)
@@ -88,6 +97,9 @@ cdef extern from "segments.h" namespace "Segs" nogil:
         vector[int] covArr
         int bamIdx
         int regionIdx
+        int vScroll
+        float xScaling, xOffset, yOffset, yPixels, regionPixels
+        bint skipDrawingReads, skipDrawingCoverage
         bint ownsBamPtrs
 
         void makeEmptyMMArray()
@@ -97,6 +109,24 @@ cdef extern from "segments.h" namespace "Segs" nogil:
 
 
 
+cdef extern from "parser.h" namespace "Parse" nogil:
+    cdef cppclass Parser:
+        string filter_str
+
+
+cdef extern from "hts_funcs.h" namespace "HGW" nogil:
+    cdef cppclass GwTrack:
+        string path
+
+    cdef cppclass GwVariantTrack:
+        string path
+
+
+cdef extern from "BS_thread_pool.h" namespace "BS" nogil:
+    cdef cppclass thread_pool:
+        void reset(unsigned int thread_count)
+
+
 cdef extern from "plot_manager.h" namespace "Manager" nogil:
     cdef cppclass GwPlot:
         GwPlot(string reference, vector[string] &bampaths, IniOptions &opts, vector[Region] &regions, vector[string] &track_paths);
@@ -106,25 +136,35 @@ cdef extern from "plot_manager.h" namespace "Manager" nogil:
         vector[char] pixelMemory
         vector[Region] regions
         vector[ReadCollection] collections
+        vector[Parser] filters
+        vector[GwTrack] tracks
+        vector[GwVariantTrack] variantTracks
+        thread_pool pool
 
         bint drawToBackWindow, terminalOutput
         bint redraw
         int fb_width, fb_height
         int regionSelection
         int samMaxY
-        float monitorScale, gap, refSpace
+        float monitorScale, gap, refSpace, sliderSpace
+        float totalTabixY, tabixY, trackY
+        double yScaling
         double xPos_fb, yPos_fb  # mouse position
 
         bint processed
 
         string inputText
 
+        void *window  # GLFWwindow, created by initBack
+
         void initBack(int width, int height)
 
         void clearCollections()
 
         void addBam(string &bam_path)
 
+        void addFilter(string &filter_str)
+
         void removeBam(int index)
 
         void addTrack(string &track_path, bint print_message, bint vcf_as_track, bint bed_as_track)
@@ -133,6 +173,8 @@ cdef extern from "plot_manager.h" namespace "Manager" nogil:
 
         void addVariantTrack(string & path, int startIndex, bint cacheStdin, bint useFullPath)
 
+        void removeVariantTrack(int index)
+
         void removeRegion(int index)
 
         void commandProcessed()
@@ -161,6 +203,8 @@ cdef extern from "plot_manager.h" namespace "Manager" nogil:
 
         void runDraw(bint force_buffered_reads)
 
+        void runDrawOnCanvas(SkCanvas *canvas, bint force_buffered_reads)
+
         void rasterToPng(const char* path)
 
         pair[const uint8_t*, size_t] encodeToPng(int compression_level)
@@ -191,6 +235,45 @@ cdef extern from "plot_manager.h" namespace "Manager" nogil:
 
 
 
+cdef extern from "py_wstream.h" namespace "GwPy" nogil:
+    ctypedef bint (*write_fn)(void *ctx, const void *buffer, size_t size) noexcept
+
+    cdef cppclass CallbackWStream:
+        CallbackWStream(write_fn fn, void *ctx, size_t buffer_size)
+        bint ok
+        size_t bytesWritten()
+        void flush()
+
+    bint appendToString(void *ctx, const void *buffer, size_t size) noexcept
+    bint drawPdf(GwPlot *plot, CallbackWStream *stream, bint force_buffered_reads) except +
+    bint drawSvg(GwPlot *plot, CallbackWStream *stream, bint force_buffered_reads) except +
+
+    cdef cppclass PdfPages:
+        PdfPages(CallbackWStream *stream, const string &title) except +
+        bint addPage(GwPlot *plot, const string &title, bint force_buffered_reads) except +
+        bint close() except +
+
+
+cdef extern from "py_canvas.h" namespace "GwPy" nogil:
+    void drawToRect(GwPlot *plot, char *pixels, int page_width, int page_height,
+                    float x, float y, int width, int height, bint force_buffered_reads) except +
+    void drawBand(GwPlot *plot, char *pixels, int width, int height, int y, int band_height,
+                  bint force_buffered_reads) except +
+    string encodeScaledJpeg(GwPlot *plot, float scale, int quality, bint force_buffered_reads) except +
+    int drawInvalidated(GwPlot *plot, const vector[int] &panels, const vector[int] &columns, bint tracks,
+                        bint force_buffered_reads) except +
+
+
+cdef extern from "py_tracks.h" namespace "GwPy" nogil:
+    void addMemoryTrack(GwPlot *plot, const string &name) except +
+    void setMemoryBlocks(GwTrack &track, const string &chrom, size_t n, const int64_t *starts,
+                         const int64_t *ends, const double *values, const vector[string] *names,
+                         const int8_t *strands, bint label_values, int64_t *order) except +
+    void setMemoryValues(GwTrack &track, const string &chrom, const int64_t *order, size_t n,
+                         const double *values) except +
+    void formatMemoryLabels(GwTrack &track, const string &chrom, int start, int end) except +
+
+
 cdef extern from "htslib/sam.h":
     cdef extern from "htslib/sam.h":
         ctypedef struct bam1_core_t:
@@ -199,7 +282,7 @@ cdef extern from "htslib/sam.h":
             uint16_t bin
             uint8_t qual
             uint8_t l_extranul
-            uint8_t flag
+            uint16_t flag
             uint8_t unused1
             uint8_t l_qname
             uint16_t n_cigar
@@ -214,6 +297,92 @@ cdef extern from "htslib/sam.h":
             uint32_t m_data
             uint8_t *data
             uint64_t id
+            uint32_t mempolicy
+
+        int BAM_USER_OWNS_STRUCT
+        int BAM_USER_OWNS_DATA
+
+        uint8_t *bam_aux_get(const bam1_t *b, const char *tag) nogil
+        int64_t bam_aux2i(const uint8_t *s) nogil
+        char *bam_aux2Z(const uint8_t *s) nogil
+        uint32_t *bam_get_cigar(const bam1_t *b) nogil
+        int64_t bam_cigar2qlen(int n_cigar, const uint32_t *cigar) nogil
+
+        ctypedef struct htsFile:
+            pass
+        ctypedef struct sam_hdr_t:
+            pass
+        ctypedef struct hts_idx_t:
+            pass
+        ctypedef struct hts_itr_t:
+            pass
+
+        htsFile *hts_open(const char *fn, const char *mode) nogil
+        int hts_close(htsFile *fp) nogil
+        int hts_set_fai_filename(htsFile *fp, const char *fn_aux) nogil
+        sam_hdr_t *sam_hdr_read(htsFile *fp) nogil
+        void sam_hdr_destroy(sam_hdr_t *h) nogil
+        int sam_hdr_name2tid(sam_hdr_t *h, const char *ref) nogil
+        hts_idx_t *sam_index_load(htsFile *fp, const char *fn) nogil
+        void hts_idx_destroy(hts_idx_t *idx) nogil
+        hts_itr_t *sam_itr_queryi(const hts_idx_t *idx, int tid, int64_t beg, int64_t end) nogil
+        int sam_itr_next(htsFile *htsfp, hts_itr_t *itr, bam1_t *r) nogil
+        void hts_itr_destroy(hts_itr_t *itr) nogil
+        bam1_t *bam_init1() nogil
+        void bam_destroy1(bam1_t *b) nogil
+
+cdef struct TagRule:
+    char tag[3]
+    bint is_int
+    int64_t ival
+    const char *sval
+
+cdef class ReadFilter:
+
+    cdef readonly int min_mapq, min_length
+    cdef readonly uint32_t exclude_flags, require_flags
+    cdef readonly dict tags
+    cdef list tag_values
+    cdef vector[TagRule] tag_rules
+
+    cdef bint passes(self, const bam1_t *b) noexcept nogil
+
+cdef class AlignmentArena:
+
+    cdef vector[char*] blocks
+    cdef vector[size_t] block_sizes
+    cdef char *current
+    cdef size_t block_size, block_used
+    cdef readonly size_t n_reads, nbytes
+
+    cdef char* alloc(self, size_t n) noexcept nogil
+    cdef bam1_t* copy(self, const bam1_t *src) noexcept nogil
+
+cdef class ReadIngestJob:
+
+    cdef ReadCollection *collection
+    cdef IniOptions *opts
+    cdef vector[bam1_t*] reads
+    cdef size_t index
+    cdef int parse_mods, sort_reads_by
+    cdef readonly int max_y
+    cdef readonly double fetch_time, layout_time
+
+    # Used when reads are fetched directly from a bam/cram file
+    cdef bytes path, reference, chrom
+    cdef int start, end, max_reads
+    cdef ReadFilter read_filter
+    cdef AlignmentArena arena
+
+cdef class HitIndex:
+
+    # Read indexes for each collection and layout level, as (start, readQueue index) sorted by start
+    cdef vector[vector[vector[pair[uint32_t, int]]]] levels
+
+    cdef void build(self, GwPlot *plot)
+    cdef int read_at(self, GwPlot *plot, size_t idx, int level, uint32_t pos) noexcept
+    cdef list reads_in(self, GwPlot *plot, size_t idx, int level0, int level1, uint32_t pos0, uint32_t pos1)
+
 
 cdef class Gw:
 
@@ -221,3 +390,60 @@ cdef class Gw:
 
     cdef public bint raster_surface_created
     cdef bint force_buffered_reads
+    cdef dict read_arenas
+    cdef ReadFilter active_filter
+    cdef size_t filter_start, filter_count  # Position of active_filter's expressions in GW's filters
+    cdef vector[string] filter_strings
+    cdef str reference_path
+    cdef list bam_paths
+    cdef readonly list fetch_stats
+    cdef HitIndex hit_index
+    cdef bint frame_drawn
+    cdef object log_entries
+    cdef long long log_seq, flushed_cursor
+    cdef list pending_scroll
+    cdef float interaction_scale
+    cdef double settle_time, last_interaction
+    cdef bint settle_pending
+    cdef dict memory_tracks
+    cdef set dirty_panels, dirty_columns
+    cdef bint dirty_tracks, surface_valid
+    cdef bint adaptive_threads, track_indexing
+    cdef int pool_size
+    cdef double read_density
+    cdef dict last_draw
+    cdef unsigned long window_thread
+
+    cdef size_t new_collection(self, int regionIdx, int bamIdx)
+    cdef void log_event(self, str level, str kind, object payload)
+    cdef void collect_log(self)
+    cdef ReadIngestJob new_fetch_job(self, str chrom, int start, int end, int bamIdx,
+                                     int parse_mods, int sort_reads_by)
+    cdef dict theme_paints(self)
+    cdef void invalidate_surface(self)
+    cdef void apply_scroll(self, list scroll)
+    cdef void remove_filter_expressions(self)
+    cdef bint fetch_with_filter(self)
+    cdef void own_arena(self, int regionIdx, int bamIdx, AlignmentArena arena)
+    cdef void prune_arenas(self)
+    cdef tuple view_state(self)
+    cdef void invalidate_changes(self, tuple before)
+    cdef HitIndex current_hit_index(self)
+    cdef int collection_at(self, float x, float y)
+    cdef list features_at(self, float x0, float y0, float x1, float y1)
+    cdef list fetch_tiles(self, list loci, int io_threads)
+    cdef int load_fetched(self, list loci, list jobs) except -1
+    cdef int draw_tiles(self, list loci, list jobs, int cols, int rows) except -1
+    cdef int write_vector_document(self, target, bint pdf) except -1
+    cdef void attach_jobs(self, list jobs)
+    cdef void finish_jobs(self, list jobs)
+    cdef ReadIngestJob prepare_pysam_collection(self, pysam_alignments, int col, int row, bint copy,
+                                                int parse_mods, int sort_reads_by)
+    cdef int acquire_threads(self, long long wanted)
+    cdef void release_threads(self, int n)
+    cdef void resize_pool(self, int n)
+    cdef long long estimate_reads(self)
+    cdef int run_ingest_jobs(self, list jobs, int threads) except -1
+    cdef int add_memory_track(self, str name, str chrom, starts, ends, values, names, strands,
+                              bint label_values) except -1
+    cdef int format_memory_labels(self) except -1
@@ -1,8 +1,16 @@
 # cython: c_string_type=unicode, c_string_encoding=utf8
 import os
 import json
-from typing import Any, Dict, List, Optional, Tuple
+import re
+import threading
+import time
+import warnings
+from collections import deque
+from itertools import islice
+from typing import Any, BinaryIO, Dict, Iterable, List, Optional, Tuple, Union
 import numpy as np
+import pysam
+from concurrent.futures import ThreadPoolExecutor, as_completed
 cdef bint HAVE_PILLOW = False
 try:
     from PIL import Image
@@ -10,12 +18,93 @@ try:
 except (ImportError, ModuleNotFoundError):
     pass
 
+from libc.stdlib cimport malloc, free
+from libc.string cimport memcpy, strcmp
 from libcpp.string cimport string
 from libcpp.vector cimport vector
+from libcpp.utility cimport pair
+from libcpp.algorithm cimport sort as std_sort
 from cpython.bytes cimport PyBytes_FromStringAndSize
+from cpython.pythread cimport PyThread_get_thread_ident
 from pysam.libcalignedsegment cimport AlignedSegment
+from gwplot.track_index import indexed_track, TRACK_INDEX_MIN_SIZE
+from gwplot.tiled import PngBandWriter
 
-__all__ = ["Gw", "GwPalette"]
+__all__ = ["Gw", "GwPalette", "ReadFilter", "set_core_budget", "core_budget"]
+
+LOG_CAPACITY = 10000
+"""Default number of entries kept in the log ring buffer"""
+
+ANSI_ESCAPE = re.compile(r"\x1b\[[0-9;]*m")
+
+SNAPSHOT_VERSION = 1
+
+# Settings saved by Gw.snapshot, each restored using the matching set_<name> method
+SNAPSHOT_SETTINGS = (
+    "font_size", "font_name", "threads", "indel_length", "ylim", "split_view_size", "pad",
+    "max_coverage", "max_tlen", "log2_cov", "tlen_yscale", "expand_tracks", "vcf_as_tracks",
+    "sv_arcs", "scroll_speed", "tab_track_height", "start_index", "soft_clip_threshold",
+    "small_indel_threshold", "snp_threshold", "variant_distance", "low_memory",
+)
+
+# Read sorting options understood by findY
+SORT_READS_BY = {"none": 0, "strand": 1, "haplotype": 2}
+
+# Aux tags that GW filter expressions can test
+GW_FILTER_TAGS = frozenset(("RG", "BC", "BX", "RX", "LB", "MD", "MI", "PU", "SA", "MC", "NM", "CM",
+                            "FI", "HO", "MQ", "SM", "TC", "UQ", "AS"))
+
+ADAPTIVE_READS_PER_THREAD = 25000
+"""Reads laid out per thread in adaptive mode. Smaller draws are not split further"""
+
+DEFAULT_READ_DENSITY = 0.2
+"""Reads per base per alignment file assumed before any reads have been loaded"""
+
+# Cores shared by every Gw instance in the process that uses adaptive threads
+_core_budget = os.cpu_count() or 1
+_cores_in_use = 0
+_core_lock = threading.Lock()
+
+
+def set_core_budget(cores: int) -> None:
+    """
+    Set the number of cores shared by Gw instances using adaptive threads.
+
+    Each adaptive draw or ingest takes cores from the budget while it runs, so concurrent
+    sessions in one process do not oversubscribe the machine. Callers never wait: a draw or
+    ingest started while the budget is used up still runs on one core, its calling thread, so
+    cores in use can exceed the budget by one per such caller. The default is the number of
+    CPUs. When several processes serve sessions, give each a share of the machine.
+
+    Parameters
+    ----------
+    cores : int
+        Number of cores
+
+    Raises
+    ------
+    ValueError
+        If cores is less than 1
+    """
+    global _core_budget
+    if cores < 1:
+        raise ValueError("The core budget must be at least 1")
+    with _core_lock:
+        _core_budget = cores
+
+
+def core_budget() -> Dict[str, int]:
+    """
+    The process-wide core budget for adaptive threads.
+
+    Returns
+    -------
+    dict
+        budget (number of cores) and in_use (cores taken by draws and ingests now running,
+        which can exceed the budget as every caller gets at least one core)
+    """
+    with _core_lock:
+        return {"budget": _core_budget, "in_use": _cores_in_use}
 
 
 class GwPalette:
@@ -175,6 +264,510 @@ class GwPalette:
     """Color for other base modifications"""
 
 
+cdef class AlignmentArena:
+    """
+    Compact storage for copies of alignment records.
+
+    Each bam1_t header and its data block are packed back-to-back into large
+    memory blocks owned by the arena, so the originating pysam AlignedSegment
+    objects can be released as soon as they have been copied. Records are never
+    moved once copied, and all memory is released when the arena is freed.
+
+    Parameters
+    ----------
+    block_size : int, optional
+        Size in bytes of each memory block
+    """
+    def __cinit__(self, size_t block_size=4194304):
+        self.current = NULL
+        self.block_size = block_size
+        self.block_used = block_size
+        self.n_reads = 0
+        self.nbytes = 0
+
+    cdef char* alloc(self, size_t n) noexcept nogil:
+        # Returns NULL if memory could not be allocated
+        cdef char *block
+        n = (n + 7) & ~(<size_t>7)
+        if n > self.block_size:  # Oversized records get a block to themselves
+            block = <char *>malloc(n)
+            if block == NULL:
+                return NULL
+            self.blocks.push_back(block)
+            self.block_sizes.push_back(n)
+            self.nbytes += n
+            return block
+        if self.block_used + n > self.block_size:
+            block = <char *>malloc(self.block_size)
+            if block == NULL:
+                return NULL
+            self.blocks.push_back(block)
+            self.block_sizes.push_back(self.block_size)
+            self.nbytes += self.block_size
+            self.current = block
+            self.block_used = 0
+        block = self.current + self.block_used
+        self.block_used += n
+        return block
+
+    cdef bam1_t* copy(self, const bam1_t *src) noexcept nogil:
+        # Returns NULL if memory could not be allocated
+        cdef size_t head = (sizeof(bam1_t) + 7) & ~(<size_t>7)
+        cdef char *mem = self.alloc(head + <size_t>src.l_data)
+        if mem == NULL:
+            return NULL
+        cdef bam1_t *dst = <bam1_t *>mem
+        memcpy(dst, src, sizeof(bam1_t))
+        dst.data = <uint8_t *>(mem + head)
+        memcpy(dst.data, src.data, <size_t>src.l_data)
+        dst.m_data = <uint32_t>src.l_data
+        dst.mempolicy = BAM_USER_OWNS_STRUCT | BAM_USER_OWNS_DATA  # bam_destroy1 must never free these
+        self.n_reads += 1
+        return dst
+
+    def __len__(self) -> int:
+        return self.n_reads
+
+    def __dealloc__(self):
+        cdef size_t i
+        for i in range(self.blocks.size()):
+            free(self.blocks[i])
+        self.blocks.clear()
+        self.block_sizes.clear()
+
+
+cdef class ReadFilter:
+    """
+    A compiled read filter. Alignments failing the filter are rejected before any
+    copying, parsing or layout takes place.
+
+    Parameters
+    ----------
+    min_mapq : int, optional
+        Minimum mapping quality
+    exclude_flags : int, optional
+        Reads with any of these SAM flag bits set are removed
+    require_flags : int, optional
+        Reads must have all of these SAM flag bits set
+    min_length : int, optional
+        Minimum query sequence length. Reads stored without a sequence use the query length of
+        their CIGAR
+    tags : dict, optional
+        Mapping of two-letter aux tag to a required int or str value. Tags must be ones GW
+        filter expressions understand (see GW_FILTER_TAGS), and str values must be a single
+        word. Int rules only match integer-typed tags, and str rules only string-typed tags
+
+    Raises
+    ------
+    ValueError
+        If any of the values are invalid, or a tag rule cannot be written as a GW filter
+        expression
+    """
+    def __init__(self, min_mapq: int = 0, exclude_flags: int = 0, require_flags: int = 0,
+                 min_length: int = 0, tags: Optional[Dict[str, Any]] = None) -> None:
+        if min_mapq < 0 or min_length < 0:
+            raise ValueError("min_mapq and min_length must be >= 0")
+        if not (0 <= exclude_flags <= 0xFFFF and 0 <= require_flags <= 0xFFFF):
+            raise ValueError("Flags must be in the range 0-65535")
+        self.min_mapq = min_mapq
+        self.min_length = min_length
+        self.exclude_flags = exclude_flags
+        self.require_flags = require_flags
+        self.tags = dict(tags) if tags else {}
+        self.tag_values = []
+        self.tag_rules.clear()
+        cdef TagRule rule
+        for tag, value in self.tags.items():
+            if not isinstance(tag, str) or len(tag) != 2:
+                raise ValueError(f"Tag names must be two characters, got {tag!r}")
+            if tag not in GW_FILTER_TAGS:
+                raise ValueError(f"GW filters cannot test the {tag} tag, expected one of {sorted(GW_FILTER_TAGS)}")
+            if isinstance(value, str) and (not value or value != value.strip() or len(value.split()) != 1
+                                           or "[" in value or value.lower() in ("and", "or")):
+                raise ValueError(f"Tag values must be a single word, got {value!r}")
+            tag_bytes = tag.encode("ascii")
+            rule.tag[0] = tag_bytes[0]
+            rule.tag[1] = tag_bytes[1]
+            rule.tag[2] = 0
+            rule.ival = 0
+            rule.sval = NULL
+            if isinstance(value, bool) or not isinstance(value, (int, str)):
+                raise ValueError(f"Tag values must be int or str, got {value!r}")
+            elif isinstance(value, int):
+                rule.is_int = True
+                rule.ival = value
+            else:
+                value_bytes = value.encode("utf-8")
+                self.tag_values.append(value_bytes)  # keeps sval alive
+                rule.is_int = False
+                rule.sval = value_bytes
+            self.tag_rules.push_back(rule)
+
+    cdef bint passes(self, const bam1_t *b) noexcept nogil:
+        cdef size_t i
+        cdef uint8_t *aux
+        cdef const char *s
+        cdef int64_t length
+        if b.core.qual < self.min_mapq:
+            return False
+        if b.core.flag & self.exclude_flags:
+            return False
+        if (b.core.flag & self.require_flags) != self.require_flags:
+            return False
+        if self.min_length > 0:
+            length = b.core.l_qseq
+            if length == 0:  # Secondary reads are often stored without SEQ
+                length = bam_cigar2qlen(b.core.n_cigar, bam_get_cigar(b))
+            if length < self.min_length:
+                return False
+        for i in range(self.tag_rules.size()):
+            aux = bam_aux_get(b, self.tag_rules[i].tag)
+            if aux == NULL:
+                return False
+            if self.tag_rules[i].is_int:
+                # bam_aux2i gives 0 for tags of other types
+                if aux[0] not in b"cCsSiI" or bam_aux2i(aux) != self.tag_rules[i].ival:
+                    return False
+            else:
+                if aux[0] != b"Z":
+                    return False
+                s = bam_aux2Z(aux)
+                if s == NULL or strcmp(s, self.tag_rules[i].sval) != 0:
+                    return False
+        return True
+
+    def expressions(self) -> List[str]:
+        """
+        The equivalent GW filter expressions, which GW applies to reads it fetches itself.
+
+        Returns
+        -------
+        list
+            Filter expressions, each of which must be satisfied
+        """
+        exprs = []
+        if self.min_mapq > 0:
+            exprs.append(f"mapq >= {self.min_mapq}")
+        if self.exclude_flags:
+            exprs.append(f"~flag & {self.exclude_flags}")
+        for bit in range(16):
+            if self.require_flags & (1 << bit):
+                exprs.append(f"flag & {1 << bit}")
+        if self.min_length > 0:
+            exprs.append(f"seq-len >= {self.min_length}")
+        for tag, value in self.tags.items():
+            exprs.append(f"{tag} == {value}")
+        return exprs
+
+    def __repr__(self) -> str:
+        return (f"ReadFilter(min_mapq={self.min_mapq}, exclude_flags={self.exclude_flags}, "
+                f"require_flags={self.require_flags}, min_length={self.min_length}, tags={self.tags})")
+
+
+cdef int ingest_reads(ReadCollection &col, vector[bam1_t*] &reads, IniOptions &opts,
+                      int parse_mods, int sort_reads_by) noexcept nogil:
+    """Parse alignments, accumulate coverage and layout a collection. Returns the max y level."""
+    cdef uint32_t start = <uint32_t>col.region.start
+    cdef uint32_t end = <uint32_t>col.region.end
+    cdef bint add_clip_space = opts.soft_clip_threshold > 0
+    cdef bint add_coverage = opts.max_coverage > 0
+    cdef size_t i
+    col.readQueue.reserve(col.readQueue.size() + reads.size())
+    for i in range(reads.size()):
+        col.readQueue.push_back(Align(reads[i]))
+        align_init(&col.readQueue.back(), parse_mods, add_clip_space)
+        if add_coverage:
+            addToCovArray(col.covArr, col.readQueue.back(), start, end)
+    return findY(col, col.readQueue, opts.link_op, opts, <bint>False, sort_reads_by)
+
+
+def parse_locus(locus: Union[str, Tuple[str, int, int]]) -> Tuple[str, int, int]:
+    """
+    Convert a locus to a (chrom, start, end) tuple.
+
+    Parameters
+    ----------
+    locus : str or tuple
+        Either a (chrom, start, end) tuple or a "chrom:start-end" string
+
+    Returns
+    -------
+    tuple
+        (chrom, start, end)
+    """
+    if isinstance(locus, str):
+        chrom, sep, span = locus.rpartition(":")
+        start, dash, end = span.replace(",", "").partition("-")
+        if not sep or not dash or not chrom:
+            raise ValueError(f"Could not parse locus '{locus}', expected chrom:start-end")
+        return chrom, int(start), int(end)
+    chrom, start, end = locus
+    return str(chrom), int(start), int(end)
+
+
+def read_loci(path: str, flank: int = 0):
+    """
+    Yield (chrom, start, end) loci from a VCF/BCF or BED file, padded by flank bases each side.
+    """
+    lower = path.lower()
+    if lower.endswith((".vcf", ".vcf.gz", ".bcf")):
+        with pysam.VariantFile(path) as vcf:
+            for rec in vcf:
+                yield rec.chrom, max(0, rec.start - flank), rec.stop + flank
+    else:
+        with pysam.TabixFile(path) if lower.endswith(".gz") else open(path) as bed:
+            lines = bed.fetch() if lower.endswith(".gz") else bed
+            for line in lines:
+                if not line.strip() or line.startswith(("#", "track", "browser")):
+                    continue
+                fields = line.split("\t")
+                yield fields[0], max(0, int(fields[1]) - flank), int(fields[2]) + flank
+
+
+def iter_pages(items, page_size: int):
+    """Yield lists of up to page_size items."""
+    page = []
+    for item in items:
+        page.append(item)
+        if len(page) == page_size:
+            yield page
+            page = []
+    if page:
+        yield page
+
+
+cdef int FETCH_SAMPLE_WINDOWS = 16
+
+
+cdef int fetch_reads(const char *path, const char *reference, const char *chrom, int start, int end,
+                     ReadFilter read_filter, AlignmentArena arena, vector[bam1_t*] &reads,
+                     int max_reads=0) noexcept nogil:
+    """
+    Copy reads overlapping a region into the arena. Returns a negative value on failure.
+
+    If max_reads > 0, the region is split into windows and only the first reads starting in
+    each window are kept, so a sample spread across the whole region is collected without
+    reading every record.
+    """
+    cdef htsFile *fp = hts_open(path, "r")
+    if fp == NULL:
+        return -1
+    if reference[0] != 0:
+        hts_set_fai_filename(fp, reference)
+    cdef sam_hdr_t *hdr = sam_hdr_read(fp)
+    cdef hts_idx_t *idx = sam_index_load(fp, path)
+    cdef hts_itr_t *itr = NULL
+    cdef bam1_t *b = bam_init1()
+    cdef bam1_t *copied
+    cdef int tid, w, w_start, w_end, n_kept
+    cdef int n_windows = 1
+    cdef int per_window = 0
+    cdef int rc = 0
+    if max_reads > 0:
+        n_windows = max(1, min(FETCH_SAMPLE_WINDOWS, max_reads, end - start))
+        per_window = max(1, max_reads // n_windows)
+    if hdr == NULL or idx == NULL or b == NULL:
+        rc = -2
+    else:
+        tid = sam_hdr_name2tid(hdr, chrom)
+        if tid >= 0:  # Missing chromosomes give an empty collection
+            for w in range(n_windows):
+                w_start = start + <int>((<long long>(end - start) * w) // n_windows)
+                w_end = start + <int>((<long long>(end - start) * (w + 1)) // n_windows)
+                itr = sam_itr_queryi(idx, tid, w_start, w_end)
+                if itr == NULL:
+                    rc = -3
+                    break
+                n_kept = 0
+                while sam_itr_next(fp, itr, b) >= 0:
+                    if w > 0 and b.core.pos < w_start:  # Overlaps an earlier window
+                        continue
+                    if b.core.flag & 4 or b.core.n_cigar == 0:
+                        continue
+                    if read_filter is not None and not read_filter.passes(b):
+                        continue
+                    copied = arena.copy(b)
+                    if copied == NULL:
+                        rc = -4
+                        break
+                    reads.push_back(copied)
+                    n_kept += 1
+                    if per_window > 0 and n_kept >= per_window:
+                        break
+                hts_itr_destroy(itr)
+                if rc < 0:
+                    break
+    if b != NULL:
+        bam_destroy1(b)
+    if idx != NULL:
+        hts_idx_destroy(idx)
+    if hdr != NULL:
+        sam_hdr_destroy(hdr)
+    hts_close(fp)
+    return rc
+
+
+cdef class ReadIngestJob:
+    """
+    Alignment pointers collected for a single collection. The parsing and layout
+    work is carried out by run() with the GIL released. Reads can also be fetched
+    straight from a bam/cram file using fetch().
+    """
+    def __cinit__(self):
+        self.collection = NULL
+        self.opts = NULL
+        self.max_y = 0
+        self.fetch_time = 0
+        self.layout_time = 0
+        self.max_reads = 0
+
+    def __len__(self) -> int:
+        return self.reads.size()
+
+    def fetch(self) -> int:
+        if self.path is None or self.arena is None:
+            raise RuntimeError("Job has no alignment file")
+        cdef const char *path = self.path
+        cdef const char *reference = self.reference if self.reference is not None else b""
+        cdef const char *chrom = self.chrom
+        cdef int rc
+        cdef double t0 = time.perf_counter()
+        with nogil:
+            rc = fetch_reads(path, reference, chrom, self.start, self.end,
+                             self.read_filter, self.arena, self.reads, self.max_reads)
+        self.fetch_time = time.perf_counter() - t0
+        if rc == -4:
+            raise MemoryError()
+        elif rc < 0:
+            raise IOError(f"Could not fetch reads from {self.path.decode()}")
+        return self.reads.size()
+
+    def run(self) -> int:
+        if self.collection == NULL or self.opts == NULL:
+            raise RuntimeError("Job is not attached to a collection")
+        cdef double t0 = time.perf_counter()
+        with nogil:
+            self.max_y = ingest_reads(self.collection[0], self.reads, self.opts[0],
+                                      self.parse_mods, self.sort_reads_by)
+        self.layout_time = time.perf_counter() - t0
+        return self.max_y
+
+
+cdef class StreamTarget:
+    """Forwards chunks of a document to a Python file-like object or socket."""
+    cdef object write
+    cdef object error
+
+    def __cinit__(self, target):
+        if hasattr(target, "write"):
+            self.write = target.write
+        elif hasattr(target, "sendall"):
+            self.write = target.sendall
+        else:
+            raise TypeError("Output must be a path, a writable file-like object or a socket")
+        self.error = None
+
+
+cdef bint write_to_target(void *ctx, const void *buffer, size_t size) noexcept with gil:
+    cdef StreamTarget target = <StreamTarget>ctx
+    try:
+        target.write(PyBytes_FromStringAndSize(<const char *>buffer, size))
+        return True
+    except BaseException as e:
+        target.error = e
+        return False
+
+
+cdef str CIGAR_OPS = "MIDNSHP=XB"
+
+
+cdef str cigar_string(const bam1_t *b):
+    cdef const uint32_t *cigar = <const uint32_t *>(b.data + b.core.l_qname)
+    cdef int i
+    return "".join([f"{cigar[i] >> 4}{CIGAR_OPS[cigar[i] & 15]}" for i in range(b.core.n_cigar)])
+
+
+cdef dict read_record(ReadCollection &cl, Align &a):
+    cdef const bam1_t *b = a.delegate
+    return {
+        "type": "read",
+        "qname": (<const char *>b.data).decode("utf-8", "replace"),
+        "chrom": cl.region.chrom,
+        "pos": a.pos,
+        "end": a.reference_end,
+        "cigar": cigar_string(b),
+        "mapq": b.core.qual,
+        "flag": b.core.flag,
+        "col": cl.regionIdx,
+        "row": cl.bamIdx,
+        "y": a.y,
+    }
+
+
+cdef size_t first_after(const vector[pair[uint32_t, int]] &row, uint32_t pos) noexcept:
+    # Index of the first entry starting after pos
+    cdef size_t lo = 0, hi = row.size(), mid
+    while lo < hi:
+        mid = (lo + hi) // 2
+        if row[mid].first <= pos:
+            lo = mid + 1
+        else:
+            hi = mid
+    return lo
+
+
+cdef class HitIndex:
+    """
+    Lookup from pixel positions to the reads drawn in the last frame. Reads on the same layout
+    level never overlap, so each level is a list of reads sorted by start position, and a pixel
+    query is a binary search on a single level.
+    """
+    cdef void build(self, GwPlot *plot):
+        cdef size_t i, j
+        cdef int level
+        self.levels.clear()
+        self.levels.resize(plot.collections.size())
+        for i in range(plot.collections.size()):
+            for j in range(plot.collections[i].readQueue.size()):
+                level = plot.collections[i].readQueue[j].y
+                if level < 0:
+                    continue
+                if <size_t>level >= self.levels[i].size():
+                    self.levels[i].resize(level + 1)
+                self.levels[i][level].push_back(pair[uint32_t, int](plot.collections[i].readQueue[j].pos, <int>j))
+            for j in range(self.levels[i].size()):
+                std_sort(self.levels[i][j].begin(), self.levels[i][j].end())
+
+    cdef int read_at(self, GwPlot *plot, size_t idx, int level, uint32_t pos) noexcept:
+        # Index of the read covering pos on a level, or -1
+        if level < 0 or <size_t>level >= self.levels[idx].size():
+            return -1
+        cdef size_t k = first_after(self.levels[idx][level], pos)
+        if k == 0:
+            return -1
+        cdef int j = self.levels[idx][level][k - 1].second
+        if <size_t>j < plot.collections[idx].readQueue.size() and pos < plot.collections[idx].readQueue[j].reference_end:
+            return j
+        return -1
+
+    cdef list reads_in(self, GwPlot *plot, size_t idx, int level0, int level1, uint32_t pos0, uint32_t pos1):
+        # Reads on levels level0 to level1 overlapping [pos0, pos1)
+        results = []
+        cdef size_t k
+        cdef int level, j
+        for level in range(max(level0, 0), min(level1 + 1, <int>self.levels[idx].size())):
+            j = self.read_at(plot, idx, level, pos0)
+            if j >= 0:
+                results.append(read_record(plot.collections[idx], plot.collections[idx].readQueue[j]))
+            k = first_after(self.levels[idx][level], pos0)
+            while k < self.levels[idx][level].size() and self.levels[idx][level][k].first < pos1:
+                j = self.levels[idx][level][k].second
+                if <size_t>j < plot.collections[idx].readQueue.size():
+                    results.append(read_record(plot.collections[idx], plot.collections[idx].readQueue[j]))
+                k += 1
+        return results
+
+
 cdef class Gw:
     """
     Python interface to GW, a high-performance interactive genome browser.
@@ -220,6 +813,32 @@ cdef class Gw:
         self.thisptr.redraw = <bint> True
         self.thisptr.terminalOutput = <bint> False
         self.raster_surface_created = False
+        self.read_arenas = {}
+        self.bam_paths = []
+        self.fetch_stats = []
+        self.hit_index = None
+        self.frame_drawn = False
+        self.log_entries = deque(maxlen=LOG_CAPACITY)
+        self.log_seq = 0
+        self.flushed_cursor = 0
+        self.pending_scroll = None
+        self.interaction_scale = 1
+        self.settle_time = 0.25
+        self.last_interaction = 0
+        self.settle_pending = False
+        self.memory_tracks = {}
+        self.dirty_panels = set()
+        self.dirty_columns = set()
+        self.dirty_tracks = False
+        self.invalidate_surface()
+        self.adaptive_threads = False
+        self.track_indexing = False
+        self.filter_start = 0
+        self.filter_count = 0
+        self.pool_size = 1
+        self.read_density = DEFAULT_READ_DENSITY
+        self.last_draw = {}
+        self.reference_path = reference
         self.thisptr.opts.theme.setAlphas()
         if not iopts.genome_tag.empty():
             self.thisptr.loadIdeogramTag()
@@ -281,7 +900,7 @@ cdef class Gw:
                     f"canvas_width={self.canvas_width}, "
                     f"canvas_height={self.canvas_height}, "
                     f"theme='{self.theme}', "
-                    f"threads={self.threads})")
+                    f"threads={self.threads!r})")
         except Exception as e:
             return f"Gw(<error: {str(e)}>)"
 
@@ -349,7 +968,8 @@ cdef class Gw:
 
     def glfw_init(self):
         """
-        Initialise GLFW backend.
+        Initialise GLFW backend. GLFW windows can only be destroyed by the thread that created them,
+        so a Gw collected on another thread leaves its window open until the process exits.
 
         Returns
         -------
@@ -357,21 +977,124 @@ cdef class Gw:
             Self for method chaining
         """
         self.thisptr.initBack(self.canvas_width, self.canvas_height)
+        self.window_thread = PyThread_get_thread_ident()
         return self
 
     #todo reset_to_defaults function
 
+    cdef void log_event(self, str level, str kind, object payload):
+        self.log_entries.append({
+            "seq": self.log_seq,
+            "level": level,
+            "time": time.time(),
+            "kind": kind,
+            "payload": payload,
+        })
+        self.log_seq += 1
+
+    cdef void collect_log(self):
+        # Moves any messages written by GW into the ring buffer, one entry per line. Each entry's
+        # text keeps the line ending and any blank lines that follow it, for flush_log
+        cdef string s = self.thisptr.flushLog()
+        if s.empty():
+            return
+        cdef str line, plain, blank = ""
+        for line in str(s).splitlines(keepends=True):
+            plain = ANSI_ESCAPE.sub("", line).strip()
+            if not plain:
+                if self.log_entries and self.log_entries[-1]["kind"] == "message":
+                    self.log_entries[-1]["text"] += line
+                else:
+                    blank += line
+                continue
+            lower = plain.lower()
+            level = "error" if lower.startswith("error") else "warning" if lower.startswith("warning") else "info"
+            self.log_event(level, "message", line.rstrip("\r\n"))
+            self.log_entries[-1]["text"] = blank + line
+            blank = ""
+
+    def set_log_capacity(self, capacity: int):
+        """
+        Set the number of entries kept in the log ring buffer. The oldest entries are discarded first.
+
+        Parameters
+        ----------
+        capacity : int
+            Maximum number of log entries
+
+        Returns
+        -------
+        Gw
+            Self for method chaining
+        """
+        if capacity < 1:
+            raise ValueError("capacity must be at least 1")
+        self.log_entries = deque(self.log_entries, maxlen=capacity)
+        return self
+
+    def log_since(self, cursor: int = 0) -> Tuple[List[Dict[str, Any]], int]:
+        """
+        Return log entries added after a cursor, and a cursor to use for the next call.
+
+        Each entry is a dict with keys seq, level ("info", "warning" or "error"), time (seconds since
+        the epoch), kind and payload. Messages written by GW have kind "message", the message line
+        as payload, and text, the output exactly as GW wrote it including line endings and blank
+        lines. The log is a bounded ring buffer (see set_log_capacity), so entries older
+        than the capacity are no longer returned. Only new entries are visited, so each call takes
+        time proportional to the number of entries returned.
+
+        Parameters
+        ----------
+        cursor : int, optional
+            Cursor returned by a previous call, or 0 for all retained entries
+
+        Returns
+        -------
+        tuple
+            (entries, cursor)
+
+        Examples
+        --------
+        >>> cursor = 0
+        >>> gw.apply_command("count")
+        >>> entries, cursor = gw.log_since(cursor)
+        >>> for e in entries:
+        ...     print(e["level"], e["payload"])
+        """
+        self.collect_log()
+        cdef long long oldest = self.log_seq - len(self.log_entries)
+        cdef long long n_new = self.log_seq - max(cursor, oldest)
+        if n_new <= 0:
+            return [], self.log_seq
+        entries = list(islice(reversed(self.log_entries), n_new))
+        entries.reverse()
+        return entries, self.log_seq
+
+    @property
+    def log_cursor(self) -> int:
+        """
+        Cursor pointing after the newest log entry. Pass this to log_since to receive only
+        entries added later.
+
+        Returns
+        -------
+        int
+        """
+        self.collect_log()
+        return self.log_seq
+
     def flush_log(self) -> str:
         """
-        Returns and clears the GW log.
+        Returns the output GW wrote since the last call to flush_log, unchanged. Output is held in
+        the log ring buffer (see log_since), so messages older than the log capacity are not returned.
 
         Returns
         -------
         string
             GW log as a python string
         """
-        cdef string s = self.thisptr.flushLog()
-        return str(s)
+        entries, self.flushed_cursor = self.log_since(self.flushed_cursor)
+        return "".join(e["text"] for e in entries if e["kind"] == "message")
 
     @property
     def clear_buffer(self) -> bool:
@@ -390,6 +1113,8 @@ cdef class Gw:
         Set the clear_buffer status
         """
         self.thisptr.processed = not state
+        if state:
+            self.invalidate_surface()
 
     @property
     def redraw(self) -> bool:
@@ -405,9 +1130,12 @@ cdef class Gw:
 
     def set_redraw(self, state: bool) -> None:
         """
-        Set the redraw status. For dynamic applications, set this to False after a drawing call
+        Set the redraw status. For dynamic applications, set this to False after a drawing call.
+        Setting this to True redraws the whole canvas on the next draw
         """
         self.thisptr.redraw = state
+        if state:
+            self.invalidate_surface()
 
     def mouse_event(self, x_pos: float, y_pos: float, button: int, action: int) -> None:
         """
@@ -422,7 +1150,278 @@ cdef class Gw:
         """
         self.thisptr.xPos_fb = x_pos
         self.thisptr.yPos_fb = y_pos
+        before = self.view_state()
         self.thisptr.mouseButton(button, action, 0)
+        if self.thisptr.redraw:
+            self.invalidate_surface()
+        else:
+            self.invalidate_changes(before)
+        self.last_interaction = time.perf_counter()
+        self.collect_log()
+
+    cdef void invalidate_surface(self):
+        # The whole canvas is redrawn next time, and the layout used by hit tests is out of date
+        self.surface_valid = False
+        self.frame_drawn = False
+
+    cdef void apply_scroll(self, list scroll):
+        cdef size_t i
+        positions = {(col, row): v for col, row, v in scroll}
+        for i in range(self.thisptr.collections.size()):
+            key = (self.thisptr.collections[i].regionIdx, self.thisptr.collections[i].bamIdx)
+            if key in positions:
+                self.thisptr.collections[i].vScroll = positions[key]
+                self.thisptr.collections[i].resetDrawState()
+                self.dirty_panels.add(key)
+                self.frame_drawn = False
+
+    cdef tuple view_state(self):
+        # Region coordinates and the vertical scroll of each collection
+        cdef size_t i
+        regions = [(self.thisptr.regions[i].chrom, self.thisptr.regions[i].start, self.thisptr.regions[i].end)
+                   for i in range(self.thisptr.regions.size())]
+        scroll = [(self.thisptr.collections[i].regionIdx, self.thisptr.collections[i].bamIdx,
+                   self.thisptr.collections[i].vScroll) for i in range(self.thisptr.collections.size())]
+        return regions, scroll
+
+    cdef void invalidate_changes(self, tuple before):
+        # Invalidates the region columns and panels that differ from an earlier view_state
+        regions, scroll = self.view_state()
+        if len(regions) != len(before[0]) or len(scroll) != len(before[1]):
+            self.invalidate_surface()
+            return
+        for i, (old, new) in enumerate(zip(before[0], regions)):
+            if old != new:
+                self.dirty_columns.add(i)
+        for old, new in zip(before[1], scroll):
+            if old[:2] != new[:2]:
+                self.invalidate_surface()
+                return
+            if old != new:
+                self.dirty_panels.add(new[:2])
+        if self.dirty_panels or self.dirty_columns:
+            self.frame_drawn = False
+
+    def invalidate(self, col: Optional[int] = None, row: Optional[int] = None, tracks: bool = False):
+        """
+        Mark part of the canvas as needing to be redrawn.
+
+        Gw keeps track of which panels change, e.g. after add_pysam_alignments, update_array_track or
+        scrolling one region, and the next draw re-rasterises only those panels onto the existing
+        surface. Use this after changing data that Gw does not know about, such as pysam records
+        referenced by a panel. With no arguments, the whole canvas is redrawn.
+
+        Parameters
+        ----------
+        col : int, optional
+            Region index. If row is not given, the whole region column is invalidated
+        row : int, optional
+            Bam index. If col is not given, this panel is invalidated in every region
+        tracks : bool, optional
+            Invalidate the track strip
+
+        Returns
+        -------
+        Gw
+            Self for method chaining
+
+        Raises
+        ------
+        IndexError
+            If col or row are out of range
+        """
+        cdef int n_regions = self.thisptr.regions.size()
+        cdef int n_bams = self.thisptr.sizeOfBams()
+        if col is not None and not 0 <= col < n_regions:
+            raise IndexError(f"Region index {col} out of range")
+        if row is not None and not 0 <= row < n_bams:
+            raise IndexError(f"Bam index {row} out of range")
+        if col is None and row is None and not tracks:
+            self.invalidate_surface()
+        elif row is None and col is not None:
+            self.dirty_columns.add(col)
+        elif row is not None:
+            self.dirty_panels.update((c, row) for c in ([col] if col is not None else range(n_regions)))
+        if tracks:
+            self.dirty_tracks = True
+        self.thisptr.redraw = <bint>True
+        self.frame_drawn = False
+        return self
+
+    @property
+    def invalidated(self) -> Dict[str, Any]:
+        """
+        The parts of the canvas that the next draw will redraw.
+
+        Returns
+        -------
+        dict
+            full (the whole canvas is redrawn), panels (list of (col, row) tuples), regions (list of
+            region indexes) and tracks (the track strip is redrawn)
+        """
+        return {"full": not self.surface_valid, "panels": sorted(self.dirty_panels),
+                "regions": sorted(self.dirty_columns), "tracks": bool(self.dirty_tracks)}
+
+    cdef HitIndex current_hit_index(self):
+        if not self.frame_drawn:
+            raise RuntimeError("Call draw() before hit testing")
+        if self.hit_index is None:
+            self.hit_index = HitIndex()
+            self.hit_index.build(self.thisptr)
+        return self.hit_index
+
+    cdef int collection_at(self, float x, float y):
+        cdef size_t i
+        cdef ReadCollection *cl
+        for i in range(self.thisptr.collections.size()):
+            cl = &self.thisptr.collections[i]
+            if cl.region == NULL or cl.xScaling <= 0:
+                continue
+            if (cl.xOffset <= x < cl.xOffset + (cl.region.end - cl.region.start) * cl.xScaling
+                    and cl.yOffset <= y < cl.yOffset + cl.yPixels):
+                return <int>i
+        return -1
+
+    cdef list features_at(self, float x0, float y0, float x1, float y1):
+        # Track features are stacked below the alignments, one band of tabixY pixels per track
+        results = []
+        if self.thisptr.tabixY <= 0:
+            return results
+        cdef float top = self.thisptr.fb_height - self.thisptr.totalTabixY - self.thisptr.sliderSpace
+        cdef float region_width = self.thisptr.fb_width / <float>max(1, <int>self.thisptr.regions.size())
+        cdef float x_offset, x_scaling, band, level_height, bx0, bx1, by0
+        cdef size_t r, t, k
+        cdef Region *rgn
+        cdef TrackBlock *blk
+        for r in range(self.thisptr.regions.size()):
+            rgn = &self.thisptr.regions[r]
+            if rgn.end <= rgn.start:
+                continue
+            x_offset = region_width * r + self.thisptr.gap
+            x_scaling = (region_width - 2 * self.thisptr.gap) / (rgn.end - rgn.start)
+            for t in range(rgn.featuresInView.size()):
+                band = top + t * self.thisptr.tabixY
+                if band > y1 or band + self.thisptr.tabixY <= y0:
+                    continue
+                level_height = self.thisptr.tabixY
+                if t < rgn.featureLevels.size() and rgn.featureLevels[t] > 1:
+                    level_height /= rgn.featureLevels[t]
+                for k in range(rgn.featuresInView[t].size()):
+                    blk = &rgn.featuresInView[t][k]
+                    bx0 = x_offset + (blk.start - rgn.start) * x_scaling
+                    bx1 = x_offset + (blk.end - rgn.start) * x_scaling
+                    by0 = band + max(blk.level, 0) * level_height
+                    if bx0 <= x1 and x0 <= bx1 and by0 <= y1 and y0 < by0 + level_height:
+                        results.append({
+                            "type": "feature",
+                            "name": blk.name,
+                            "chrom": blk.chrom,
+                            "start": blk.start,
+                            "end": blk.end,
+                            "strand": blk.strand,
+                            "parent": blk.parent,
+                            "vartype": blk.vartype,
+                            "value": blk.value,
+                            "track": t,
+                            "col": r,
+                        })
+        return results
+
+    def hit_test(self, x: float, y: float) -> Optional[Dict[str, Any]]:
+        """
+        Find the read or track feature drawn at a pixel in the last frame.
+
+        Unlike mouse_event, nothing is redrawn or written to the log. The lookup index is built on
+        the first call after each draw(), after which each query is a binary search.
+
+        Parameters
+        ----------
+        x : float
+            Pixel x-position on the canvas
+        y : float
+            Pixel y-position on the canvas
+
+        Returns
+        -------
+        dict or None
+            For reads, a dict with keys type ("read"), qname, chrom, pos, end, cigar, mapq, flag,
+            col (region index), row (bam index) and y (layout level). For track features, a dict
+            with keys type ("feature"), name, chrom, start, end, strand, parent, vartype, track and
+            col. None if nothing was drawn at the pixel
+
+        Raises
+        ------
+        RuntimeError
+            If the view changed since the last call to draw()
+
+        Examples
+        --------
+        >>> gw.draw()
+        >>> item = gw.hit_test(640, 220)
+        >>> if item and item["type"] == "read":
+        ...     print(item["qname"], item["cigar"])
+        """
+        cdef HitIndex index = self.current_hit_index()
+        cdef int idx = self.collection_at(x, y)
+        cdef ReadCollection *cl
+        cdef int j
+        if idx >= 0:
+            cl = &self.thisptr.collections[idx]
+            if self.thisptr.yScaling <= 0:
+                return None
+            j = index.read_at(self.thisptr, idx, <int>((y - cl.yOffset) / self.thisptr.yScaling) + cl.vScroll,
+                              <uint32_t>((x - cl.xOffset) / cl.xScaling + cl.region.start))
+            return read_record(cl[0], cl.readQueue[j]) if j >= 0 else None
+        features = self.features_at(x, y, x, y)
+        return features[0] if features else None
+
+    def items_in_rect(self, x0: float, y0: float, x1: float, y1: float) -> List[Dict[str, Any]]:
+        """
+        Find all reads and track features drawn inside a rectangle in the last frame.
+
+        Parameters
+        ----------
+        x0, y0 : float
+            Pixel position of one corner of the rectangle
+        x1, y1 : float
+            Pixel position of the opposite corner
+
+        Returns
+        -------
+        list of dict
+            Records in the same format as hit_test
+
+        Raises
+        ------
+        RuntimeError
+            If the view changed since the last call to draw()
+        """
+        cdef HitIndex index = self.current_hit_index()
+        if x1 < x0:
+            x0, x1 = x1, x0
+        if y1 < y0:
+            y0, y1 = y1, y0
+        results = []
+        cdef size_t i
+        cdef ReadCollection *cl
+        cdef float cx0, cx1, cy0, cy1
+        for i in range(self.thisptr.collections.size()):
+            cl = &self.thisptr.collections[i]
+            if cl.region == NULL or cl.xScaling <= 0 or self.thisptr.yScaling <= 0:
+                continue
+            cx0 = max(x0, cl.xOffset)
+            cx1 = min(x1, cl.xOffset + (cl.region.end - cl.region.start) * cl.xScaling)
+            cy0 = max(y0, cl.yOffset)
+            cy1 = min(y1, cl.yOffset + cl.yPixels)
+            if cx0 > cx1 or cy0 > cy1:
+                continue
+            results.extend(index.reads_in(self.thisptr, i,
+                                          <int>((cy0 - cl.yOffset) / self.thisptr.yScaling) + cl.vScroll,
+                                          <int>((cy1 - cl.yOffset) / self.thisptr.yScaling) + cl.vScroll,
+                                          <uint32_t>((cx0 - cl.xOffset) / cl.xScaling + cl.region.start),
+                                          <uint32_t>((cx1 - cl.xOffset) / cl.xScaling + cl.region.start) + 1))
+        results.extend(self.features_at(x0, y0, x1, y1))
+        return results
 
     @property
     def canvas_width(self) -> int:
@@ -453,6 +1452,7 @@ cdef class Gw:
         self.thisptr.fb_width = width
         self.thisptr.opts.dimensions.x = width
         self.thisptr.makeRasterSurface()
+        self.invalidate_surface()
         return self
 
     @property
@@ -484,6 +1484,7 @@ cdef class Gw:
         self.thisptr.fb_height = height
         self.thisptr.opts.dimensions.y = height
         self.thisptr.makeRasterSurface()
+        self.invalidate_surface()
         return self
 
     @property
@@ -519,6 +1520,7 @@ cdef class Gw:
         self.thisptr.fb_height = height
         self.thisptr.opts.dimensions.y = height
         self.thisptr.makeRasterSurface()
+        self.invalidate_surface()
         return self
 
     @property
@@ -551,6 +1553,7 @@ cdef class Gw:
         self.thisptr.fonts.setTypeface(self.thisptr.opts.font_str, size)
         self.thisptr.fonts.setOverlayHeight(1)
         self.thisptr.setScaling()
+        self.invalidate_surface()
         return self
 
     @property
@@ -581,6 +1584,7 @@ cdef class Gw:
         """
         self.thisptr.opts.font_str = name.encode('utf-8')
         self.thisptr.fonts.setTypeface(self.thisptr.opts.font_str, self.thisptr.opts.font_size)
+        self.invalidate_surface()
         return self
 
     @property
@@ -618,8 +1622,22 @@ cdef class Gw:
             raise ValueError("Theme must be one of slate, dark, igv")
         self.thisptr.opts.setTheme(theme_name)
         self.thisptr.opts.theme.setAlphas()
+        self.invalidate_surface()
         return self
 
+    cdef dict theme_paints(self):
+        # ARGB colour of each paint type, keyed by GwPalette name
+        paint_constants = {name: getattr(GwPalette, name) for name in dir(GwPalette)
+                           if not name.startswith('_') and name.isupper()
+                           and not callable(getattr(GwPalette, name))}
+        paint_names = {value: name for name, value in paint_constants.items()}
+        theme_data = {}
+        cdef int a = 0, r = 0, g = 0, b = 0
+        for paint_value, paint_name in paint_names.items():
+            self.thisptr.opts.theme.getPaintARGB(paint_value, a, r, g, b)
+            theme_data[paint_name] = [a, r, g, b]
+        return theme_data
+
     def apply_theme(self, theme_dict: Dict[int, Tuple[int, int, int, int]]):
         """
         Apply a custom theme using a dictionary of paint types and colors.
@@ -739,55 +1757,115 @@ cdef class Gw:
         >>> new_gw = Gw("reference.fa")
         >>> new_gw.load_theme_from_json("my_custom_theme.json")
         """
-        import json
-        paint_constants = {name: getattr(GwPalette, name) for name in dir(GwPalette)
-                           if not name.startswith('_') and name.isupper()
-                           and not callable(getattr(GwPalette, name))}
-        paint_names = {value: name for name, value in paint_constants.items()}
-        theme_data = {}
-
-        # Get color values for each paint type
-        cdef int a, r, g, b;
-        a = 0; r = 0; g = 0; b = 0
-        for paint_value, paint_name in paint_names.items():
-            self.thisptr.opts.theme.getPaintARGB(paint_value, a, r, b, b)
-            theme_data[paint_name] = [a, r, g, b]
-
         # Write the theme to a JSON file
         with open(filepath, 'w') as f:
-            json.dump(theme_data, f, indent=2)
+            json.dump(self.theme_paints(), f, indent=2)
 
         return self
 
     @property
-    def threads(self) -> int:
+    def threads(self) -> Union[int, str]:
         """
         Get the number of threads used for processing.
 
         Returns
         -------
-        int
-            Number of threads
+        int or str
+            Number of threads, or "auto" in adaptive mode
         """
+        if self.adaptive_threads:
+            return "auto"
         return self.thisptr.opts.threads
 
-    def set_threads(self, threads: int):
+    def set_threads(self, threads: Union[int, str]):
         """
         Set the number of threads for data processing.
 
+        With "auto", each draw chooses its number of threads from the number of reads in view,
+        estimated from the size of the regions before reads are loaded, and the cores free in
+        the process-wide budget (see set_core_budget). Small views are drawn on one thread, and
+        large views use up to the whole budget. The thread pool is resized to the number chosen
+        whenever it changes, and the number is reported in draw_stats.
+        Ingesting reads with the default threads argument also takes cores from the budget.
+
         Parameters
         ----------
-        threads : int
-            Number of threads to use
+        threads : int or str
+            Number of threads to use, or "auto"
 
         Returns
         -------
         Gw
             Self for method chaining
-        """
+
+        Raises
+        ------
+        ValueError
+            If threads is a string other than "auto"
+
+        Examples
+        --------
+        >>> gw.set_threads("auto").draw()
+        >>> gw.draw_stats["threads"]
+        """
+        if isinstance(threads, str):
+            if threads != "auto":
+                raise ValueError(f"threads must be a number or 'auto', not '{threads}'")
+            self.adaptive_threads = True
+            return self
+        self.adaptive_threads = False
         self.thisptr.opts.threads = threads # if threads > 1 else 1
+        self.resize_pool(max(1, threads))
         return self
 
+    cdef void resize_pool(self, int n):
+        if n == self.pool_size:
+            return
+        with nogil:
+            self.thisptr.pool.reset(<unsigned int>n)
+        self.pool_size = n
+
+    cdef int acquire_threads(self, long long wanted):
+        # Takes up to wanted cores from the process-wide budget. A caller always gets at least one
+        # core, as it runs on its own thread anyway, so in_use can exceed the budget
+        global _cores_in_use
+        cdef int n
+        with _core_lock:
+            n = <int>max(1, min(wanted, _core_budget - _cores_in_use))
+            _cores_in_use += n
+        return n
+
+    cdef void release_threads(self, int n):
+        global _cores_in_use
+        with _core_lock:
+            _cores_in_use -= n
+
+    cdef long long estimate_reads(self):
+        # Reads in view: those loaded, or more if the regions are wider than the loaded reads
+        # cover, at the density seen by earlier draws
+        cdef long long loaded = 0, span = 0
+        cdef size_t i
+        for i in range(self.thisptr.collections.size()):
+            loaded += self.thisptr.collections[i].readQueue.size()
+        for i in range(self.thisptr.regions.size()):
+            span += self.thisptr.regions[i].end - self.thisptr.regions[i].start
+        return max(loaded, <long long>(span * self.thisptr.sizeOfBams() * self.read_density))
+
+    @property
+    def draw_stats(self) -> Dict[str, Any]:
+        """
+        Statistics for the last call to draw.
+
+        Returns
+        -------
+        dict
+            threads (number of threads used), adaptive (True if chosen in adaptive mode),
+            estimated_reads (reads expected in view before drawing, in adaptive mode),
+            reads (reads loaded after drawing), partial (True if only invalidated panels were
+            redrawn) and draw_time (seconds)
+        """
+        return dict(self.last_draw)
+
     @property
     def indel_length(self) -> int:
         """
@@ -816,6 +1894,7 @@ cdef class Gw:
             Self for method chaining
         """
         self.thisptr.opts.indel_length = indel_length
+        self.invalidate_surface()
         return self
 
     @property
@@ -845,6 +1924,7 @@ cdef class Gw:
             Self for method chaining
         """
         self.thisptr.opts.ylim = ylim
+        self.invalidate_surface()
         return self
 
     @property
@@ -874,6 +1954,7 @@ cdef class Gw:
             Self for method chaining
         """
         self.thisptr.opts.split_view_size = split_view_size
+        self.invalidate_surface()
         return self
 
     @property
@@ -903,6 +1984,7 @@ cdef class Gw:
             Self for method chaining
         """
         self.thisptr.opts.pad = pad
+        self.invalidate_surface()
         return self
 
     @property
@@ -934,6 +2016,7 @@ cdef class Gw:
             Self for method chaining
         """
         self.thisptr.opts.max_coverage = max_coverage
+        self.invalidate_surface()
         return self
 
     @property
@@ -963,6 +2046,7 @@ cdef class Gw:
             Self for method chaining
         """
         self.thisptr.opts.max_tlen = max_tlen
+        self.invalidate_surface()
         return self
 
     @property
@@ -992,6 +2076,7 @@ cdef class Gw:
             Self for method chaining
         """
         self.thisptr.opts.log2_cov = log2_cov
+        self.invalidate_surface()
         return self
 
     @property
@@ -1021,6 +2106,7 @@ cdef class Gw:
             Self for method chaining
         """
         self.thisptr.opts.tlen_yscale = <bint>tlen_yscale
+        self.invalidate_surface()
         return self
 
     @property
@@ -1050,6 +2136,7 @@ cdef class Gw:
             Self for method chaining
         """
         self.thisptr.opts.expand_tracks = expand_tracks
+        self.invalidate_surface()
         return self
 
     @property
@@ -1079,6 +2166,7 @@ cdef class Gw:
             Self for method chaining
         """
         self.thisptr.opts.vcf_as_tracks = vcf_as_tracks
+        self.invalidate_surface()
         return self
 
     @property
@@ -1108,6 +2196,7 @@ cdef class Gw:
             Self for method chaining
         """
         self.thisptr.opts.sv_arcs = sv_arcs
+        self.invalidate_surface()
         return self
 
     @property
@@ -1166,6 +2255,7 @@ cdef class Gw:
             Self for method chaining
         """
         self.thisptr.opts.tab_track_height = tab_track_height
+        self.invalidate_surface()
         return self
 
     @property
@@ -1195,6 +2285,7 @@ cdef class Gw:
             Self for method chaining
         """
         self.thisptr.opts.start_index = start_index
+        self.invalidate_surface()
         return self
 
     @property
@@ -1224,6 +2315,7 @@ cdef class Gw:
             Self for method chaining
         """
         self.thisptr.opts.soft_clip_threshold = soft_clip_threshold
+        self.invalidate_surface()
         return self
 
     @property
@@ -1253,6 +2345,7 @@ cdef class Gw:
             Self for method chaining
         """
         self.thisptr.opts.small_indel_threshold = small_indel_threshold
+        self.invalidate_surface()
         return self
 
     @property
@@ -1282,6 +2375,7 @@ cdef class Gw:
             Self for method chaining
         """
         self.thisptr.opts.snp_threshold = snp_threshold
+        self.invalidate_surface()
         return self
 
     @property
@@ -1313,6 +2407,7 @@ cdef class Gw:
             Self for method chaining
         """
         self.thisptr.opts.variant_distance = variant_distance
+        self.invalidate_surface()
         return self
 
     @property
@@ -1343,6 +2438,37 @@ cdef class Gw:
             Self for method chaining
         """
         self.thisptr.opts.low_memory = low_memory
+        self.invalidate_surface()
+        return self
+
+    @property
+    def index_tracks(self) -> bool:
+        """
+        Whether add_track builds indexed copies of large track files.
+
+        Returns
+        -------
+        bool
+            Large tracks are indexed
+        """
+        return self.track_indexing
+
+    def set_index_tracks(self, state: bool):
+        """
+        Let add_track sort, bgzip and tabix-index large uncompressed track files on first use.
+        Indexed copies are written to gwplot.track_index.default_cache_dir(). Off by default.
+
+        Parameters
+        ----------
+        state : bool
+            Index large tracks
+
+        Returns
+        -------
+        Gw
+            Self for method chaining
+        """
+        self.track_indexing = state
         return self
 
     def set_image_number(self, x: int, y: int):
@@ -1363,6 +2489,7 @@ cdef class Gw:
         """
         self.thisptr.opts.number.x = x
         self.thisptr.opts.number.y = y
+        self.invalidate_surface()
         return self
 
     def set_paint_ARBG(self, paint_enum: int, a: int, r: int, g: int, b: int):
@@ -1394,6 +2521,7 @@ cdef class Gw:
         >>> gw.set_paint_ARBG(GwPalette.NORMAL_READ, 255, 0, 0, 128)
         """
         self.thisptr.opts.theme.setPaintARGB(paint_enum, a, r, g, b)
+        self.invalidate_surface()
         return self
 
     def set_active_region_index(self, index: int):
@@ -1419,40 +2547,226 @@ cdef class Gw:
         Remove all loaded alignment data.
         """
         self.thisptr.clearCollections()
+        self.read_arenas = {}
+        self.invalidate_surface()
         self.force_buffered_reads = <bint>False
         self.thisptr.redraw = <bint>True
         self.thisptr.processed = <bint>False
         self.thisptr.clearImageCacheQueue()
 
+    cdef void own_arena(self, int regionIdx, int bamIdx, AlignmentArena arena):
+        # read_arenas maps the (region, bam) index of a collection to the arenas holding its reads
+        self.read_arenas.setdefault((regionIdx, bamIdx), []).append(arena)
+
+    cdef void prune_arenas(self):
+        # GW drops the collections of a removed region or bam and leaves the indices of the others
+        # unchanged, so arenas recorded for an index no longer used by any collection are released
+        cdef size_t i
+        live = set()
+        for i in range(self.thisptr.collections.size()):
+            live.add((self.thisptr.collections[i].regionIdx, self.thisptr.collections[i].bamIdx))
+        self.read_arenas = {k: v for k, v in self.read_arenas.items() if k in live}
+
+    @property
+    def alignment_bytes(self) -> int:
+        """
+        Memory held by alignment records copied into this instance, by add_pysam_alignments with
+        copy=True, add_pysam_collections, load_alignments and the grid and progressive drawing
+        methods. Reads fetched by GW itself are not included.
+
+        Returns
+        -------
+        int
+            Bytes allocated for copied records
+        """
+        cdef AlignmentArena arena
+        return sum(arena.nbytes for arenas in self.read_arenas.values() for arena in arenas)
+
     def clear_regions(self) -> None:
         """
         Remove all defined genomic regions.
         """
-        cdef size_t i
-        for i in range(self.thisptr.regions.size()):
+        cdef int i
+        for i in reversed(range(<int>self.thisptr.regions.size())):
             self.remove_region(i)
         self.thisptr.clearImageCacheQueue()
 
-    def clear(self) -> None:  #todo this is incomplete: tracks, variant files
+    def clear(self) -> None:
         """
-        Remove all data.
+        Remove all data, apart from bam files.
         """
         self.clear_alignments()
         self.clear_regions()
+        cdef int i
+        for i in reversed(range(<int>self.thisptr.tracks.size())):
+            self.thisptr.removeTrack(i)
+        self.memory_tracks.clear()
+        for i in reversed(range(<int>self.thisptr.variantTracks.size())):
+            self.thisptr.removeVariantTrack(i)
         self.thisptr.clearImageCacheQueue()
 
-    def draw_background(self) -> None:
-        """
-        Draws the background colour
+    def snapshot(self) -> Dict[str, Any]:
         """
-        self.thisptr.drawBackground()
+        Capture the session state as a JSON-serialisable dict.
 
+        The snapshot holds the reference, bam and track paths, regions and the active region,
+        all settings, the theme and its colours, read filters and the vertical scroll position of
+        each panel. Alignment data and images are not included, and are reloaded on restore.
+        In-memory tracks from add_array_track and add_feature_track are not included.
 
-    def add_bam(self, path: str):
-        """
-        Add a BAM file to the visualisation.
+        Returns
+        -------
+        dict
+            Session state, for use with restore or Gw.from_snapshot
 
-        Parameters
+        Examples
+        --------
+        >>> state = json.dumps(gw.snapshot())
+        >>> # Later, possibly in another process
+        >>> gw = Gw.from_snapshot(json.loads(state))
+        """
+        cdef size_t i
+        cdef Region *rgn
+        read_filter = None
+        if self.active_filter is not None:
+            read_filter = {
+                "min_mapq": self.active_filter.min_mapq,
+                "exclude_flags": self.active_filter.exclude_flags,
+                "require_flags": self.active_filter.require_flags,
+                "min_length": self.active_filter.min_length,
+                "tags": dict(self.active_filter.tags),
+            }
+        filters = [str(self.thisptr.filters[i].filter_str) for i in range(self.thisptr.filters.size())
+                   if not self.filter_start <= i < self.filter_start + self.filter_count]
+        tracks = [str(self.thisptr.tracks[i].path) for i in range(self.thisptr.tracks.size())]
+        regions = []
+        for i in range(self.thisptr.regions.size()):
+            rgn = &self.thisptr.regions[i]
+            regions.append([rgn.chrom, rgn.start, rgn.end, rgn.markerPos, rgn.markerPosEnd])
+        return {
+            "version": SNAPSHOT_VERSION,
+            "reference": self.reference_path,
+            "genome_tag": self.thisptr.opts.genome_tag,
+            "bams": list(self.bam_paths),
+            "tracks": [p for p in tracks if p not in self.memory_tracks],
+            "regions": regions,
+            "active_region": self.thisptr.regionSelection,
+            "canvas_size": [self.thisptr.opts.dimensions.x, self.thisptr.opts.dimensions.y],
+            "image_number": [self.thisptr.opts.number.x, self.thisptr.opts.number.y],
+            "settings": {name: getattr(self, name) for name in SNAPSHOT_SETTINGS},
+            "theme": self.thisptr.opts.theme_str,
+            "paints": self.theme_paints(),
+            "read_filter": read_filter,
+            "filters": filters,
+            "scroll": [[self.thisptr.collections[i].regionIdx, self.thisptr.collections[i].bamIdx,
+                        self.thisptr.collections[i].vScroll]
+                       for i in range(self.thisptr.collections.size()) if self.thisptr.collections[i].vScroll != 0],
+        }
+
+    def restore(self, snapshot: Dict[str, Any]):
+        """
+        Restore a session state captured by snapshot.
+
+        Bam files and tracks that are already open with the same paths are kept, along with their
+        file handles and indexes, so a pooled Gw created with the same reference can take over a
+        session quickly. Alignments are reloaded on the next draw.
+
+        Parameters
+        ----------
+        snapshot : dict
+            State returned by snapshot
+
+        Returns
+        -------
+        Gw
+            Self for method chaining
+
+        Raises
+        ------
+        ValueError
+            If the snapshot version is not supported, or it was taken with a different reference
+        """
+        if snapshot.get("version") != SNAPSHOT_VERSION:
+            raise ValueError(f"Unsupported snapshot version {snapshot.get('version')}")
+        if os.path.realpath(snapshot["reference"]) != os.path.realpath(self.reference_path):
+            raise ValueError("Snapshot was taken using a different reference genome")
+        cdef int i
+        cdef string s
+        self.clear_alignments()
+        self.clear_regions()
+
+        if list(self.bam_paths) != list(snapshot["bams"]):
+            for i in reversed(range(len(self.bam_paths))):
+                self.remove_bam(i)
+            for path in snapshot["bams"]:
+                self.add_bam(path)
+        tracks = [self.thisptr.tracks[i].path for i in range(<int>self.thisptr.tracks.size())]
+        if tracks != list(snapshot["tracks"]):
+            for i in reversed(range(len(tracks))):
+                self.remove_track(i)
+            for path in snapshot["tracks"]:
+                self.add_track(path)
+
+        for name in SNAPSHOT_SETTINGS:
+            getattr(self, f"set_{name}")(snapshot["settings"][name])
+        self.set_image_number(*snapshot["image_number"])
+        s = snapshot["theme"].encode("utf-8")
+        self.thisptr.opts.setTheme(s)
+        self.thisptr.opts.theme.setAlphas()
+        for paint_name, (a, r, g, b) in snapshot["paints"].items():
+            self.set_paint_ARBG(getattr(GwPalette, paint_name), a, r, g, b)
+        if tuple(snapshot["canvas_size"]) != (self.thisptr.opts.dimensions.x, self.thisptr.opts.dimensions.y):
+            self.set_canvas_size(*snapshot["canvas_size"])
+
+        self.thisptr.filters.clear()  # The snapshot's own filters replace any already set
+        self.active_filter = None
+        self.filter_count = 0
+        if snapshot["read_filter"] is not None:
+            self.set_read_filter(**snapshot["read_filter"])
+        else:
+            self.clear_read_filter()
+        for expression in snapshot["filters"]:
+            s = expression.encode("utf-8")
+            self.thisptr.addFilter(s)
+
+        for chrom, start, end, marker_start, marker_end in snapshot["regions"]:
+            self.add_region(chrom, start, end, marker_start, marker_end)
+        self.set_active_region_index(snapshot["active_region"])
+        self.pending_scroll = [tuple(v) for v in snapshot["scroll"]]
+        self.thisptr.redraw = <bint>True
+        return self
+
+    @staticmethod
+    def from_snapshot(snapshot: Dict[str, Any]):
+        """
+        Create a Gw instance from a session state captured by snapshot.
+
+        Parameters
+        ----------
+        snapshot : dict
+            State returned by snapshot
+
+        Returns
+        -------
+        Gw
+            A new instance showing the same view
+        """
+        reference = snapshot["genome_tag"] or snapshot["reference"]
+        return Gw(reference).restore(snapshot)
+
+    def draw_background(self) -> None:
+        """
+        Draws the background colour
+        """
+        self.thisptr.drawBackground()
+        self.invalidate_surface()
+
+
+    def add_bam(self, path: str):
+        """
+        Add a BAM file to the visualisation.
+
+        Parameters
         ----------
         path : str
             Path to the BAM file
@@ -1466,23 +2780,164 @@ cdef class Gw:
         path = os.path.expanduser(path)
         b = path.encode("utf-8")
         self.thisptr.addBam(b)
+        self.bam_paths.append(path)
+        self.invalidate_surface()
         return self
 
-    def add_pysam_alignments(self, pysam_alignments: List['AlignedSegment'],
+    cdef size_t new_collection(self, int regionIdx, int bamIdx):
+        # Adds an empty collection for a panel, returning its index
+        cdef uint32_t start = <uint32_t> self.thisptr.regions[regionIdx].start
+        cdef uint32_t end = <uint32_t> self.thisptr.regions[regionIdx].end
+
+        self.thisptr.collections.push_back(ReadCollection())
+        self.thisptr.collections.back().region = &self.thisptr.regions[regionIdx]
+        self.thisptr.collections.back().ownsBamPtrs = <bint>False
+        if self.thisptr.opts.max_coverage > 0:
+            self.thisptr.collections.back().covArr.resize(end - start + 1)
+        if self.thisptr.opts.snp_threshold > <int>(end - start):
+            self.thisptr.collections.back().makeEmptyMMArray()
+
+        self.thisptr.collections.back().regionIdx = regionIdx
+        self.thisptr.collections.back().bamIdx = bamIdx
+        return self.thisptr.collections.size() - 1
+
+    cdef ReadIngestJob new_fetch_job(self, str chrom, int start, int end, int bamIdx,
+                                     int parse_mods, int sort_reads_by):
+        # A job that copies reads from a bam file into its own arena. It is not yet attached to a collection
+        cdef ReadIngestJob job = ReadIngestJob()
+        job.parse_mods = parse_mods
+        job.sort_reads_by = sort_reads_by
+        job.path = self.bam_paths[bamIdx].encode("utf-8")
+        job.reference = self.reference_path.encode("utf-8")
+        job.chrom = chrom.encode("utf-8")
+        job.start = start
+        job.end = end
+        job.read_filter = self.active_filter
+        job.arena = AlignmentArena()
+        return job
+
+    cdef ReadIngestJob prepare_pysam_collection(self, pysam_alignments, int col, int row, bint copy,
+                                                int parse_mods, int sort_reads_by):
+        # Adds an empty collection and gathers alignment pointers for it, holding the GIL
+        cdef int regionIdx
+        cdef int bamIdx
+        if col < 0:
+            regionIdx = self.thisptr.sizeOfRegions() - 1
+        else:
+            regionIdx = col
+            if regionIdx >= <int>self.thisptr.sizeOfRegions():
+                raise IndexError(f"Region index {col} out of range")
+        if row < 0:
+            bamIdx = self.thisptr.sizeOfBams() - 1
+        else:
+            bamIdx = row
+            if bamIdx >= <int>self.thisptr.sizeOfBams():
+                raise IndexError(f"Bam index {row} out of range")
+
+        cdef ReadIngestJob job = ReadIngestJob()
+        job.index = self.new_collection(regionIdx, bamIdx)
+        job.parse_mods = parse_mods
+        job.sort_reads_by = sort_reads_by
+
+        cdef bam1_t* bam_ptr
+        cdef AlignedSegment read
+        cdef ReadFilter read_filter = self.active_filter
+        cdef AlignmentArena arena = None
+        if copy:
+            arena = AlignmentArena()
+            self.own_arena(regionIdx, bamIdx, arena)
+        elif isinstance(pysam_alignments, list):
+            job.reads.reserve(len(pysam_alignments))
+
+        for read in pysam_alignments:
+            bam_ptr = <bam1_t* >read._delegate
+            if bam_ptr[0].core.flag & 4 or bam_ptr[0].core.n_cigar == 0:
+                continue
+            if read_filter is not None and not read_filter.passes(bam_ptr):
+                continue
+            if arena is not None:
+                bam_ptr = arena.copy(bam_ptr)
+                if bam_ptr == NULL:
+                    raise MemoryError()
+            job.reads.push_back(bam_ptr)
+        return job
+
+    cdef void attach_jobs(self, list jobs):
+        # Collections must not be added or removed until finish_jobs, so pointers into the vector remain valid
+        cdef ReadIngestJob job
+        for job in jobs:
+            job.collection = &self.thisptr.collections[job.index]
+            job.opts = &self.thisptr.opts
+
+    cdef void finish_jobs(self, list jobs):
+        cdef ReadIngestJob job
+        cdef int max_y = self.thisptr.samMaxY
+        for job in jobs:
+            self.thisptr.samMaxY = max(job.max_y, self.thisptr.samMaxY)
+            self.dirty_panels.add((job.collection.regionIdx, job.collection.bamIdx))
+            job.collection = NULL
+            job.opts = NULL
+        if self.thisptr.samMaxY != max_y:  # Every panel is rescaled
+            self.invalidate_surface()
+        self.thisptr.processed = <bint>True
+        self.thisptr.redraw = <bint>True
+        self.frame_drawn = False
+
+    cdef int run_ingest_jobs(self, list jobs, int threads) except -1:
+        # threads of -1 uses the threads setting, or cores from the budget in adaptive mode
+        cdef ReadIngestJob job
+        cdef int granted = 0
+        if threads < 0:
+            if self.adaptive_threads:
+                threads = granted = self.acquire_threads(len(jobs))
+            else:
+                threads = self.thisptr.opts.threads
+        self.attach_jobs(jobs)
+        try:
+            if threads > 1 and len(jobs) > 1:
+                with ThreadPoolExecutor(max_workers=min(threads, len(jobs))) as executor:
+                    list(executor.map(ReadIngestJob.run, jobs))
+            else:
+                for job in jobs:
+                    job.run()
+        finally:
+            self.finish_jobs(jobs)
+            if granted:
+                self.release_threads(granted)
+        return 0
+
+    def add_pysam_alignments(self, pysam_alignments: Iterable['AlignedSegment'],
                             col: int = -1,
-                            row: int = -1):
+                            row: int = -1,
+                            copy: bool = False,
+                            sort_reads_by: str = "none",
+                            parse_mods: bool = True):
         """
-        Adds alignments from a pysam list to a region. Alignments are assumed to be sorted by
+        Adds alignments from pysam to a region. Alignments are assumed to be sorted by
         position. Creates a raster surface if needed.
 
+        By default the underlying bam1_t pointers are used directly, so the input alignments
+        must 'outlive' any drawing calls. If copy is True, each alignment is copied into a compact
+        arena owned by Gw, so the pysam objects can be freed straight away. In this mode any
+        iterable can be consumed lazily e.g. ``AlignmentFile.fetch(...)``.
+
+        Alignment pointers are gathered in a single pass, then parsing, coverage and
+        layout are carried out with the GIL released.
+
         Parameters
         ----------
-        pysam_alignment_list : list
-            List of pysam AlignedSegments
+        pysam_alignments : iterable
+            List or iterator of pysam AlignedSegments
         col: int, optional
             The region index to draw to for multi-region support. If -1, the last added region will be used
         row: int, optional
             The bam index to draw to for multi-region support. If -1, the last added bam will be used
+        copy: bool, optional
+            Copy alignments into memory owned by Gw, rather than referencing the pysam objects
+        sort_reads_by: str, optional
+            One of "none", "strand" or "haplotype"
+        parse_mods: bool, optional
+            Parse base modifications from MM/ML tags
 
         Returns
         -------
@@ -1495,7 +2950,60 @@ cdef class Gw:
             If the col or row are out of range
         RuntimeError
             If any normal collections are already present in the Gw object
+        ValueError
+            If sort_reads_by is not understood
+        """
+        return self.add_pysam_collections([(pysam_alignments, col, row)], copy=copy,
+                                          sort_reads_by=sort_reads_by, parse_mods=parse_mods, threads=1)
+
+    def add_pysam_collections(self, collections: Iterable[Tuple[Iterable['AlignedSegment'], int, int]],
+                              copy: bool = False,
+                              sort_reads_by: str = "none",
+                              parse_mods: bool = True,
+                              threads: int = -1):
         """
+        Adds several pysam collections at once. Each item is a tuple of (alignments, col, row), with
+        the same meaning as the arguments to add_pysam_alignments.
+
+        Alignment pointers for every collection are gathered first. The collections are then parsed
+        and laid out with the GIL released, using up to 'threads' worker threads.
+
+        Parameters
+        ----------
+        collections : iterable
+            Tuples of (alignments, col, row)
+        copy: bool, optional
+            Copy alignments into memory owned by Gw, rather than referencing the pysam objects
+        sort_reads_by: str, optional
+            One of "none", "strand" or "haplotype"
+        parse_mods: bool, optional
+            Parse base modifications from MM/ML tags
+        threads: int, optional
+            Number of worker threads. If -1, the threads setting is used, and in adaptive mode
+            up to one thread per collection is taken from the core budget
+
+        Returns
+        -------
+        Gw
+            Self for method chaining
+
+        Raises
+        ------
+        IndexError
+            If a col or row are out of range
+        RuntimeError
+            If any normal collections are already present in the Gw object
+        ValueError
+            If sort_reads_by is not understood
+
+        Examples
+        --------
+        >>> bams = [pysam.AlignmentFile(p) for p in paths]
+        >>> gw.add_pysam_collections(((b.fetch("chr1", 1, 20000), 0, i) for i, b in enumerate(bams)),
+        ...                          copy=True, threads=4)
+        """
+        if sort_reads_by not in SORT_READS_BY:
+            raise ValueError(f"sort_reads_by must be one of {', '.join(SORT_READS_BY)}")
 
         if not self.raster_surface_created:
             self.make_raster_surface()
@@ -1511,53 +3019,235 @@ cdef class Gw:
 
         self.force_buffered_reads = <bint>True
 
-        cdef int regionIdx
-        cdef int bamIdx
-        if col < 0:
-            regionIdx = self.thisptr.sizeOfRegions() - 1
-        else:
-            regionIdx = col
-            assert regionIdx < <int>self.thisptr.sizeOfRegions()
-        if row < 0:
-            bamIdx = self.thisptr.sizeOfBams() - 1
-        else:
-            bamIdx = row
-            assert bamIdx < <int>self.thisptr.sizeOfBams()
+        cdef int sort_code = SORT_READS_BY[sort_reads_by]
+        cdef int parse_mods_threshold = 1 if parse_mods else 0
+        jobs = [self.prepare_pysam_collection(alignments, col, row, <bint>copy, parse_mods_threshold, sort_code)
+                for alignments, col, row in collections]
+        self.run_ingest_jobs(jobs, threads)
+        return self
 
-        cdef uint32_t start = <uint32_t> self.thisptr.regions[regionIdx].start
-        cdef uint32_t end = <uint32_t> self.thisptr.regions[regionIdx].end
+    def load_alignments(self, io_threads: int = 4, threads: int = -1,
+                        sort_reads_by: str = "none", parse_mods: bool = True, max_reads: int = 0):
+        """
+        Fetch, parse and layout reads for every (region, bam) panel concurrently.
 
-        self.thisptr.collections.push_back(ReadCollection())
-        self.thisptr.collections.back().region = &self.thisptr.regions[regionIdx]
-        self.thisptr.collections.back().ownsBamPtrs = <bint>False
-        if self.thisptr.opts.max_coverage > 0:
-            self.thisptr.collections.back().covArr.resize(end - start + 1)
-        if self.thisptr.opts.snp_threshold > <int>(end - start):
-            self.thisptr.collections.back().makeEmptyMMArray()
+        Each panel is fetched on a bounded pool of I/O threads using its own file handle, and is
+        laid out as soon as its reads arrive, using a separate pool of 'threads' workers. Reads are
+        copied into memory owned by Gw and the read filter is applied during fetching. For grids
+        with many bam files, loading then takes time proportional to the slowest panel rather than
+        the sum of all panels. Any existing alignments are cleared first. Per-panel timings are
+        available from fetch_stats afterwards.
 
-        self.thisptr.collections.back().regionIdx = regionIdx
-        self.thisptr.collections.back().bamIdx = bamIdx
+        Parameters
+        ----------
+        io_threads : int, optional
+            Maximum number of panels fetched concurrently
+        threads : int, optional
+            Number of layout threads. If -1, the threads setting is used, and in adaptive mode
+            up to one thread per panel is taken from the core budget
+        sort_reads_by: str, optional
+            One of "none", "strand" or "haplotype"
+        parse_mods: bool, optional
+            Parse base modifications from MM/ML tags
+        max_reads: int, optional
+            If above 0, at most this many reads are loaded per panel, sampled from windows spread
+            across the region. Only the sampled records are read from disk
 
-        cdef bam1_t* bam_ptr
-        cdef AlignedSegment read
-        cdef vector[Align]* readQueue = &self.thisptr.collections.back().readQueue
+        Returns
+        -------
+        Gw
+            Self for method chaining
 
-        for read in pysam_alignments:
-            bam_ptr = <bam1_t* >read._delegate
-            if bam_ptr[0].core.flag & 4 or bam_ptr[0].core.n_cigar == 0:
-                continue
-            readQueue[0].push_back(Align(bam_ptr))
-            align_init(&readQueue[0].back(), <bint>True, <bint>self.thisptr.opts.soft_clip_threshold > 0)  # todo set parse_mods
-            if self.thisptr.opts.max_coverage > 0:
-                addToCovArray(self.thisptr.collections.back().covArr, readQueue[0].back(), start, end)
+        Raises
+        ------
+        IndexError
+            If no bam files or regions have been added
+        IOError
+            If an alignment file or its index could not be read
+        ValueError
+            If sort_reads_by is not understood
 
-        # todo sortReadsBy
-        cdef int maxY = findY(self.thisptr.collections.back(), readQueue[0], self.thisptr.opts.link_op,
-                              self.thisptr.opts, <bint>False, 0)
+        Examples
+        --------
+        >>> gw = Gw("reference.fa")
+        >>> for path in cohort_bams:
+        ...     gw.add_bam(path)
+        >>> gw.add_region("chr1", 1000000, 1010000)
+        >>> gw.load_alignments(io_threads=16).save_png("cohort.png")
+        >>> slowest = max(gw.fetch_stats, key=lambda s: s["fetch_time"])
+        """
+        if sort_reads_by not in SORT_READS_BY:
+            raise ValueError(f"sort_reads_by must be one of {', '.join(SORT_READS_BY)}")
+        if self.thisptr.sizeOfBams() == 0:
+            raise IndexError("Add a bam/cram file first")
+        if self.thisptr.sizeOfRegions() == 0:
+            raise IndexError("Add a region first")
+        if not self.raster_surface_created:
+            self.make_raster_surface()
 
-        self.thisptr.samMaxY = max(maxY, self.thisptr.samMaxY)
-        self.thisptr.processed = <bint>True
+        self.clear_alignments()
+        self.force_buffered_reads = <bint>True
+
+        cdef int regionIdx, bamIdx
+        cdef ReadIngestJob job
+        cdef int n_threads = self.thisptr.opts.threads if threads < 0 else threads
+        cdef int granted = 0
+        jobs = []
+        for regionIdx in range(<int>self.thisptr.sizeOfRegions()):
+            for bamIdx in range(<int>self.thisptr.sizeOfBams()):
+                job = self.new_fetch_job(self.thisptr.regions[regionIdx].chrom,
+                                         self.thisptr.regions[regionIdx].start,
+                                         self.thisptr.regions[regionIdx].end,
+                                         bamIdx, 1 if parse_mods else 0, SORT_READS_BY[sort_reads_by])
+                job.index = self.new_collection(regionIdx, bamIdx)
+                job.max_reads = max(0, max_reads)
+                self.own_arena(regionIdx, bamIdx, job.arena)
+                jobs.append(job)
+        if threads < 0 and self.adaptive_threads:
+            n_threads = granted = self.acquire_threads(len(jobs))
+
+        def fetch(ReadIngestJob fetch_job):
+            fetch_job.fetch()
+            return fetch_job
+
+        self.attach_jobs(jobs)
+        try:
+            with ThreadPoolExecutor(max_workers=max(1, min(io_threads, len(jobs)))) as io_executor, \
+                    ThreadPoolExecutor(max_workers=max(1, n_threads)) as layout_executor:
+                layouts = [layout_executor.submit(ReadIngestJob.run, f.result())
+                           for f in as_completed([io_executor.submit(fetch, job) for job in jobs])]
+                for f in layouts:
+                    f.result()
+        finally:
+            self.finish_jobs(jobs)
+            if granted:
+                self.release_threads(granted)
+
+        self.fetch_stats = []
+        for job in jobs:
+            self.fetch_stats.append({
+                "col": self.thisptr.collections[job.index].regionIdx,
+                "row": self.thisptr.collections[job.index].bamIdx,
+                "region": f"{job.chrom.decode()}:{job.start}-{job.end}",
+                "bam": job.path.decode(),
+                "reads": len(job),
+                "fetch_time": job.fetch_time,
+                "layout_time": job.layout_time,
+            })
+        return self
+
+    @property
+    def read_filter(self) -> Optional[ReadFilter]:
+        """
+        The read filter set using set_read_filter, or None.
+
+        Returns
+        -------
+        ReadFilter or None
+        """
+        return self.active_filter
+
+    def set_read_filter(self, min_mapq: int = 0, exclude_flags: int = 0, require_flags: int = 0,
+                        min_length: int = 0, tags: Optional[Dict[str, Any]] = None):
+        """
+        Set a read filter that is applied while reads are fetched.
+
+        The filter is compiled once and evaluated on each record before the read is copied, parsed
+        or laid out. While a filter is set, draw fetches the reads for add_bam files itself, in the
+        same way as load_alignments, rather than leaving this to GW. Reads that GW still fetches,
+        when scrolling or for regions larger than low_memory, are filtered by equivalent GW filter
+        expressions, which GW evaluates after the reads are parsed. This replaces the filter set
+        previously by set_read_filter. Filters added using apply_command are kept. Pysam
+        alignments that were already added are not re-filtered.
+
+        Parameters
+        ----------
+        min_mapq : int, optional
+            Minimum mapping quality
+        exclude_flags : int, optional
+            Reads with any of these SAM flag bits set are removed e.g. 1024 for duplicates
+        require_flags : int, optional
+            Reads must have all of these SAM flag bits set
+        min_length : int, optional
+            Minimum query sequence length
+        tags : dict, optional
+            Mapping of two-letter aux tag to a required int or str value e.g. {"RG": "tumour"}.
+            Tags must be ones GW filter expressions understand (see ReadFilter)
+
+        Returns
+        -------
+        Gw
+            Self for method chaining
+
+        Raises
+        ------
+        ValueError
+            If any of the filter values are invalid
+
+        Examples
+        --------
+        >>> # Remove duplicates, secondary and low mapping-quality reads
+        >>> gw.set_read_filter(min_mapq=20, exclude_flags=1024 | 256)
+        """
+        cdef ReadFilter read_filter = ReadFilter(min_mapq, exclude_flags, require_flags, min_length, tags)
+        self.remove_filter_expressions()
+        cdef string expr
+        self.filter_start = self.thisptr.filters.size()
+        for e in read_filter.expressions():
+            expr = e.encode("utf-8")
+            self.thisptr.addFilter(expr)
+        self.filter_count = self.thisptr.filters.size() - self.filter_start
+        self.filter_strings.clear()
+        for i in range(self.filter_start, self.thisptr.filters.size()):
+            self.filter_strings.push_back(self.thisptr.filters[i].filter_str)  # As GW stored them
+        self.active_filter = read_filter
+        self.thisptr.processed = <bint>False
+        self.thisptr.redraw = <bint>True
+        self.invalidate_surface()
+        return self
+
+    cdef void remove_filter_expressions(self):
+        # Removes the GW filters added for active_filter by position, so filters added using
+        # apply_command are kept, even if their text is the same. If GW commands have removed
+        # filters since, the block is not where it was, and nothing is removed
+        cdef size_t i, end = self.filter_start + self.filter_count
+        if self.filter_count == 0 or end > self.thisptr.filters.size():
+            self.filter_count = 0
+            return
+        for i in range(self.filter_count):
+            if self.thisptr.filters[self.filter_start + i].filter_str != self.filter_strings[i]:
+                self.filter_count = 0
+                return
+        self.thisptr.filters.erase(self.thisptr.filters.begin() + self.filter_start,
+                                   self.thisptr.filters.begin() + end)
+        self.filter_count = 0
+
+    cdef bint fetch_with_filter(self):
+        # Whether draw should fetch the reads itself, applying active_filter. GW keeps streaming
+        # regions over the low_memory size, and reads that are already loaded are kept
+        cdef size_t i
+        if (self.active_filter is None or self.thisptr.processed or self.force_buffered_reads
+                or self.thisptr.sizeOfBams() == 0 or self.thisptr.sizeOfRegions() == 0):
+            return False
+        for i in range(self.thisptr.regions.size()):
+            if self.thisptr.regions[i].end - self.thisptr.regions[i].start > self.thisptr.opts.low_memory:
+                return False
+        return True
 
+    def clear_read_filter(self):
+        """
+        Remove the read filter set using set_read_filter. Filters added using apply_command are kept.
+
+        Returns
+        -------
+        Gw
+            Self for method chaining
+        """
+        self.remove_filter_expressions()
+        self.active_filter = None
+        self.thisptr.processed = <bint>False
+        self.thisptr.redraw = <bint>True
+        self.invalidate_surface()
         return self
 
     def remove_bam(self, index: int):
@@ -1575,13 +3265,22 @@ cdef class Gw:
             Self for method chaining
         """
         self.thisptr.removeBam(index)
+        if 0 <= index < len(self.bam_paths):
+            del self.bam_paths[index]
+        self.prune_arenas()
+        self.invalidate_surface()
         return self
 
     def add_track(self, path: str, vcf_as_track: bool = True,
-                 bed_as_track: bool = True):
+                 bed_as_track: bool = True, index: Optional[bool] = None):
         """
         Add a genomic data track to the visualisation.
 
+        If index_tracks is set, large uncompressed GFF3/GTF/BED/VCF files are sorted, bgzipped and
+        tabix-indexed on first use, so only features overlapping the viewed regions are loaded. Indexed
+        copies are cached on disk (see gwplot.track_index) and reused by later calls, including from
+        other Gw instances. Track labels and snapshots keep the original path.
+
         Parameters
         ----------
         path : str
@@ -1590,6 +3289,9 @@ cdef class Gw:
             Whether to display VCF files as tracks
         bed_as_track : bool, optional
             Whether to display BED files as tracks
+        index : bool, optional
+            If True always use an indexed copy, if False never. By default files larger
+            than TRACK_INDEX_MIN_SIZE bytes are indexed when index_tracks is set
 
         Returns
         -------
@@ -1597,26 +3299,236 @@ cdef class Gw:
             Self for method chaining
         """
         cdef string b
+        cdef size_t n = self.thisptr.tracks.size()
         path = os.path.expanduser(path)
+        source = path
+        if index or (index is None and self.track_indexing):
+            path = indexed_track(path, min_size=0 if index else TRACK_INDEX_MIN_SIZE)
         b = path.encode("utf-8")
         self.thisptr.addTrack(b, <bint>False, vcf_as_track, bed_as_track)
+        if path != source and self.thisptr.tracks.size() > n:
+            # The file is already open, so the path is only used for the label
+            self.thisptr.tracks[n].path = source.encode("utf-8")
+        self.invalidate_surface()
+        return self
+
+    def remove_track(self, index: int):
+        """
+        Remove a data track from the visualisation.
+
+        Parameters
+        ----------
+        index : int
+            Index of the track to remove
+
+        Returns
+        -------
+        Gw
+            Self for method chaining
+        """
+        if 0 <= index < <int>self.thisptr.tracks.size():
+            self.memory_tracks.pop(self.thisptr.tracks[index].path, None)
+        self.thisptr.removeTrack(index)
+        self.invalidate_surface()
+        return self
+
+    cdef int add_memory_track(self, str name, str chrom, starts, ends, values, names, strands,
+                              bint label_values) except -1:
+        # Typed memoryviews use int64 and float64 arrays without copying
+        cdef const int64_t[::1] s = np.ascontiguousarray(starts, dtype=np.int64)
+        cdef const int64_t[::1] e = np.ascontiguousarray(ends, dtype=np.int64)
+        cdef size_t n = s.shape[0]
+        if <size_t>e.shape[0] != n:
+            raise ValueError("starts and ends must have the same length")
+        if n > 0 and (np.any(np.asarray(e) < np.asarray(s)) or np.asarray(s).min() < 0):
+            raise ValueError("Intervals must have 0 <= start <= end")
+        cdef const double[::1] v
+        cdef const double *v_ptr = NULL
+        if values is not None:
+            v = np.ascontiguousarray(values, dtype=np.float64)
+            if <size_t>v.shape[0] != n:
+                raise ValueError("values must have the same length as starts")
+            if n > 0:
+                v_ptr = &v[0]
+        cdef vector[string] c_names
+        cdef vector[string] *names_ptr = NULL
+        if names is not None:
+            for x in names:
+                c_names.push_back(str(x).encode("utf-8"))
+            if c_names.size() != n:
+                raise ValueError("names must have the same length as starts")
+            names_ptr = &c_names
+        cdef const int8_t[::1] st
+        cdef const int8_t *st_ptr = NULL
+        if strands is not None:
+            arr = np.asarray(strands)
+            if arr.dtype.kind in "USO":
+                arr = np.where(arr == "+", 1, np.where(arr == "-", -1, 0))
+            st = np.ascontiguousarray(np.sign(arr), dtype=np.int8)
+            if <size_t>st.shape[0] != n:
+                raise ValueError("strands must have the same length as starts")
+            if n > 0:
+                st_ptr = &st[0]
+
+        path = name
+        k = 2
+        paths = {self.thisptr.tracks[i].path for i in range(self.thisptr.tracks.size())}
+        while path in paths:  # Names identify in-memory tracks, so must be unique
+            path = f"{name} ({k})"
+            k += 1
+        order = np.empty(n, dtype=np.int64)
+        cdef int64_t[::1] o = order
+        cdef string c_path = path.encode("utf-8")
+        cdef string c_chrom = chrom.encode("utf-8")
+        addMemoryTrack(self.thisptr, c_path)
+        if n > 0:
+            setMemoryBlocks(self.thisptr.tracks.back(), c_chrom, n, &s[0], &e[0], v_ptr, names_ptr,
+                            st_ptr, label_values, &o[0])
+        self.memory_tracks[path] = {"chrom": chrom, "order": order, "array": values is not None,
+                                    "label_values": label_values, "stale_labels": False}
+        self.invalidate_surface()
+        return 0
+
+    cdef int format_memory_labels(self) except -1:
+        # Labels of updated array tracks are written just before drawing, and only for blocks in view.
+        # Blocks further away keep old labels until they are scrolled into view, so the flag stays set
+        if not self.memory_tracks:
+            return 0
+        cdef size_t i, r
+        cdef string c_chrom
+        cdef Region *rgn
+        for i in range(self.thisptr.tracks.size()):
+            info = self.memory_tracks.get(self.thisptr.tracks[i].path)
+            if info is None or not info["stale_labels"]:
+                continue
+            c_chrom = info["chrom"].encode("utf-8")
+            for r in range(self.thisptr.regions.size()):
+                rgn = &self.thisptr.regions[r]
+                if rgn.chrom == c_chrom:
+                    formatMemoryLabels(self.thisptr.tracks[i], c_chrom, rgn.start, rgn.end)
+        return 0
+
+    def add_array_track(self, chrom: str, starts: np.ndarray, ends: np.ndarray, values: np.ndarray,
+                        name: str = "array", label_values: bool = True):
+        """
+        Add a data track of values over intervals, held in memory.
+
+        Intervals are stored in an interval tree and drawn by the same code as BED tracks, without
+        writing any files. Values can be changed later with update_array_track, without rebuilding
+        the track. int64 and float64 arrays are read without copying.
+
+        Parameters
+        ----------
+        chrom : str
+            Chromosome of the intervals
+        starts, ends : numpy.ndarray
+            0-based start and end of each interval
+        values : numpy.ndarray
+            Value of each interval
+        name : str, optional
+            Track name. A number is appended if the name is already in use
+        label_values : bool, optional
+            Label each interval with its value. Values are also returned by hit_test
+
+        Returns
+        -------
+        Gw
+            Self for method chaining
+
+        Raises
+        ------
+        ValueError
+            If the arrays have different lengths, or an interval ends before it starts
+
+        Examples
+        --------
+        >>> starts = np.arange(0, 20000, 100)
+        >>> gw.add_array_track("chr1", starts, starts + 100, scores, name="model")
+        >>> gw.update_array_track(-1, new_scores).draw()
+        """
+        self.add_memory_track(name, chrom, starts, ends, values, None, None, label_values)
+        return self
+
+    def add_feature_track(self, chrom: str, starts: np.ndarray, ends: np.ndarray,
+                          names: Optional[Iterable[str]] = None, strands: Optional[np.ndarray] = None,
+                          name: str = "features"):
+        """
+        Add a track of named interval features, held in memory.
+
+        Features are stored in an interval tree and drawn by the same code as BED tracks, without
+        writing any files. int64 arrays are read without copying.
+
+        Parameters
+        ----------
+        chrom : str
+            Chromosome of the features
+        starts, ends : numpy.ndarray
+            0-based start and end of each feature
+        names : iterable of str, optional
+            Feature names
+        strands : numpy.ndarray, optional
+            Strand of each feature, as "+", "-" or "." strings, or 1, -1 or 0
+        name : str, optional
+            Track name. A number is appended if the name is already in use
+
+        Returns
+        -------
+        Gw
+            Self for method chaining
+
+        Raises
+        ------
+        ValueError
+            If the arrays have different lengths, or a feature ends before it starts
+        """
+        self.add_memory_track(name, chrom, starts, ends, None, names, strands, False)
         return self
 
-    def remove_track(self, index: int):
+    def update_array_track(self, index: int, values: np.ndarray):
         """
-        Remove a data track from the visualisation.
+        Replace the values of an array track in place.
+
+        Only the stored values are changed, and value labels are formatted on the next draw for
+        the intervals in view, so the cost of a redraw does not grow with the size of the track.
 
         Parameters
         ----------
         index : int
-            Index of the track to remove
+            Index of the track. Negative values count from the last track
+        values : numpy.ndarray
+            New value of each interval, in the order the intervals were added
 
         Returns
         -------
         Gw
             Self for method chaining
-        """
-        self.thisptr.removeTrack(index)
+
+        Raises
+        ------
+        IndexError
+            If the index is out of range
+        ValueError
+            If the track is not an array track, or values has the wrong length
+        """
+        cdef int n_tracks = self.thisptr.tracks.size()
+        if index < 0:
+            index += n_tracks
+        if not 0 <= index < n_tracks:
+            raise IndexError(f"Track index {index} out of range")
+        info = self.memory_tracks.get(self.thisptr.tracks[index].path)
+        if info is None or not info["array"]:
+            raise ValueError(f"Track {index} is not an array track")
+        cdef const int64_t[::1] order = info["order"]
+        cdef const double[::1] v = np.ascontiguousarray(values, dtype=np.float64)
+        if v.shape[0] != order.shape[0]:
+            raise ValueError(f"Expected {order.shape[0]} values, got {v.shape[0]}")
+        cdef string c_chrom = info["chrom"].encode("utf-8")
+        if v.shape[0] > 0:
+            setMemoryValues(self.thisptr.tracks[index], c_chrom, &order[0], v.shape[0], &v[0])
+        info["stale_labels"] = info["label_values"]
+        self.thisptr.redraw = <bint>True
+        self.dirty_tracks = True
+        self.frame_drawn = False
         return self
 
     def add_region(self, chrom: str, start: int, end: int,
@@ -1653,6 +3565,7 @@ cdef class Gw:
         self.thisptr.fetchRefSeq(self.thisptr.regions.back())
         self.thisptr.regionSelection = <int>self.thisptr.regions.size() - 1
         self.thisptr.resetCollectionRegionPtrs()
+        self.invalidate_surface()
         return self
 
     def remove_region(self, index: int):
@@ -1670,6 +3583,8 @@ cdef class Gw:
             Self for method chaining
         """
         self.thisptr.removeRegion(index)
+        self.prune_arenas()
+        self.invalidate_surface()
         return self
 
     def apply_command(self, command: str):
@@ -1685,6 +3600,8 @@ cdef class Gw:
         cdef string c = command.encode("utf-8")
         self.thisptr.inputText = c
         self.thisptr.commandProcessed()
+        self.invalidate_surface()
+        self.collect_log()
         return self
 
     def key_press(self, key: int, scancode: int, action: int, mods: int) -> None:
@@ -1702,7 +3619,18 @@ cdef class Gw:
         mods : int
             Modifier keys
         """
+        cdef IniOptions *opts = &self.thisptr.opts
+        before = None
+        if self.surface_valid and mods == 0 and key in (opts.scroll_left, opts.scroll_right, opts.scroll_up,
+                                                        opts.scroll_down, opts.zoom_in, opts.zoom_out):
+            before = self.view_state()
         self.thisptr.keyPress(key, scancode, action, mods)
+        if before is not None:
+            self.invalidate_changes(before)
+        elif self.thisptr.redraw:
+            self.invalidate_surface()
+        self.last_interaction = time.perf_counter()
+        self.collect_log()
     #todo
     # scroll_left, scroll_right, zoom_out, zoom_in
     # click screen
@@ -1733,6 +3661,7 @@ cdef class Gw:
             self.thisptr.opts.dimensions.y = height
         self.thisptr.setImageSize(self.thisptr.opts.dimensions.x, self.thisptr.opts.dimensions.y)
         size = self.thisptr.makeRasterSurface()
+        self.invalidate_surface()
         if size == 0:
             raise RuntimeError("Could not create raster image. Size was 0")
         self.raster_surface_created = True
@@ -1762,49 +3691,194 @@ cdef class Gw:
         self.thisptr.redraw = <bint>True  # Don't block further interactions
         return self
 
-    def save_pdf(self, path: str):
+    def save_tiled_png(self, path: Union[str, os.PathLike, BinaryIO], width: int = -1, height: int = -1,
+                       band_height: int = 1024, threads: int = 2, compression_level: int = 6):
+        """
+        Draw and save a PNG image of any size, such as a poster, in horizontal bands.
+
+        The image is laid out as if the canvas were width x height pixels, then drawn one band of
+        band_height rows at a time. Each band is streamed to the PNG file as soon as it is drawn, so
+        memory use is proportional to the band size rather than the image size. Bands are compressed
+        on a pool of threads while the next band is drawn. The raster surface is not used.
+
+        Parameters
+        ----------
+        path : str or file-like
+            Path to save the PNG file, or a writable binary file-like object
+        width : int, optional
+            Image width in pixels. Defaults to the canvas width
+        height : int, optional
+            Image height in pixels. Defaults to the canvas height
+        band_height : int, optional
+            Number of rows drawn at a time
+        threads : int, optional
+            Number of bands compressed concurrently
+        compression_level : int, optional
+            zlib compression level, 0-9
+
+        Returns
+        -------
+        Gw
+            Self for method chaining
+
+        Raises
+        ------
+        ValueError
+            If the image size, band height or compression level are out of range
+
+        Examples
+        --------
+        >>> gw.save_tiled_png("poster.png", width=30000, height=8000, threads=4)
+        """
+        if width < 0:
+            width = self.thisptr.opts.dimensions.x
+        if height < 0:
+            height = self.thisptr.opts.dimensions.y
+        if band_height < 1:
+            raise ValueError("band_height must be at least 1")
+        cdef int w = width, h = height, y, bh
+        cdef unsigned char[:, :, ::1] pixels
+        own_file = isinstance(path, (str, os.PathLike))
+        f = open(os.fspath(path), "wb") if own_file else path
+        self.format_memory_labels()
+        try:
+            writer = PngBandWriter(f, w, h, compression_level, threads)
+            for y in range(0, h, band_height):
+                bh = min(band_height, h - y)
+                band = np.empty((bh, w, 4), dtype=np.uint8)
+                pixels = band
+                with nogil:
+                    drawBand(self.thisptr, <char *>&pixels[0, 0, 0], w, h, y, bh, self.force_buffered_reads)
+                writer.write_band(band)
+            writer.close()
+        finally:
+            if own_file:
+                f.close()
+        self.thisptr.redraw = <bint>True  # Don't block further interactions
+        return self
+
+    cdef int write_vector_document(self, target, bint pdf) except -1:
+        # Streams a PDF or SVG to a file-like object, in chunks as Skia produces it
+        cdef StreamTarget stream_target = StreamTarget(target)
+        cdef CallbackWStream *stream = new CallbackWStream(write_to_target, <void *>stream_target, 65536)
+        cdef bint ok
+        try:
+            if pdf:
+                ok = drawPdf(self.thisptr, stream, self.force_buffered_reads)
+            else:
+                ok = drawSvg(self.thisptr, stream, self.force_buffered_reads)
+        finally:
+            del stream
+        self.thisptr.redraw = <bint> True  # Don't block further interactions
+        if stream_target.error is not None:
+            raise stream_target.error
+        if not ok:
+            raise RuntimeError("Writing document failed")
+        return 0
+
+    def save_pdf(self, path: Union[str, os.PathLike, BinaryIO]):
         """
         Draws and saves a PDF file using the current configuration.
 
         Parameters
         ----------
-        path : str
-            Path to save the PDF file
+        path : str or file-like
+            Path to save the PDF file, or a writable binary file-like object or socket.
+            Output is streamed to file-like objects as it is produced
 
         Returns
         -------
         Gw
             Self for method chaining
         """
-        cdef string c = path.encode("utf-8")
+        if not isinstance(path, (str, os.PathLike)):
+            self.write_vector_document(path, <bint>True)
+            return self
+        cdef string c = os.fspath(path).encode("utf-8")
         self.thisptr.saveToPdf(c.c_str(), self.force_buffered_reads)
         self.thisptr.redraw = <bint> True  # Don't block further interactions
         return self
 
-    def save_svg(self, path: str):
+    def save_svg(self, path: Union[str, os.PathLike, BinaryIO]):
         """
         Saves an SVG file using the current configuration.
 
         Parameters
         ----------
-        path : str
-            Path to save the SVG file
+        path : str or file-like
+            Path to save the SVG file, or a writable binary file-like object or socket.
+            Output is streamed to file-like objects as it is produced
 
         Returns
         -------
         Gw
             Self for method chaining
         """
-        cdef string c = path.encode("utf-8")
+        if not isinstance(path, (str, os.PathLike)):
+            self.write_vector_document(path, <bint>False)
+            return self
+        cdef string c = os.fspath(path).encode("utf-8")
         self.thisptr.saveToSvg(c.c_str(), self.force_buffered_reads)
         self.thisptr.redraw = <bint> True  # Don't block further interactions
         return self
 
+    def encode_as_pdf(self) -> bytes:
+        """
+        Draw the current configuration as a PDF and return the binary data.
+
+        Returns
+        -------
+            bytes: PDF document
+
+        Raises
+        ------
+        RuntimeError
+            If the document could not be created
+        """
+        cdef string buffer
+        cdef CallbackWStream *stream = new CallbackWStream(appendToString, <void *>&buffer, 65536)
+        cdef bint ok
+        try:
+            ok = drawPdf(self.thisptr, stream, self.force_buffered_reads)
+        finally:
+            del stream
+        self.thisptr.redraw = <bint> True  # Don't block further interactions
+        if not ok or buffer.size() == 0:
+            raise RuntimeError("Encoding PDF failed, size was 0 bytes")
+        return PyBytes_FromStringAndSize(buffer.data(), buffer.size())
+
+    def encode_as_svg(self) -> bytes:
+        """
+        Draw the current configuration as an SVG and return the binary data.
+
+        Returns
+        -------
+            bytes: SVG document
+
+        Raises
+        ------
+        RuntimeError
+            If the document could not be created
+        """
+        cdef string buffer
+        cdef CallbackWStream *stream = new CallbackWStream(appendToString, <void *>&buffer, 65536)
+        cdef bint ok
+        try:
+            ok = drawSvg(self.thisptr, stream, self.force_buffered_reads)
+        finally:
+            del stream
+        self.thisptr.redraw = <bint> True  # Don't block further interactions
+        if not ok or buffer.size() == 0:
+            raise RuntimeError("Encoding SVG failed, size was 0 bytes")
+        return PyBytes_FromStringAndSize(buffer.data(), buffer.size())
+
     def draw(self, clear_buffer: bool = False):
         """
         Draw the visualisation to the raster surface. Caches state for using with interactive functions.
 
-        Creates the raster surface if it doesn't exist yet.
+        Creates the raster surface if it doesn't exist yet. If only some panels have changed since the
+        last draw (see invalidate), just those panels are redrawn and the rest of the surface is kept.
+        The threads used and other statistics are available from draw_stats afterwards.
 
         Parameters
         ----------
@@ -1820,10 +3894,121 @@ cdef class Gw:
             self.make_raster_surface()
         if clear_buffer:
             self.thisptr.processed = False
+            self.invalidate_surface()
         self.thisptr.syncImageCacheQueue()
-        self.thisptr.drawScreen(self.force_buffered_reads)
+        self.format_memory_labels()
+        cdef vector[int] panels, columns
+        cdef int max_y = self.thisptr.samMaxY
+        cdef long long estimated = 0, loaded = 0, span = 0
+        cdef int n_threads = self.thisptr.opts.threads
+        cdef size_t i
+        t0 = time.perf_counter()
+        if self.adaptive_threads:
+            estimated = self.estimate_reads()
+            n_threads = self.acquire_threads(-(-estimated // ADAPTIVE_READS_PER_THREAD))
+            # GW splits work across every thread in the pool, so the pool is sized to the count
+            # chosen. It is only rebuilt when the count changes
+            self.resize_pool(n_threads)
+            self.thisptr.opts.threads = n_threads
+        try:
+            if self.fetch_with_filter():
+                # Reads are fetched here instead of by GW, so the read filter rejects records before
+                # they are copied or parsed. GW's filter expressions are left to catch reads it
+                # fetches itself later, e.g. when scrolling
+                self.load_alignments(threads=n_threads, parse_mods=self.thisptr.opts.parse_mods)
+                self.force_buffered_reads = <bint>False
+            partial = (self.surface_valid and not self.pending_scroll
+                       and (self.dirty_panels or self.dirty_columns or self.dirty_tracks))
+            if partial:
+                for col, row in self.dirty_panels:
+                    panels.push_back(col)
+                    panels.push_back(row)
+                for col in self.dirty_columns:
+                    columns.push_back(col)
+                drawInvalidated(self.thisptr, panels, columns, self.dirty_tracks, self.force_buffered_reads)
+                partial = self.thisptr.samMaxY == max_y  # Reads loaded while drawing changed the scaling
+            if not partial:
+                self.thisptr.drawScreen(self.force_buffered_reads)
+            if self.pending_scroll:  # Scroll positions from restore, applied once reads are loaded
+                self.apply_scroll(self.pending_scroll)
+                self.pending_scroll = None
+                self.thisptr.drawScreen(<bint>True)
+        finally:
+            if self.adaptive_threads:
+                self.release_threads(n_threads)
+        for i in range(self.thisptr.collections.size()):
+            loaded += self.thisptr.collections[i].readQueue.size()
+        for i in range(self.thisptr.regions.size()):
+            span += self.thisptr.regions[i].end - self.thisptr.regions[i].start
+        if loaded > 0 and span > 0 and self.thisptr.sizeOfBams() > 0:
+            self.read_density = <double>loaded / (span * self.thisptr.sizeOfBams())
+        self.last_draw = {"threads": n_threads, "adaptive": bool(self.adaptive_threads),
+                          "estimated_reads": estimated if self.adaptive_threads else None,
+                          "reads": loaded, "partial": bool(partial), "draw_time": time.perf_counter() - t0}
+        self.dirty_panels.clear()
+        self.dirty_columns.clear()
+        self.dirty_tracks = False
+        self.surface_valid = True
+        self.hit_index = None  # Rebuilt on the next hit test
+        self.frame_drawn = True
+        self.settle_pending = False
+        self.collect_log()
         return self
 
+    def draw_progressive(self, preview_reads: int = 2000, io_threads: int = 4):
+        """
+        Draw the visualisation in two passes, yielding after each one.
+
+        The first frame is drawn from a sample of at most preview_reads reads per panel, spread across
+        each region, together with the reference sequence and tracks. It is ready after reading only
+        a small part of each alignment file. If iteration stops after the first frame, the sampled
+        reads are dropped, so the next draw shows every read. Coverage from a sample is not to scale, so the coverage
+        track is left empty in the first frame. The second frame is the full-detail view, identical to
+        calling draw(). If reads for the current view are already in memory, only the full-detail
+        frame is yielded.
+
+        Parameters
+        ----------
+        preview_reads : int, optional
+            Maximum number of reads per panel in the first frame
+        io_threads : int, optional
+            Maximum number of panels fetched concurrently for the first frame
+
+        Yields
+        ------
+        Gw
+            Self, after each frame has been drawn to the raster surface
+
+        Examples
+        --------
+        >>> for frame in gw.draw_progressive():
+        ...     emit("image_update", frame.encode_as_jpeg(quality=80))
+        """
+        if not self.raster_surface_created:
+            self.make_raster_surface()
+        if (self.force_buffered_reads or self.thisptr.processed or preview_reads <= 0
+                or self.thisptr.sizeOfBams() == 0 or self.thisptr.sizeOfRegions() == 0):
+            self.draw()
+            yield self
+            return
+        cdef size_t i
+        cdef bint finished = False
+        try:
+            self.load_alignments(io_threads=io_threads, max_reads=preview_reads)
+            for i in range(self.thisptr.collections.size()):
+                self.thisptr.collections[i].skipDrawingCoverage = <bint>True  # Space is kept, so reads do not move
+            self.draw()
+            yield self
+            self.clear_alignments()  # GW then fetches the complete set of reads
+            self.draw()
+            finished = True
+        finally:
+            if not finished:
+                # Stopped after the preview, or failed. The sampled reads, and with them the hidden
+                # coverage, are dropped so the next draw fetches every read
+                self.clear_alignments()
+        yield self
+
     def draw_image(self) -> Image.Image:
         """
         Draw the visualisation and return it as a PIL Image.
@@ -1848,6 +4033,192 @@ cdef class Gw:
             raise ImportError("Pillow could not be imported")
         self.draw_image().show()
 
+    cdef list fetch_tiles(self, list loci, int io_threads):
+        # Fetches reads for every (locus, bam) pair concurrently. Jobs are ordered by locus, then bam
+        cdef ReadIngestJob job
+        jobs = []
+        for chrom, start, end in loci:
+            for bamIdx in range(len(self.bam_paths)):
+                jobs.append(self.new_fetch_job(chrom, start, end, bamIdx, 1, 0))
+        if jobs:
+            with ThreadPoolExecutor(max_workers=max(1, min(io_threads, len(jobs)))) as executor:
+                list(executor.map(ReadIngestJob.fetch, jobs))
+        return jobs
+
+    cdef int load_fetched(self, list loci, list jobs) except -1:
+        # Replaces the regions and alignments with loci and their fetched reads, as from fetch_tiles
+        cdef int n_bams = len(self.bam_paths)
+        cdef int k
+        cdef ReadIngestJob job
+        self.clear_alignments()
+        self.clear_regions()
+        for chrom, start, end in loci:
+            self.add_region(chrom, start, end)
+        for k, job in enumerate(jobs):
+            job.index = self.new_collection(k // n_bams, k % n_bams)
+            self.own_arena(k // n_bams, k % n_bams, job.arena)
+        self.run_ingest_jobs(jobs, -1)
+        self.force_buffered_reads = <bint>True
+        return 0
+
+    cdef int draw_tiles(self, list loci, list jobs, int cols, int rows) except -1:
+        # Each row of tiles is drawn as a multi-region view into a horizontal band of the canvas
+        cdef int n_bams = len(self.bam_paths)
+        cdef int width = self.thisptr.opts.dimensions.x
+        cdef int height = self.thisptr.opts.dimensions.y
+        cdef int tile_height = height // rows
+        cdef int r, n
+        cdef vector[Region] saved_regions = self.thisptr.regions
+        cdef int saved_selection = self.thisptr.regionSelection
+        self.thisptr.drawBackground()
+        for r in range(rows):
+            row_loci = loci[r * cols: (r + 1) * cols]
+            n = len(row_loci)
+            if n == 0:
+                break
+            self.load_fetched(row_loci, jobs[r * cols * n_bams: (r * cols + n) * n_bams])
+            self.format_memory_labels()
+            drawToRect(self.thisptr, self.thisptr.pixelMemory.data(), width, height,
+                       0, r * tile_height, (width * n) // cols, tile_height, <bint>True)
+        # The tiles' reads are dropped and the regions put back, so the next draw shows the original view
+        self.clear_alignments()
+        self.thisptr.regions = saved_regions
+        self.thisptr.regionSelection = saved_selection
+        self.thisptr.redraw = <bint>False  # The canvas now holds the grid
+        self.invalidate_surface()
+        return 0
+
+    def render_grid(self, loci: Iterable[Union[str, Tuple[str, int, int]]], cols: int, rows: int,
+                    io_threads: int = 4):
+        """
+        Render a grid of loci onto the canvas in a single pass.
+
+        Reads for every tile are fetched concurrently, then each row of tiles is laid out and drawn
+        straight onto the canvas, with each tile measuring canvas_width / cols by canvas_height / rows.
+        Loaded alignments are cleared, and the regions are left as they were, so the next draw shows
+        the previous view again. Use array, encode_as_png or save_png afterwards to retrieve the image.
+
+        Parameters
+        ----------
+        loci : iterable
+            Up to cols * rows loci, each either a (chrom, start, end) tuple or a "chrom:start-end" string
+        cols : int
+            Number of columns in the grid
+        rows : int
+            Number of rows in the grid
+        io_threads : int, optional
+            Maximum number of tiles fetched concurrently
+
+        Returns
+        -------
+        Gw
+            Self for method chaining
+
+        Raises
+        ------
+        IndexError
+            If no bam files have been added
+        ValueError
+            If there are more loci than tiles, or a locus could not be parsed
+
+        Examples
+        --------
+        >>> gw = Gw("reference.fa", canvas_width=2400, canvas_height=1600)
+        >>> gw.add_bam("sample.bam")
+        >>> gw.render_grid(["chr1:1000-2000", ("chr2", 5000, 6000)], cols=2, rows=1).save_png("grid.png")
+        """
+        loci = [parse_locus(locus) for locus in loci]
+        if cols < 1 or rows < 1:
+            raise ValueError("cols and rows must be at least 1")
+        if len(loci) > cols * rows:
+            raise ValueError(f"Too many loci ({len(loci)}) for a {cols}x{rows} grid")
+        if self.thisptr.sizeOfBams() == 0:
+            raise IndexError("Add a bam/cram file first")
+        if not self.raster_surface_created:
+            self.make_raster_surface()
+        self.draw_tiles(loci, self.fetch_tiles(loci, io_threads), cols, rows)
+        return self
+
+    def iter_grid_pages(self, path: str, cols: int, rows: int, flank: int = 500, io_threads: int = 4):
+        """
+        Render every locus in a VCF or BED file as a series of grid pages.
+
+        Each page is rendered with render_grid. Reads for the next page are fetched in the
+        background while the current page is being drawn and consumed.
+
+        Parameters
+        ----------
+        path : str
+            Path to a VCF/BCF or BED file
+        cols : int
+            Number of columns in the grid
+        rows : int
+            Number of rows in the grid
+        flank : int, optional
+            Number of bases added to each side of each locus
+        io_threads : int, optional
+            Maximum number of tiles fetched concurrently
+
+        Yields
+        ------
+        Gw
+            Self, with the canvas holding the next page
+
+        Examples
+        --------
+        >>> for i, page in enumerate(gw.iter_grid_pages("calls.vcf", cols=8, rows=6)):
+        ...     page.save_png(f"page_{i}.png")
+        """
+        if cols < 1 or rows < 1:
+            raise ValueError("cols and rows must be at least 1")
+        if self.thisptr.sizeOfBams() == 0:
+            raise IndexError("Add a bam/cram file first")
+        if not self.raster_surface_created:
+            self.make_raster_surface()
+        pages = iter_pages(read_loci(path, flank), cols * rows)
+        with ThreadPoolExecutor(max_workers=1) as prefetcher:
+            page = next(pages, None)
+            pending = prefetcher.submit(lambda p: self.fetch_tiles(p, io_threads), page) if page else None
+            while page:
+                jobs = pending.result()
+                next_page = next(pages, None)
+                if next_page:
+                    pending = prefetcher.submit(lambda p: self.fetch_tiles(p, io_threads), next_page)
+                self.draw_tiles(page, jobs, cols, rows)
+                yield self
+                page = next_page
+
+    def pdf_report(self, path: Union[str, os.PathLike, BinaryIO], title: str = "", io_threads: int = 4):
+        """
+        Start a multi-page PDF report, with one page per locus.
+
+        Pages are streamed into a single PDF as they are added, so memory use does not grow with the
+        number of pages. Fonts are shared by every page. Reads for each locus are fetched in the
+        background while the previous page is drawn and written. Use as a context manager, or call
+        close when done.
+
+        Parameters
+        ----------
+        path : str or file-like
+            Path to save the PDF file, or a writable binary file-like object or socket
+        title : str, optional
+            Document title
+        io_threads : int, optional
+            Maximum number of bam files fetched concurrently for each locus
+
+        Returns
+        -------
+        PdfReport
+            The report. Each page replaces the regions and alignments of this Gw instance
+
+        Examples
+        --------
+        >>> with gw.pdf_report("review.pdf") as report:
+        ...     for chrom, start, end, name in candidates:
+        ...         report.add_page(chrom, start, end, title=name)
+        """
+        return PdfReport(self, path, title, io_threads)
+
     def view_region(self, chrom: str, start: int, end: int):
         """
         Clear existing regions and view a specific genomic region.
@@ -1912,6 +4283,134 @@ cdef class Gw:
             return PyBytes_FromStringAndSize(<char *> jpeg_data.first, jpeg_data.second)
         raise RuntimeError("Encoding image failed, size was 0 bytes")
 
+    def set_interaction_quality(self, scale: float = 0.5, settle_time: float = 0.25):
+        """
+        Render frames at a reduced resolution while key and mouse events are streaming.
+
+        Frames returned by encode_frame within settle_time seconds of the last key_press or
+        mouse_event are drawn at scale times the canvas size, with the same layout. Once events
+        stop for settle_time seconds, settle returns a single full-resolution frame. A scale
+        of 1 turns this off.
+
+        Parameters
+        ----------
+        scale : float, optional
+            Resolution of interaction frames relative to the canvas, between 0 and 1
+        settle_time : float, optional
+            Idle time in seconds before the full-resolution frame is drawn
+
+        Returns
+        -------
+        Gw
+            Self for method chaining
+
+        Raises
+        ------
+        ValueError
+            If scale is not in (0, 1] or settle_time is negative
+        """
+        if not 0 < scale <= 1:
+            raise ValueError("scale must be greater than 0 and at most 1")
+        if settle_time < 0:
+            raise ValueError("settle_time must be 0 or greater")
+        self.interaction_scale = scale
+        self.settle_time = settle_time
+        return self
+
+    @property
+    def interaction_quality(self) -> Tuple[float, float]:
+        """
+        Get the interaction scale and settle time.
+
+        Returns
+        -------
+        tuple
+            (scale, settle_time)
+        """
+        return self.interaction_scale, self.settle_time
+
+    @property
+    def settle_delay(self) -> Optional[float]:
+        """
+        Seconds until the full-resolution frame is due.
+
+        Returns
+        -------
+        float or None
+            0 if settle will draw now, or None if the last frame was drawn at full resolution
+        """
+        if not self.settle_pending:
+            return None
+        return max(0.0, self.settle_time - (time.perf_counter() - self.last_interaction))
+
+    def encode_frame(self, quality: int = 80) -> Tuple[bytes, float]:
+        """
+        Draw the visualisation and encode it as JPEG, at reduced resolution during interaction.
+
+        See set_interaction_quality. Reduced frames are tagged with their scale, so clients can
+        upscale them to the canvas size. After a reduced frame, call settle once settle_delay
+        seconds have passed to get the full-resolution frame.
+
+        Parameters
+        ----------
+        quality : int, optional
+            JPEG quality
+
+        Returns
+        -------
+        tuple
+            (jpeg_bytes, scale), where scale is 1 for a full-resolution frame
+
+        Raises
+        ------
+        RuntimeError
+            If image encoding failed
+
+        Examples
+        --------
+        >>> gw.set_interaction_quality(scale=0.5, settle_time=0.25)
+        >>> gw.key_press(GLFW.KEY_RIGHT, 0, GLFW.PRESS, 0)
+        >>> data, scale = gw.encode_frame()
+        """
+        if (self.interaction_scale >= 1 or self.pending_scroll
+                or time.perf_counter() - self.last_interaction >= self.settle_time):
+            self.draw()
+            return self.encode_as_jpeg(quality), 1.0
+        if not self.raster_surface_created:
+            self.make_raster_surface()
+        self.thisptr.syncImageCacheQueue()
+        self.format_memory_labels()
+        cdef string buffer = encodeScaledJpeg(self.thisptr, self.interaction_scale, quality,
+                                              self.force_buffered_reads)
+        # The layout matches the canvas, but its pixels are left for the settle frame
+        self.thisptr.redraw = <bint> True
+        self.hit_index = None
+        self.frame_drawn = True
+        self.settle_pending = True
+        self.collect_log()
+        if buffer.size() == 0:
+            raise RuntimeError("Encoding image failed, size was 0 bytes")
+        return PyBytes_FromStringAndSize(buffer.data(), buffer.size()), self.interaction_scale
+
+    def settle(self, quality: int = 80) -> Optional[bytes]:
+        """
+        Draw the full-resolution frame once interaction has stopped.
+
+        Parameters
+        ----------
+        quality : int, optional
+            JPEG quality
+
+        Returns
+        -------
+        bytes or None
+            JPEG data, or None if no reduced frame is waiting or settle_delay has not passed
+        """
+        if not self.settle_pending or self.settle_delay > 0:
+            return None
+        self.draw()
+        return self.encode_as_jpeg(quality)
+
     @property
     def __array_interface__(self) -> Optional[Dict[str, Any]]:
         """
@@ -1978,5 +4477,131 @@ cdef class Gw:
         return np.asarray(self)
 
     def __dealloc__(self):
-        """ Freeing of Gw is left to the c++ layer"""
-        pass
\ No newline at end of file
+        # Runs before the read arenas are released, so collections never point at freed reads
+        if self.thisptr != NULL:
+            # ~GwPlot destroys the GLFW window, which is only safe on the thread that made it
+            if self.thisptr.window != NULL and PyThread_get_thread_ident() != self.window_thread:
+                self.thisptr.window = NULL
+            del self.thisptr
+            self.thisptr = NULL
+
+
+cdef class PdfReport:
+    """
+    A PDF document with one page per locus, written as pages are added. Create with Gw.pdf_report.
+
+    Each page is drawn when the next page is added, or when the report is closed, so that the reads
+    for a page are fetched while the previous page is drawn and written.
+    """
+    cdef Gw gw
+    cdef PdfPages *pages
+    cdef CallbackWStream *stream
+    cdef StreamTarget target
+    cdef object file
+    cdef object prefetcher
+    cdef object pending
+    cdef int io_threads
+    cdef readonly int page_count
+
+    def __cinit__(self, Gw gw, path, str title, int io_threads):
+        self.gw = gw
+        self.io_threads = io_threads
+        self.file = open(os.fspath(path), "wb") if isinstance(path, (str, os.PathLike)) else None
+        self.target = StreamTarget(self.file if self.file is not None else path)
+        self.stream = new CallbackWStream(write_to_target, <void *>self.target, 65536)
+        cdef string c_title = title.encode("utf-8")
+        self.pages = new PdfPages(self.stream, c_title)
+        self.prefetcher = ThreadPoolExecutor(max_workers=1)
+        self.pending = None
+        self.page_count = 0
+        if not gw.raster_surface_created:
+            gw.make_raster_surface()
+
+    def __dealloc__(self):
+        # Only close finishes a report. Nothing more is written from here, as the target may already
+        # be gone and another thread may be drawing with the Gw
+        if self.prefetcher is not None:
+            warnings.warn("PdfReport was not closed, the document is incomplete", ResourceWarning)
+        if self.stream != NULL:
+            self.stream.ok = <bint>False
+        del self.pages
+        del self.stream
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def add_page(self, chrom: str, start: int, end: int, title: Optional[str] = None):
+        """
+        Add a page showing a locus.
+
+        Parameters
+        ----------
+        chrom : str
+            Chromosome
+        start : int
+            Region start
+        end : int
+            Region end
+        title : str, optional
+            Title printed above the page. Defaults to the locus
+
+        Returns
+        -------
+        PdfReport
+            Self for method chaining
+
+        Raises
+        ------
+        RuntimeError
+            If the report has been closed, or writing failed
+        """
+        if self.prefetcher is None:
+            raise RuntimeError("The report has been closed")
+        locus = (chrom, start, end)
+        cdef Gw gw = self.gw
+        cdef int io_threads = self.io_threads
+        future = self.prefetcher.submit(lambda l: gw.fetch_tiles([l], io_threads), locus)
+        if self.pending is not None:
+            self.write_page(self.pending)
+        self.pending = (locus, f"{chrom}:{start}-{end}" if title is None else title, future)
+        return self
+
+    cdef int write_page(self, tuple page) except -1:
+        # Loads the prefetched reads for a page, then draws it into the document
+        locus, title, future = page
+        cdef string c_title = title.encode("utf-8")
+        cdef bint ok
+        self.gw.load_fetched([locus], future.result())
+        with nogil:
+            ok = self.pages.addPage(self.gw.thisptr, c_title, <bint>True)
+        self.check(ok)
+        self.page_count += 1
+        return 0
+
+    cdef int check(self, bint ok) except -1:
+        if self.target.error is not None:
+            raise self.target.error
+        if not ok:
+            raise RuntimeError("Writing PDF report failed")
+        return 0
+
+    def close(self) -> None:
+        """
+        Write any remaining page and finish the document.
+        """
+        if self.prefetcher is None:
+            return
+        try:
+            if self.pending is not None:
+                pending, self.pending = self.pending, None
+                self.write_page(pending)
+            self.check(self.pages.close())
+        finally:
+            self.prefetcher.shutdown()
+            self.prefetcher = None
+            if self.file is not None:
+                self.file.close()
+            self.gw.thisptr.redraw = <bint>True
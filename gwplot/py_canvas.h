@@ -0,0 +1,161 @@
+// Drawing helpers used by the gwplot Python interface, for composing several
+// GW draws onto a single raster image
+#pragma once
+
+#include <algorithm>
+#include <cmath>
+#include <memory>
+#include <string>
+#include <vector>
+
+#include "include/core/SkCanvas.h"
+#include "include/core/SkImageInfo.h"
+#include "include/core/SkPixmap.h"
+#include "include/core/SkRect.h"
+#include "include/core/SkRegion.h"
+#include "include/encode/SkJpegEncoder.h"
+
+#include "plot_manager.h"
+#include "py_wstream.h"
+
+
+namespace GwPy {
+
+    // Draws the current regions and collections into a rectangle of an N32 pixel buffer. The plot
+    // is laid out as if its frame buffer were width x height, then restored afterwards
+    inline void drawToRect(Manager::GwPlot *plot, char *pixels, int page_width, int page_height,
+                           float x, float y, int width, int height, bool force_buffered_reads) {
+        SkImageInfo info = SkImageInfo::MakeN32Premul(page_width, page_height);
+        std::unique_ptr<SkCanvas> canvas = SkCanvas::MakeRasterDirect(info, pixels, (size_t)page_width * 4);
+        if (!canvas) {
+            return;
+        }
+        int fb_width = plot->fb_width;
+        int fb_height = plot->fb_height;
+        plot->fb_width = width;
+        plot->fb_height = height;
+        plot->setScaling();
+        canvas->translate(x, y);
+        canvas->clipRect(SkRect::MakeWH((float)width, (float)height));
+        plot->runDrawOnCanvas(canvas.get(), force_buffered_reads);
+        plot->fb_width = fb_width;
+        plot->fb_height = fb_height;
+        plot->setScaling();
+    }
+
+    // Draws rows y to y + band_height of the plot, laid out as a width x height image, into an RGBA
+    // pixel buffer of width x band_height. The frame buffer size is restored afterwards
+    inline void drawBand(Manager::GwPlot *plot, char *pixels, int width, int height, int y, int band_height,
+                         bool force_buffered_reads) {
+        SkImageInfo info = SkImageInfo::Make(width, band_height, kRGBA_8888_SkColorType, kPremul_SkAlphaType);
+        std::unique_ptr<SkCanvas> canvas = SkCanvas::MakeRasterDirect(info, pixels, (size_t)width * 4);
+        if (!canvas) {
+            return;
+        }
+        int fb_width = plot->fb_width;
+        int fb_height = plot->fb_height;
+        plot->fb_width = width;
+        plot->fb_height = height;
+        plot->setScaling();
+        canvas->drawPaint(plot->opts.theme.bgPaint);
+        canvas->translate(0, -(float)y);
+        plot->runDrawOnCanvas(canvas.get(), force_buffered_reads);
+        plot->fb_width = fb_width;
+        plot->fb_height = fb_height;
+        plot->setScaling();
+    }
+
+    // Draws the plot into a buffer scaled down from the frame buffer size and returns it as a JPEG.
+    // The layout is unchanged, only fewer pixels are rasterised and encoded. Returns an empty string
+    // if drawing or encoding failed
+    inline std::string encodeScaledJpeg(Manager::GwPlot *plot, float scale, int quality,
+                                        bool force_buffered_reads) {
+        std::string out;
+        int width = std::max(1, (int)(plot->fb_width * scale));
+        int height = std::max(1, (int)(plot->fb_height * scale));
+        SkImageInfo info = SkImageInfo::MakeN32Premul(width, height);
+        std::vector<char> pixels((size_t)width * height * 4);
+        std::unique_ptr<SkCanvas> canvas = SkCanvas::MakeRasterDirect(info, pixels.data(), (size_t)width * 4);
+        if (!canvas) {
+            return out;
+        }
+        canvas->scale((float)width / (float)plot->fb_width, (float)height / (float)plot->fb_height);
+        canvas->drawPaint(plot->opts.theme.bgPaint);
+        plot->runDrawOnCanvas(canvas.get(), force_buffered_reads);
+        SkPixmap pixmap(info, pixels.data(), (size_t)width * 4);
+        SkJpegEncoder::Options options;
+        options.fQuality = quality;
+        CallbackWStream stream(appendToString, &out, 65536);
+        bool ok = SkJpegEncoder::Encode(&stream, pixmap, options);
+        stream.flush();
+        if (!ok) {
+            out.clear();
+        }
+        return out;
+    }
+
+    // Redraws the invalidated parts of the plot onto its raster surface, keeping the rest of the
+    // previous frame. panels holds (region index, bam index) pairs, columns holds region indexes
+    // and tracks selects the track strip. Collections outside every invalidated rectangle are
+    // skipped and all other drawing is clipped to the rectangles. Returns the number of
+    // collections drawn
+    inline int drawInvalidated(Manager::GwPlot *plot, const std::vector<int> &panels,
+                               const std::vector<int> &columns, bool tracks, bool force_buffered_reads) {
+        int width = plot->fb_width;
+        int height = plot->fb_height;
+        SkImageInfo info = SkImageInfo::MakeN32Premul(width, height);
+        std::unique_ptr<SkCanvas> canvas = SkCanvas::MakeRasterDirect(info, plot->pixelMemory.data(), (size_t)width * 4);
+        if (!canvas) {
+            return 0;
+        }
+        plot->setScaling();
+        SkRegion dirty;
+        float column_width = (float)width / (float)std::max<size_t>(1, plot->regions.size());
+        for (int c : columns) {
+            dirty.op(SkIRect::MakeLTRB((int)std::floor(c * column_width), 0,
+                                       (int)std::ceil((c + 1) * column_width), height), SkRegion::kUnion_Op);
+        }
+        if (tracks) {
+            int top = (int)std::floor(height - plot->totalTabixY - plot->sliderSpace);
+            dirty.op(SkIRect::MakeLTRB(0, std::max(0, top), width, height), SkRegion::kUnion_Op);
+        }
+        std::vector<bool> selected(plot->collections.size(), false);
+        for (size_t i = 0; i < plot->collections.size(); ++i) {
+            Segs::ReadCollection &cl = plot->collections[i];
+            for (size_t j = 0; j + 1 < panels.size(); j += 2) {
+                if (panels[j] == cl.regionIdx && panels[j + 1] == cl.bamIdx) {
+                    selected[i] = true;
+                    dirty.op(SkRect::MakeXYWH(cl.xOffset, cl.yOffset, cl.regionPixels, cl.yPixels).roundOut(),
+                             SkRegion::kUnion_Op);
+                }
+            }
+        }
+        if (dirty.isEmpty()) {
+            return 0;
+        }
+        // Collections in a dirty column are drawn too. The others keep their pixels
+        std::vector<std::pair<bool, bool>> draw_state;
+        draw_state.reserve(plot->collections.size());
+        int n_drawn = 0;
+        for (size_t i = 0; i < plot->collections.size(); ++i) {
+            Segs::ReadCollection &cl = plot->collections[i];
+            draw_state.emplace_back(cl.skipDrawingReads, cl.skipDrawingCoverage);
+            SkIRect rect = SkRect::MakeXYWH(cl.xOffset, cl.yOffset, cl.regionPixels, cl.yPixels).roundOut();
+            bool draw = selected[i] || dirty.intersects(rect);
+            cl.skipDrawingReads = !draw;
+            cl.skipDrawingCoverage = !draw;
+            n_drawn += draw ? 1 : 0;
+        }
+        canvas->clipRegion(dirty);
+        plot->runDrawOnCanvas(canvas.get(), force_buffered_reads);
+        if (draw_state.size() == plot->collections.size()) {
+            for (size_t i = 0; i < draw_state.size(); ++i) {
+                plot->collections[i].skipDrawingReads = draw_state[i].first;
+                plot->collections[i].skipDrawingCoverage = draw_state[i].second;
+            }
+        }
+        plot->redraw = false;
+        return n_drawn;
+    }
+
+}
@@ -0,0 +1,104 @@
+// In-memory data tracks used by the gwplot Python interface. Blocks are held in the same interval
+// trees GW builds when loading an unindexed BED file, so they are drawn by the usual track code
+#pragma once
+
+#include <cstdint>
+#include <cstdio>
+#include <string>
+#include <vector>
+
+#include "hts_funcs.h"
+#include "plot_manager.h"
+#include "utils.h"
+
+
+namespace GwPy {
+
+    // Appends an empty track to the plot, set up as addTrack does for a BED file
+    inline void addMemoryTrack(Manager::GwPlot *plot, const std::string &name) {
+        plot->tracks.emplace_back();
+        HGW::GwTrack &track = plot->tracks.back();
+        track.path = name;
+        track.kind = HGW::FType::BED_NOI;
+        track.variant_distance = &plot->opts.variant_distance;
+        track.setPaint(plot->opts.theme.fcTrack);
+        plot->redraw = true;
+    }
+
+    inline void formatLine(Utils::TrackBlock &block) {
+        block.line = block.chrom + "\t" + std::to_string(block.start) + "\t" + std::to_string(block.end) + "\t" + block.name;
+    }
+
+    inline void formatValue(Utils::TrackBlock &block, float value, bool label) {
+        char buffer[32];
+        block.value = value;
+        if (label) {
+            std::snprintf(buffer, sizeof(buffer), "%.4g", value);
+            block.name = buffer;
+        }
+        formatLine(block);
+    }
+
+    // Adds blocks to a chromosome of a memory track and builds its interval tree. The tree sorts
+    // blocks by start, so order (of length n) receives the input position of each block in tree
+    // order. values, names and strands may be null. Strands are stored as GW does: 0 none,
+    // 1 forward, 2 reverse
+    inline void setMemoryBlocks(HGW::GwTrack &track, const std::string &chrom, size_t n,
+                                const int64_t *starts, const int64_t *ends, const double *values,
+                                const std::vector<std::string> *names, const int8_t *strands,
+                                bool label_values, int64_t *order) {
+        IITree<int, Utils::TrackBlock> &tree = track.allBlocks[chrom];
+        Utils::TrackBlock empty;
+        for (size_t i = 0; i < n; ++i) {
+            Utils::TrackBlock block;
+            block.chrom = chrom;
+            block.start = (int)starts[i];
+            block.end = (int)ends[i];
+            block.level = (int)i;  // Recovered after indexing, then reset
+            if (names != nullptr) {
+                block.name = (*names)[i];
+            }
+            if (strands != nullptr) {
+                block.strand = strands[i] > 0 ? 1 : (strands[i] < 0 ? 2 : 0);
+            }
+            if (values != nullptr) {
+                formatValue(block, (float)values[i], label_values && names == nullptr);
+            } else {
+                formatLine(block);
+            }
+            tree.add(block.start, block.end, block);
+        }
+        tree.index();
+        for (size_t i = 0; i < tree.size() && i < n; ++i) {
+            Utils::TrackBlock &block = const_cast<Utils::TrackBlock &>(tree.data(i));
+            order[i] = block.level;
+            block.level = empty.level;
+        }
+    }
+
+    // Updates block values in place. values is in input order, and order is from setMemoryBlocks.
+    // Only the values are stored, labels are left to formatMemoryLabels
+    inline void setMemoryValues(HGW::GwTrack &track, const std::string &chrom, const int64_t *order,
+                                size_t n, const double *values) {
+        IITree<int, Utils::TrackBlock> &tree = track.allBlocks[chrom];
+        for (size_t i = 0; i < n && i < tree.size(); ++i) {
+            const_cast<Utils::TrackBlock &>(tree.data(i)).value = (float)values[order[i]];
+        }
+    }
+
+    // Labels the blocks overlapping start-end with their current value, so only the blocks in view
+    // are formatted after each update
+    inline void formatMemoryLabels(HGW::GwTrack &track, const std::string &chrom, int start, int end) {
+        auto it = track.allBlocks.find(chrom);
+        if (it == track.allBlocks.end()) {
+            return;
+        }
+        std::vector<size_t> hits;
+        it->second.overlap(start, end, hits);
+        for (size_t i : hits) {
+            Utils::TrackBlock &block = const_cast<Utils::TrackBlock &>(it->second.data(i));
+            formatValue(block, block.value, true);
+        }
+    }
+
+}
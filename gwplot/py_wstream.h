@@ -0,0 +1,152 @@
+// Skia output streams used by the gwplot Python interface, so that vector
+// documents can be written to memory or to Python file-like objects
+#pragma once
+
+#include <cstring>
+#include <memory>
+#include <string>
+#include <vector>
+
+#include "include/core/SkCanvas.h"
+#include "include/core/SkDocument.h"
+#include "include/core/SkFont.h"
+#include "include/core/SkRect.h"
+#include "include/core/SkStream.h"
+#include "include/docs/SkPDFDocument.h"
+#include "include/svg/SkSVGCanvas.h"
+
+#include "plot_manager.h"
+
+
+namespace GwPy {
+
+    // Receives a chunk of output. Returning false stops any further writes
+    typedef bool (*write_fn)(void *ctx, const void *buffer, size_t size);
+
+    // Buffers output from Skia and forwards it to a callback in chunks of buffer_size bytes
+    class CallbackWStream : public SkWStream {
+    public:
+        bool ok;
+
+        CallbackWStream(write_fn fn, void *ctx, size_t buffer_size)
+            : ok(true), fn(fn), ctx(ctx), buffer_size(buffer_size), written(0) {
+            buffer.reserve(buffer_size);
+        }
+
+        ~CallbackWStream() override {
+            flush();
+        }
+
+        bool write(const void *data, size_t size) override {
+            if (!ok) {
+                return false;
+            }
+            written += size;
+            if (buffer.size() + size > buffer_size) {
+                flush();
+                if (size >= buffer_size) {  // Large writes skip the buffer
+                    ok = ok && fn(ctx, data, size);
+                    return ok;
+                }
+            }
+            const char *p = static_cast<const char *>(data);
+            buffer.insert(buffer.end(), p, p + size);
+            return ok;
+        }
+
+        void flush() override {
+            if (ok && !buffer.empty()) {
+                ok = fn(ctx, buffer.data(), buffer.size());
+            }
+            buffer.clear();
+        }
+
+        size_t bytesWritten() const override {
+            return written;
+        }
+
+    private:
+        write_fn fn;
+        void *ctx;
+        size_t buffer_size;
+        size_t written;
+        std::vector<char> buffer;
+    };
+
+    inline bool appendToString(void *ctx, const void *buffer, size_t size) {
+        static_cast<std::string *>(ctx)->append(static_cast<const char *>(buffer), size);
+        return true;
+    }
+
+    inline bool drawPdf(Manager::GwPlot *plot, CallbackWStream *stream, bool force_buffered_reads) {
+        sk_sp<SkDocument> document = SkPDF::MakeDocument(stream);
+        if (!document) {
+            return false;
+        }
+        SkCanvas *canvas = document->beginPage((float)plot->fb_width, (float)plot->fb_height);
+        plot->runDrawOnCanvas(canvas, force_buffered_reads);
+        document->close();
+        stream->flush();
+        return stream->ok;
+    }
+
+    // A PDF document written one page at a time. Each page is written to the stream when the next
+    // page begins, and fonts are shared by every page and written once, when the document is closed
+    class PdfPages {
+    public:
+        PdfPages(CallbackWStream *stream, const std::string &title) : stream(stream) {
+            SkPDF::Metadata metadata;
+            metadata.fTitle = SkString(title.c_str());
+            metadata.fCreator = SkString("gwplot");
+            document = SkPDF::MakeDocument(stream, metadata);
+        }
+
+        // Draws the current view as a page, with an optional title above it
+        bool addPage(Manager::GwPlot *plot, const std::string &title, bool force_buffered_reads) {
+            if (!document || !stream->ok) {
+                return false;
+            }
+            const SkFont &font = plot->fonts.overlay;
+            float title_height = title.empty() ? 0 : plot->fonts.overlayHeight * 2.5f;
+            SkCanvas *canvas = document->beginPage((float)plot->fb_width, (float)plot->fb_height + title_height);
+            canvas->save();
+            canvas->translate(0, title_height);
+            plot->runDrawOnCanvas(canvas, force_buffered_reads);
+            canvas->restore();
+            if (!title.empty()) {
+                canvas->drawRect(SkRect::MakeWH((float)plot->fb_width, title_height), plot->opts.theme.bgPaint);
+                canvas->drawString(title.c_str(), plot->fonts.overlayHeight, plot->fonts.overlayHeight * 1.75f,
+                                   font, plot->opts.theme.tcLabels);
+            }
+            document->endPage();
+            return stream->ok;
+        }
+
+        bool close() {
+            if (!document) {
+                return false;
+            }
+            document->close();
+            document.reset();
+            stream->flush();
+            return stream->ok;
+        }
+
+    private:
+        sk_sp<SkDocument> document;
+        CallbackWStream *stream;
+    };
+
+    inline bool drawSvg(Manager::GwPlot *plot, CallbackWStream *stream, bool force_buffered_reads) {
+        std::unique_ptr<SkCanvas> canvas = SkSVGCanvas::Make(
+                SkRect::MakeWH((float)plot->fb_width, (float)plot->fb_height), stream);
+        if (!canvas) {
+            return false;
+        }
+        plot->runDrawOnCanvas(canvas.get(), force_buffered_reads);
+        canvas.reset();  // The SVG document is completed when the canvas is destroyed
+        stream->flush();
+        return stream->ok;
+    }
+
+}
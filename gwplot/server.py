@@ -0,0 +1,744 @@
+"""
+Multi-process serving of interactive Gw sessions.
+
+SessionServer runs a pool of worker processes, each owning a set of Gw sessions. The front
+process, typically a websocket server, routes every event for a session to the worker that owns
+it, so sessions draw in parallel on separate cores without a global lock. Requests are bounded
+per worker: when a worker is saturated, new requests wait briefly and then fail with ServerBusy,
+which the front end can report to the client instead of queueing without limit. Workers evict
+sessions that have been idle for too long, and the least recently used sessions while the
+process is over its memory limit.
+
+Events are the calls recorded by gwplot.trace, so a server can be load tested locally with
+recorded traces and stand-in clients:
+
+>>> python -m gwplot.server tests/traces/scroll.json --workers 4 --clients 200
+"""
+import argparse
+import asyncio
+import itertools
+import multiprocessing
+import os
+import sys
+import threading
+import time
+import uuid
+from collections import OrderedDict, deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional
+
+from gwplot.trace import RECORDED_EVENTS, _make_gw, _percentiles, load_trace
+
+__all__ = ["SessionServer", "ServerBusy", "SessionNotFound", "StandInClient", "run_load", "EVENT_OPS"]
+
+# Events a session accepts. refresh draws a full frame, and settle draws the full-resolution
+# frame after a reduced interaction frame
+EVENT_OPS = RECORDED_EVENTS + ("refresh", "settle")
+LATENCY_SAMPLES = 2048
+
+
+class ServerBusy(RuntimeError):
+    """ Raised when every worker that could take a request is saturated """
+
+
+class SessionNotFound(KeyError):
+    """ Raised for a session that was closed, evicted or lost with its worker """
+
+
+class _Session:
+    __slots__ = ("gw", "log_cursor", "last_access")
+
+    def __init__(self, gw) -> None:
+        self.gw = gw
+        self.log_cursor = 0
+        self.last_access = time.monotonic()
+
+
+def _new_log(session: _Session) -> str:
+    entries, session.log_cursor = session.gw.log_since(session.log_cursor)
+    return "".join(e["payload"] + "\n" for e in entries)
+
+
+def _memory_in_use() -> Optional[int]:
+    from gwplot.soak import process_stats
+
+    stats = process_stats()
+    # Allocator usage falls as soon as a session is freed, resident memory often does not
+    return stats["heap"] if stats["heap"] is not None else stats["rss"]
+
+
+def _run_event(session: _Session, op: str, args: List[Any], quality: int) -> Dict[str, Any]:
+    from gwplot import GLFW
+
+    gw = session.gw
+    frame, scale = None, 1.0
+    if op == "refresh":
+        gw.draw()
+        frame = gw.encode_as_jpeg(quality)
+    elif op == "settle":
+        frame = gw.settle(quality)
+    else:
+        if op == "key_press" and args[1] is None:  # Scancodes are platform specific
+            args[1] = GLFW.get_key_scancode(args[0])
+        getattr(gw, op)(*args)
+        if not (op == "mouse_event" and args[3] == GLFW.PRESS) and (gw.redraw or gw.clear_buffer):
+            frame, scale = gw.encode_frame(quality)
+    return {"frame": frame, "scale": scale, "log": _new_log(session)}
+
+
+def _worker_main(conn, config: Dict[str, Any]) -> None:
+    # Requests are (request id, session id, op, payload) tuples and None to stop. Replies are
+    # (request id, result). Messages not answering a request have a request id of None
+    from gwplot import set_core_budget
+
+    # Sessions draw with adaptive threads, sharing this worker's share of the cores
+    set_core_budget(config["core_budget"])
+    sessions: "OrderedDict[str, _Session]" = OrderedDict()
+    served = {"requests": 0, "frames": 0, "evicted": 0, "errors": 0}
+    busy_time = 0.0
+    started = time.monotonic()
+    last_check = 0.0
+
+    def evict(now: float) -> List[str]:
+        evicted = [sid for sid, s in sessions.items() if now - s.last_access > config["max_age"]]
+        for sid in evicted:
+            del sessions[sid]
+        # One session at a time, so the next check sees the memory it released
+        if config["max_memory"] and sessions and (_memory_in_use() or 0) > config["max_memory"]:
+            evicted.append(sessions.popitem(last=False)[0])
+        served["evicted"] += len(evicted)
+        return evicted
+
+    def handle(sid: Optional[str], op: str, payload: Any) -> Dict[str, Any]:
+        if op == "create":
+            gw = _make_gw(payload)
+            if "snapshot" not in payload and "threads" not in payload.get("settings", {}):
+                gw.set_threads("auto")
+            if config["interaction_scale"] < 1:
+                gw.set_interaction_quality(config["interaction_scale"], config["settle_time"])
+            sessions[sid] = session = _Session(gw)
+            return _run_event(session, "refresh", [], config["quality"])
+        if op == "stats":
+            return dict(served, sessions=len(sessions), pid=os.getpid(), memory=_memory_in_use(),
+                        busy=busy_time / max(1e-9, time.monotonic() - started))
+        session = sessions.get(sid)
+        if session is None:
+            raise SessionNotFound(sid)
+        if op == "close":
+            del sessions[sid]
+            return {}
+        session.last_access = time.monotonic()
+        sessions.move_to_end(sid)
+        return _run_event(session, op, list(payload), config["quality"])
+
+    while True:
+        timeout = config["check_interval"]
+        for s in sessions.values():
+            delay = s.gw.settle_delay
+            if delay is not None:
+                timeout = min(timeout, delay)
+        if conn.poll(timeout):
+            message = conn.recv()
+            if message is None:
+                break
+            req_id, sid, op, payload = message
+            t0 = time.perf_counter()
+            try:
+                result = handle(sid, op, payload)
+            except Exception as e:
+                served["errors"] += 1
+                result = {"error": type(e).__name__, "message": str(e)}
+            busy_time += time.perf_counter() - t0
+            served["requests"] += 1
+            served["frames"] += 1 if result.get("frame") else 0
+            conn.send((req_id, result))
+        # Full-resolution frames are pushed to the front once interaction on a session stops
+        for sid, s in sessions.items():
+            if s.gw.settle_delay == 0:
+                frame = s.gw.settle(config["quality"])
+                if frame is not None:
+                    served["frames"] += 1
+                    conn.send((None, {"session": sid, "frame": frame, "scale": 1.0, "log": _new_log(s)}))
+        now = time.monotonic()
+        if now - last_check >= config["check_interval"]:
+            last_check = now
+            evicted = evict(now)
+            if evicted:
+                conn.send((None, {"evicted": evicted}))
+    conn.close()
+
+
+class _Worker:
+    def __init__(self, index: int, max_pending: int) -> None:
+        self.index = index
+        self.process = None
+        self.conn = None
+        self.reader = None
+        self.send_lock = threading.Lock()
+        self.lock = threading.Lock()
+        self.slots = threading.BoundedSemaphore(max_pending)
+        self.pending: Dict[int, Any] = {}
+        self.sessions = set()
+        self.requests = 0
+        self.errors = 0
+        self.latency = deque(maxlen=LATENCY_SAMPLES)
+
+    @property
+    def alive(self) -> bool:
+        return self.process is not None and self.process.is_alive()
+
+
+class SessionServer:
+    """
+    A pool of worker processes serving Gw sessions, with requests routed by session.
+
+    Parameters
+    ----------
+    workers : int, optional
+        Number of worker processes. Defaults to the number of CPUs
+    max_sessions : int, optional
+        Sessions per worker. New sessions are placed on the worker with fewest sessions
+    max_pending : int, optional
+        Requests in flight per worker before further requests wait
+    submit_timeout : float, optional
+        Seconds a request waits for a saturated worker before ServerBusy is raised
+    max_age : float, optional
+        Seconds a session may be idle before it is evicted
+    max_memory : int, optional
+        Bytes of memory per worker. While over the limit, the least recently used sessions are
+        evicted. Allocator usage is measured where available, otherwise resident memory
+    quality : int, optional
+        JPEG quality of frames
+    interaction_scale, settle_time : float, optional
+        Interaction quality applied to each session, see Gw.set_interaction_quality
+    core_budget : int, optional
+        Cores shared by the sessions of each worker, see gwplot.set_core_budget. Sessions use
+        adaptive threads unless their setup sets threads. Defaults to an equal share of the CPUs
+    on_push : callable, optional
+        Called from a background thread as on_push(session_id, result) with each frame a worker
+        sends without a request, such as the full-resolution frame after interaction stops
+    on_evict : callable, optional
+        Called from a background thread as on_evict(session_id) for each evicted session
+    check_interval : float, optional
+        Seconds between eviction checks in each worker
+    start_method : str, optional
+        multiprocessing start method. Workers start from a clean interpreter by default
+
+    Examples
+    --------
+    >>> setup = {"reference": "ref.fa", "bams": ["a.bam"], "tracks": [], "regions": [["chr1", 1, 20000]]}
+    >>> with SessionServer(workers=4) as server:
+    ...     sid = server.create_session(setup)
+    ...     result = server.handle(sid, "key_press", GLFW.KEY_RIGHT, None, GLFW.PRESS, 0)
+    ...     jpeg = result["frame"]
+    """
+    def __init__(self, workers: Optional[int] = None, max_sessions: int = 64, max_pending: int = 8,
+                 submit_timeout: float = 5.0, max_age: float = 3600, max_memory: Optional[int] = None,
+                 quality: int = 80, interaction_scale: float = 1.0, settle_time: float = 0.25,
+                 core_budget: Optional[int] = None, on_push: Optional[Callable[[str, Dict[str, Any]], None]] = None,
+                 on_evict: Optional[Callable[[str], None]] = None, check_interval: float = 5.0,
+                 start_method: str = "spawn") -> None:
+        if max_sessions < 1 or max_pending < 1:
+            raise ValueError("max_sessions and max_pending must be at least 1")
+        self.max_sessions = max_sessions
+        self.max_pending = max_pending
+        self.submit_timeout = submit_timeout
+        self.on_push = on_push
+        self.on_evict = on_evict
+        n_workers = workers or os.cpu_count() or 1
+        self.config = {"max_age": max_age, "max_memory": max_memory, "quality": quality,
+                       "interaction_scale": interaction_scale, "settle_time": settle_time,
+                       "check_interval": check_interval,
+                       "core_budget": core_budget or max(1, (os.cpu_count() or 1) // n_workers)}
+        self._ctx = multiprocessing.get_context(start_method)
+        self._ids = itertools.count()
+        self._affinity: Dict[str, _Worker] = {}
+        self._route_lock = threading.Lock()
+        self._closed = False
+        self._started = time.monotonic()
+        self._rejected = 0
+        self._pushed = 0
+        self._restarts = 0
+        self._workers = [_Worker(i, max_pending) for i in range(n_workers)]
+        for worker in self._workers:
+            self._start(worker)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def _start(self, worker: _Worker) -> None:
+        conn, child = self._ctx.Pipe()
+        worker.process = self._ctx.Process(target=_worker_main, args=(child, self.config), daemon=True,
+                                           name=f"gwplot-worker-{worker.index}")
+        worker.process.start()
+        child.close()
+        worker.conn = conn
+        worker.reader = threading.Thread(target=self._read, args=(worker, conn), daemon=True)
+        worker.reader.start()
+
+    def _read(self, worker: _Worker, conn) -> None:
+        while True:
+            try:
+                req_id, result = conn.recv()
+            except (EOFError, OSError):
+                break
+            if req_id is not None:
+                with worker.lock:
+                    future, t0 = worker.pending.pop(req_id)
+                    worker.requests += 1
+                    worker.latency.append(time.perf_counter() - t0)
+                worker.slots.release()
+                if "error" in result:
+                    worker.errors += 1
+                    error = SessionNotFound if result["error"] == "SessionNotFound" else RuntimeError
+                    future.set_exception(error(result["message"]))
+                else:
+                    future.set_result(result)
+            elif "evicted" in result:
+                for sid in result["evicted"]:
+                    self._forget(sid)
+                    if self.on_evict is not None:
+                        self.on_evict(sid)
+            else:
+                self._pushed += 1
+                if self.on_push is not None:
+                    self.on_push(result.pop("session"), result)
+        self._lost(worker, conn)
+
+    def _lost(self, worker: _Worker, conn) -> None:
+        # The worker exited. Its sessions are gone, so requests in flight fail, and the worker is
+        # restarted empty unless the server is closing
+        with self._route_lock:
+            if worker.conn is not conn:
+                return
+            lost = list(worker.sessions)
+            for sid in lost:
+                self._affinity.pop(sid, None)
+            worker.sessions.clear()
+            with worker.lock:
+                pending = list(worker.pending.values())
+                worker.pending.clear()
+            for _ in pending:
+                worker.slots.release()
+            if not self._closed:
+                self._restarts += 1
+                self._start(worker)
+        for future, _ in pending:
+            future.set_exception(RuntimeError("Worker process exited"))
+        if self.on_evict is not None and not self._closed:
+            for sid in lost:
+                self.on_evict(sid)
+
+    def _forget(self, sid: str) -> None:
+        with self._route_lock:
+            worker = self._affinity.pop(sid, None)
+            if worker is not None:
+                worker.sessions.discard(sid)
+
+    def _send(self, worker: _Worker, sid: Optional[str], op: str, payload: Any) -> Future:
+        if not worker.slots.acquire(timeout=self.submit_timeout):
+            self._rejected += 1
+            raise ServerBusy(f"Worker {worker.index} has {self.max_pending} requests in flight")
+        future = Future()
+        req_id = next(self._ids)
+        with worker.lock:
+            worker.pending[req_id] = (future, time.perf_counter())
+        try:
+            with worker.send_lock:
+                worker.conn.send((req_id, sid, op, payload))
+        except (OSError, ValueError) as e:
+            with worker.lock:
+                worker.pending.pop(req_id, None)
+            worker.slots.release()
+            raise RuntimeError(f"Worker {worker.index} is not running") from e
+        return future
+
+    def submit_create(self, setup: Dict[str, Any], session_id: Optional[str] = None) -> Future:
+        """
+        Start creating a session, on the worker with fewest sessions.
+
+        Parameters
+        ----------
+        setup : dict
+            Session setup in the gwplot.trace format: reference, bams, tracks, regions, and
+            optionally canvas_size and settings (keyword arguments to Gw), or a snapshot from
+            Gw.snapshot
+        session_id : str, optional
+            Identifier for the session, such as a websocket id. A new one is made by default
+
+        Returns
+        -------
+        concurrent.futures.Future
+            Resolves to the first frame, as for handle. The session id is in its session key
+
+        Raises
+        ------
+        ServerBusy
+            If every worker has max_sessions sessions, or the chosen worker stays saturated
+        """
+        session_id = session_id or uuid.uuid4().hex
+        with self._route_lock:
+            if session_id in self._affinity:
+                raise ValueError(f"Session {session_id} already exists")
+            candidates = [w for w in self._workers if w.alive and len(w.sessions) < self.max_sessions]
+            if not candidates:
+                self._rejected += 1
+                raise ServerBusy("Every worker is at its session limit")
+            worker = min(candidates, key=lambda w: (len(w.sessions), len(w.pending)))
+            self._affinity[session_id] = worker
+            worker.sessions.add(session_id)
+        try:
+            future = self._send(worker, session_id, "create", setup)
+        except Exception:
+            self._forget(session_id)
+            raise
+        created = Future()
+
+        def done(f: Future) -> None:
+            if f.exception() is not None:
+                self._forget(session_id)
+                created.set_exception(f.exception())
+            else:
+                created.set_result(dict(f.result(), session=session_id))
+        future.add_done_callback(done)
+        return created
+
+    def submit(self, session_id: str, op: str, *args: Any) -> Future:
+        """
+        Send an event to a session without waiting for its frame.
+
+        Parameters
+        ----------
+        session_id : str
+            Session id
+        op : str
+            One of EVENT_OPS: key_press, mouse_event, apply_command, set_canvas_size, refresh or
+            settle. Arguments are as for the Gw method, and a key_press scancode of None is
+            looked up on the worker
+        *args
+            Event arguments
+
+        Returns
+        -------
+        concurrent.futures.Future
+            Resolves to a dict with frame (JPEG bytes, or None if the event needed no redraw),
+            scale (see Gw.encode_frame) and log (new log messages)
+
+        Raises
+        ------
+        ValueError
+            If op is not an event
+        SessionNotFound
+            If the session does not exist
+        ServerBusy
+            If the session's worker stays saturated for submit_timeout seconds
+        """
+        if op not in EVENT_OPS:
+            raise ValueError(f"Unknown event {op}, expected one of {EVENT_OPS}")
+        worker = self._affinity.get(session_id)
+        if worker is None:
+            raise SessionNotFound(session_id)
+        return self._send(worker, session_id, op, args)
+
+    def create_session(self, setup: Dict[str, Any], session_id: Optional[str] = None,
+                       timeout: Optional[float] = None) -> str:
+        """
+        Create a session and wait until it has drawn its first frame.
+
+        Parameters
+        ----------
+        setup : dict
+            Session setup, see submit_create
+        session_id : str, optional
+            Identifier for the session
+        timeout : float, optional
+            Seconds to wait
+
+        Returns
+        -------
+        str
+            The session id
+        """
+        return self.submit_create(setup, session_id).result(timeout)["session"]
+
+    def handle(self, session_id: str, op: str, *args: Any, timeout: Optional[float] = None) -> Dict[str, Any]:
+        """
+        Send an event to a session and wait for the result. See submit.
+
+        Returns
+        -------
+        dict
+            frame, scale and log
+        """
+        return self.submit(session_id, op, *args).result(timeout)
+
+    async def handle_async(self, session_id: str, op: str, *args: Any) -> Dict[str, Any]:
+        """
+        Send an event to a session from an asyncio event loop. See submit.
+
+        The wait for a saturated worker runs in the loop's default executor, so the loop is not
+        blocked.
+
+        Returns
+        -------
+        dict
+            frame, scale and log
+        """
+        loop = asyncio.get_running_loop()
+        future = await loop.run_in_executor(None, lambda: self.submit(session_id, op, *args))
+        return await asyncio.wrap_future(future)
+
+    def close_session(self, session_id: str) -> None:
+        """
+        Close a session, freeing it on its worker. Unknown sessions are ignored.
+
+        Parameters
+        ----------
+        session_id : str
+            Session id
+        """
+        worker = self._affinity.get(session_id)
+        if worker is None:
+            return
+        self._forget(session_id)
+        try:
+            self._send(worker, session_id, "close", None).exception()
+        except RuntimeError:
+            pass
+
+    @property
+    def sessions(self) -> List[str]:
+        """
+        Ids of the open sessions.
+
+        Returns
+        -------
+        list of str
+        """
+        return list(self._affinity)
+
+    def health(self) -> Dict[str, Any]:
+        """
+        Liveness of the pool, without contacting the workers.
+
+        Returns
+        -------
+        dict
+            ok (True if every worker is running), workers, alive, sessions, pending (requests in
+            flight) and saturated (workers with max_pending requests in flight)
+        """
+        alive = sum(w.alive for w in self._workers)
+        pending = [len(w.pending) for w in self._workers]
+        return {"ok": not self._closed and alive == len(self._workers), "workers": len(self._workers),
+                "alive": alive, "sessions": len(self._affinity), "pending": sum(pending),
+                "saturated": sum(p >= self.max_pending for p in pending)}
+
+    def metrics(self, timeout: float = 5.0) -> Dict[str, Any]:
+        """
+        Throughput, latency and resource usage of each worker and of the pool.
+
+        Each worker is asked for its counters, so saturated workers can delay the result.
+
+        Parameters
+        ----------
+        timeout : float, optional
+            Seconds to wait for each worker. Workers that do not answer in time report None for
+            their own counters
+
+        Returns
+        -------
+        dict
+            uptime (seconds), requests, requests_per_second, rejected (ServerBusy count), pushed
+            (frames sent without a request), restarts, latency (percentiles of request latency
+            in milliseconds over recent requests) and workers, a list of dicts with index, pid,
+            alive, sessions, pending, requests, errors, latency, and the worker's own frames,
+            evicted, memory (bytes) and busy (fraction of time spent handling requests)
+        """
+        futures = []
+        for worker in self._workers:
+            try:
+                futures.append(self._send(worker, None, "stats", None))
+            except RuntimeError:
+                futures.append(None)
+        workers = []
+        all_latency = []
+        for worker, future in zip(self._workers, futures):
+            try:
+                stats = future.result(timeout) if future is not None else {}
+            except Exception:
+                stats = {}
+            with worker.lock:
+                latency = [v * 1000 for v in worker.latency]
+            all_latency += latency
+            workers.append({"index": worker.index, "pid": worker.process.pid, "alive": worker.alive,
+                            "sessions": len(worker.sessions), "pending": len(worker.pending),
+                            "requests": worker.requests, "errors": worker.errors,
+                            "latency": _percentiles(latency), "frames": stats.get("frames"),
+                            "evicted": stats.get("evicted"), "memory": stats.get("memory"),
+                            "busy": stats.get("busy")})
+        uptime = time.monotonic() - self._started
+        requests = sum(w.requests for w in self._workers)
+        return {"uptime": uptime, "requests": requests, "requests_per_second": requests / max(1e-9, uptime),
+                "rejected": self._rejected, "pushed": self._pushed, "restarts": self._restarts,
+                "latency": _percentiles(all_latency), "workers": workers}
+
+    def close(self, timeout: float = 5.0) -> None:
+        """
+        Stop the worker processes. Open sessions are discarded.
+
+        Parameters
+        ----------
+        timeout : float, optional
+            Seconds to wait for each worker before it is terminated
+        """
+        if self._closed:
+            return
+        self._closed = True
+        for worker in self._workers:
+            try:
+                with worker.send_lock:
+                    worker.conn.send(None)
+            except (OSError, ValueError):
+                pass
+        for worker in self._workers:
+            worker.process.join(timeout)
+            if worker.process.is_alive():
+                worker.process.terminate()
+                worker.process.join()
+            worker.conn.close()
+        self._affinity.clear()
+
+
+class StandInClient:
+    """
+    Drive one session through a list of events, standing in for a browser client.
+
+    Events are sent one at a time, each waiting for the previous frame, as an interactive client
+    does. Requests rejected with ServerBusy are retried after retry_delay seconds.
+
+    Parameters
+    ----------
+    server : SessionServer
+        Server to connect to
+    setup : dict
+        Session setup, see SessionServer.submit_create
+    events : list of dict
+        Events in the gwplot.trace format, dicts with op and args
+    retry_delay : float, optional
+        Seconds to wait before retrying a rejected request
+
+    Examples
+    --------
+    >>> trace = load_trace("tests/traces/scroll.json")
+    >>> report = StandInClient(server, trace["setup"], trace["events"]).run()
+    """
+    def __init__(self, server: SessionServer, setup: Dict[str, Any], events: List[Dict[str, Any]],
+                 retry_delay: float = 0.05) -> None:
+        self.server = server
+        self.setup = setup
+        self.events = events
+        self.retry_delay = retry_delay
+        self.session_id = None
+        self.latency: List[float] = []
+        self.frames = 0
+        self.rejected = 0
+
+    def _retry(self, submit: Callable[[], Future]) -> Dict[str, Any]:
+        while True:
+            try:
+                return submit().result()
+            except ServerBusy:
+                self.rejected += 1
+                time.sleep(self.retry_delay)
+
+    def run(self) -> Dict[str, Any]:
+        """
+        Create the session, send every event and close the session.
+
+        Returns
+        -------
+        dict
+            session, events, frames, rejected and latency (seconds for each event, including
+            time spent waiting for a saturated worker)
+        """
+        created = self._retry(lambda: self.server.submit_create(self.setup))
+        self.session_id = created["session"]
+        try:
+            for event in self.events:
+                t0 = time.perf_counter()
+                result = self._retry(lambda: self.server.submit(self.session_id, event["op"], *event["args"]))
+                self.latency.append(time.perf_counter() - t0)
+                self.frames += 1 if result["frame"] else 0
+        finally:
+            self.server.close_session(self.session_id)
+        return {"session": self.session_id, "events": len(self.latency), "frames": self.frames,
+                "rejected": self.rejected, "latency": self.latency}
+
+
+def run_load(server: SessionServer, trace: Any, clients: int = 100, repeat: int = 1) -> Dict[str, Any]:
+    """
+    Run concurrent stand-in clients, each replaying a trace in its own session.
+
+    Parameters
+    ----------
+    server : SessionServer
+        Server under test
+    trace : str or dict
+        Trace file path, or a trace from gwplot.trace.load_trace
+    clients : int, optional
+        Number of concurrent clients
+    repeat : int, optional
+        Number of times each client sends the trace's events
+
+    Returns
+    -------
+    dict
+        clients, events, frames, rejected, failed (clients that stopped with an error), seconds,
+        events_per_second and latency (percentiles of event-to-frame time in milliseconds)
+    """
+    if isinstance(trace, str):
+        trace = load_trace(trace)
+    events = trace["events"] * repeat
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=clients) as pool:
+        futures = [pool.submit(StandInClient(server, trace["setup"], events).run) for _ in range(clients)]
+    seconds = time.perf_counter() - t0
+    reports = [f.result() for f in futures if f.exception() is None]
+    latency = [v * 1000 for r in reports for v in r["latency"]]
+    return {"clients": clients, "events": len(latency), "frames": sum(r["frames"] for r in reports),
+            "rejected": sum(r["rejected"] for r in reports), "failed": clients - len(reports),
+            "seconds": seconds, "events_per_second": len(latency) / max(1e-9, seconds),
+            "latency": _percentiles(latency)}
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Load test a session server with stand-in clients")
+    parser.add_argument("trace", help="Trace file replayed by each client")
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--clients", type=int, default=100)
+    parser.add_argument("--repeat", type=int, default=1)
+    parser.add_argument("--max-sessions", type=int, default=64)
+    parser.add_argument("--max-pending", type=int, default=8)
+    parser.add_argument("--interaction-scale", type=float, default=1.0)
+    args = parser.parse_args(argv)
+
+    with SessionServer(workers=args.workers, max_sessions=args.max_sessions, max_pending=args.max_pending,
+                       interaction_scale=args.interaction_scale) as server:
+        report = run_load(server, args.trace, clients=args.clients, repeat=args.repeat)
+        metrics = server.metrics()
+    lat = report["latency"]
+    print(f"{report['clients']} clients, {report['events']} events, {report['frames']} frames in "
+          f"{report['seconds']:.1f} s, {report['events_per_second']:.1f} events/s")
+    print(f"    latency p50 {lat['p50']:.1f} ms, p95 {lat['p95']:.1f} ms, p99 {lat['p99']:.1f} ms, "
+          f"{report['rejected']} rejected, {report['failed']} failed")
+    for w in metrics["workers"]:
+        busy = f"{w['busy']:.0%}" if w["busy"] is not None else "-"
+        print(f"    worker {w['index']}: {w['requests']} requests, busy {busy}, p95 {w['latency']['p95']:.1f} ms")
+    return 1 if report["failed"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
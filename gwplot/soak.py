@@ -0,0 +1,290 @@
+"""
+Soak testing for long-running Gw sessions.
+
+run_soak drives a single Gw instance through many view, bam, track, resize and encode cycles
+on synthetic data, sampling resident memory, allocator usage and open file descriptors as it
+goes. After a warm-up period, steady growth in any of these is reported as a leak.
+
+Run from the command line with:
+
+>>> python -m gwplot.soak --cycles 20000
+"""
+import argparse
+import ctypes
+import ctypes.util
+import os
+import random
+import resource
+import sys
+import tempfile
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+import pysam
+
+__all__ = ["make_synthetic_data", "process_stats", "run_soak", "check_growth"]
+
+CHROM_LEN = 50000
+READ_LEN = 150
+
+
+def make_synthetic_data(directory: str, n_reads: int = 2000, n_bams: int = 2, seed: int = 0) -> Dict[str, Any]:
+    """
+    Write a small reference, indexed bam files and a bed track to a directory.
+
+    Parameters
+    ----------
+    directory : str
+        Output directory
+    n_reads : int, optional
+        Number of reads in each bam file
+    n_bams : int, optional
+        Number of bam files
+    seed : int, optional
+        Random seed
+
+    Returns
+    -------
+    dict
+        Keys reference, bams (list of paths), track and chroms (dict of name to length)
+    """
+    rng = random.Random(seed)
+    chroms = {"chr1": CHROM_LEN, "chr2": CHROM_LEN}
+    sequences = {c: "".join(rng.choice("ACGT") for _ in range(n)) for c, n in chroms.items()}
+
+    reference = os.path.join(directory, "soak_ref.fa")
+    with open(reference, "w") as f:
+        for name, seq in sequences.items():
+            f.write(f">{name}\n")
+            for i in range(0, len(seq), 60):
+                f.write(seq[i:i + 60] + "\n")
+    pysam.faidx(reference)
+
+    header = {"HD": {"VN": "1.6", "SO": "coordinate"},
+              "SQ": [{"SN": c, "LN": n} for c, n in chroms.items()]}
+    bams = []
+    for b in range(n_bams):
+        path = os.path.join(directory, f"soak_{b}.bam")
+        records = sorted((rng.randrange(len(chroms)), rng.randrange(CHROM_LEN - READ_LEN), i)
+                         for i in range(n_reads))
+        with pysam.AlignmentFile(path, "wb", header=header) as out:
+            for tid, pos, i in records:
+                seq = sequences[f"chr{tid + 1}"][pos:pos + READ_LEN]
+                if rng.random() < 0.05:  # Add some mismatches
+                    k = rng.randrange(READ_LEN)
+                    seq = seq[:k] + ("A" if seq[k] != "A" else "C") + seq[k + 1:]
+                a = pysam.AlignedSegment(out.header)
+                a.query_name = f"read{b}_{i}"
+                a.query_sequence = seq
+                a.flag = 16 if rng.random() < 0.5 else 0
+                a.reference_id = tid
+                a.reference_start = pos
+                a.mapping_quality = rng.randrange(61)
+                a.cigartuples = [(0, READ_LEN)]
+                a.query_qualities = pysam.qualitystring_to_array("I" * READ_LEN)
+                out.write(a)
+        pysam.index(path)
+        bams.append(path)
+
+    track = os.path.join(directory, "soak_track.bed")
+    with open(track, "w") as f:
+        for c, n in chroms.items():
+            for start in range(0, n - 1000, 2500):
+                f.write(f"{c}\t{start}\t{start + rng.randrange(100, 1000)}\tfeature_{c}_{start}\n")
+    return {"reference": reference, "bams": bams, "track": track, "chroms": chroms}
+
+
+def _load_mallinfo() -> Optional[Callable[[], int]]:
+    # glibc only. mallinfo2 reports the bytes currently allocated with malloc
+    name = ctypes.util.find_library("c")
+    if not name or not sys.platform.startswith("linux"):
+        return None
+    try:
+        libc = ctypes.CDLL(name)
+        mallinfo2 = libc.mallinfo2
+    except (OSError, AttributeError):
+        return None
+
+    class Mallinfo2(ctypes.Structure):
+        _fields_ = [(f, ctypes.c_size_t) for f in ("arena", "ordblks", "smblks", "hblks", "hblkhd",
+                                                   "usmblks", "fsmblks", "uordblks", "fordblks", "keepcost")]
+
+    mallinfo2.restype = Mallinfo2
+
+    def heap_in_use() -> int:
+        info = mallinfo2()
+        return info.uordblks + info.hblkhd
+    return heap_in_use
+
+
+_heap_in_use = _load_mallinfo()
+
+
+def process_stats() -> Dict[str, Optional[int]]:
+    """
+    Resource usage of the current process.
+
+    Returns
+    -------
+    dict
+        rss (resident memory in bytes), heap (bytes allocated with malloc, or None if not
+        available on this platform) and fds (number of open file descriptors, or None)
+    """
+    rss = None
+    try:
+        with open("/proc/self/statm") as f:
+            rss = int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except OSError:
+        # Peak rather than current usage, which is still enough to detect steady growth
+        rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        if sys.platform != "darwin":
+            rss *= 1024
+    fds = None
+    for fd_dir in ("/proc/self/fd", "/dev/fd"):
+        if os.path.isdir(fd_dir):
+            fds = len(os.listdir(fd_dir))
+            break
+    return {"rss": rss, "heap": _heap_in_use() if _heap_in_use else None, "fds": fds}
+
+
+def check_growth(samples: List[Dict[str, Any]], warmup: float = 0.25, rss_tolerance: int = 32 << 20,
+                 heap_tolerance: int = 16 << 20, fd_tolerance: int = 0) -> Dict[str, Any]:
+    """
+    Compare resource usage between the first and second half of the samples taken after warm-up.
+
+    Parameters
+    ----------
+    samples : list of dict
+        Samples from run_soak
+    warmup : float, optional
+        Fraction of samples ignored while caches fill
+    rss_tolerance, heap_tolerance, fd_tolerance : int, optional
+        Allowed growth in bytes, bytes and file descriptors
+
+    Returns
+    -------
+    dict
+        Growth of rss, heap and fds, and leaks, a list of the measures exceeding their tolerance
+    """
+    steady = samples[int(len(samples) * warmup):]
+    half = len(steady) // 2
+    result = {"leaks": []}
+    for key, tolerance in (("rss", rss_tolerance), ("heap", heap_tolerance), ("fds", fd_tolerance)):
+        first = sorted(s[key] for s in steady[:half] if s[key] is not None)
+        second = sorted(s[key] for s in steady[half:] if s[key] is not None)
+        if not first or not second:
+            result[key] = None
+            continue
+        # Medians are robust to allocator noise, and the final sample catches late growth
+        growth = max(second[len(second) // 2] - first[len(first) // 2], steady[-1][key] - first[-1])
+        result[key] = growth
+        if growth > tolerance:
+            result["leaks"].append(key)
+    return result
+
+
+def run_soak(cycles: int = 20000, sample_every: int = 100, data_dir: Optional[str] = None,
+             seed: int = 0, raise_on_leak: bool = True, verbose: bool = False, **tolerances: int) -> Dict[str, Any]:
+    """
+    Drive a Gw instance through repeated session operations and check for resource growth.
+
+    Each cycle views a random region, draws and encodes the image. Bam files and tracks are
+    added and removed, and the canvas is resized, at regular intervals.
+
+    Parameters
+    ----------
+    cycles : int, optional
+        Number of cycles
+    sample_every : int, optional
+        Cycles between resource samples
+    data_dir : str, optional
+        Directory for synthetic data. A temporary directory is used by default
+    seed : int, optional
+        Random seed
+    raise_on_leak : bool, optional
+        Raise RuntimeError if growth exceeds the tolerances
+    verbose : bool, optional
+        Print each sample
+    **tolerances
+        rss_tolerance, heap_tolerance or fd_tolerance, passed to check_growth
+
+    Returns
+    -------
+    dict
+        samples (list of dicts with cycle, time, rss, heap and fds), growth (see check_growth)
+        and cycles_per_second
+
+    Raises
+    ------
+    RuntimeError
+        If raise_on_leak is set and resource usage grows steadily
+    """
+    from gwplot import Gw
+
+    with tempfile.TemporaryDirectory() as tmp:
+        data = make_synthetic_data(data_dir or tmp, seed=seed)
+        rng = random.Random(seed)
+        chroms = list(data["chroms"].items())
+        gw = Gw(data["reference"], canvas_width=600, canvas_height=400, threads=1, log_capacity=256)
+        gw.add_bam(data["bams"][0])
+        gw.view_region("chr1", 1, 5000)
+        samples = []
+        t0 = time.perf_counter()
+        for cycle in range(cycles):
+            chrom, length = rng.choice(chroms)
+            start = rng.randrange(length - 2000)
+            gw.view_region(chrom, start, start + rng.randrange(200, 2000))
+            if cycle % 7 == 0:
+                gw.add_bam(data["bams"][1])
+            if cycle % 11 == 0:
+                gw.add_track(data["track"])
+            if cycle % 13 == 0:
+                gw.set_canvas_size(rng.choice((400, 600, 800)), rng.choice((300, 400)))
+            gw.draw()
+            if cycle % 2:
+                gw.encode_as_png()
+            else:
+                gw.encode_as_jpeg()
+            if cycle % 7 == 3:
+                gw.remove_bam(1)
+            if cycle % 11 == 5:
+                gw.remove_track(0)
+            gw.flush_log()
+            if cycle % sample_every == 0 or cycle == cycles - 1:
+                stats = process_stats()
+                stats["cycle"] = cycle
+                stats["time"] = time.perf_counter() - t0
+                samples.append(stats)
+                if verbose:
+                    print(stats, file=sys.stderr)
+        elapsed = time.perf_counter() - t0
+        del gw
+
+    report = {"samples": samples, "growth": check_growth(samples, **tolerances),
+              "cycles_per_second": cycles / elapsed if elapsed > 0 else 0.0}
+    if raise_on_leak and report["growth"]["leaks"]:
+        raise RuntimeError("Resource usage grew during soak test: " +
+                           ", ".join(f"{k} +{report['growth'][k]}" for k in report["growth"]["leaks"]))
+    return report
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Soak test a long-running Gw session")
+    parser.add_argument("--cycles", type=int, default=20000)
+    parser.add_argument("--sample-every", type=int, default=100)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--verbose", action="store_true")
+    args = parser.parse_args(argv)
+    report = run_soak(args.cycles, args.sample_every, seed=args.seed, raise_on_leak=False, verbose=args.verbose)
+    growth = report["growth"]
+    print(f"{args.cycles} cycles, {report['cycles_per_second']:.1f} cycles/s")
+    for key in ("rss", "heap", "fds"):
+        print(f"{key} growth: {growth[key]}")
+    if growth["leaks"]:
+        print("Leak detected: " + ", ".join(growth["leaks"]))
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
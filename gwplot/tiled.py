@@ -0,0 +1,159 @@
+"""
+Streaming PNG output for images drawn in horizontal bands.
+
+PngBandWriter writes a PNG image one band of rows at a time, so an image much larger than memory
+can be produced by drawing and writing each band in turn. Bands are filtered and deflate
+compressed on a pool of threads. Each band is compressed as an independent block of a single
+zlib stream, so the output is a standard PNG that any reader can open.
+
+Gw.save_tiled_png draws a canvas of any size with this writer:
+
+>>> gw.save_tiled_png("poster.png", width=30000, height=8000, band_height=1024, threads=4)
+"""
+import struct
+import zlib
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import BinaryIO, Tuple
+
+import numpy as np
+
+__all__ = ["PngBandWriter"]
+
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+ZLIB_HEADER = b"\x78\x9c"
+ADLER_BASE = 65521
+
+
+def _chunk(kind: bytes, data: bytes) -> bytes:
+    return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data) & 0xffffffff)
+
+
+def _adler32_combine(adler1: int, adler2: int, len2: int) -> int:
+    # Checksum of two concatenated byte strings from their separate checksums, as in zlib
+    rem = len2 % ADLER_BASE
+    sum1 = adler1 & 0xffff
+    sum2 = (rem * sum1) % ADLER_BASE
+    sum1 += (adler2 & 0xffff) + ADLER_BASE - 1
+    sum2 += (adler1 >> 16) + (adler2 >> 16) + ADLER_BASE - rem
+    if sum1 >= ADLER_BASE:
+        sum1 -= ADLER_BASE
+    if sum1 >= ADLER_BASE:
+        sum1 -= ADLER_BASE
+    if sum2 >= ADLER_BASE << 1:
+        sum2 -= ADLER_BASE << 1
+    if sum2 >= ADLER_BASE:
+        sum2 -= ADLER_BASE
+    return sum1 | (sum2 << 16)
+
+
+def _compress_band(band: np.ndarray, level: int, last: bool) -> Tuple[bytes, int, int]:
+    # Applies the PNG Sub filter to each row, then deflates the band as a raw block ending on a
+    # byte boundary, so compressed bands can be concatenated
+    height, width = band.shape[:2]
+    rows = band.reshape(height, width * 4)
+    filtered = np.empty((height, width * 4 + 1), dtype=np.uint8)
+    filtered[:, 0] = 1
+    filtered[:, 1:5] = rows[:, :4]
+    np.subtract(rows[:, 4:], rows[:, :-4], out=filtered[:, 5:])
+    data = filtered.data
+    compressor = zlib.compressobj(level, zlib.DEFLATED, -15)
+    out = compressor.compress(data) + compressor.flush(zlib.Z_FINISH if last else zlib.Z_SYNC_FLUSH)
+    return out, zlib.adler32(data), filtered.nbytes
+
+
+class PngBandWriter:
+    """
+    Write an RGBA PNG image in horizontal bands.
+
+    Parameters
+    ----------
+    target : file-like
+        Writable binary file-like object
+    width, height : int
+        Image size in pixels
+    compression_level : int, optional
+        zlib compression level, 0-9
+    threads : int, optional
+        Number of bands compressed concurrently. Memory use is proportional to threads times
+        the band size
+
+    Examples
+    --------
+    >>> with open("image.png", "wb") as f:
+    ...     writer = PngBandWriter(f, 4000, 3000)
+    ...     for band in bands:  # uint8 arrays of shape (rows, 4000, 4)
+    ...         writer.write_band(band)
+    ...     writer.close()
+    """
+    def __init__(self, target: BinaryIO, width: int, height: int, compression_level: int = 6,
+                 threads: int = 1) -> None:
+        if width < 1 or height < 1:
+            raise ValueError("Image width and height must be at least 1")
+        if not 0 <= compression_level <= 9:
+            raise ValueError("compression_level must be between 0 and 9")
+        self.target = target
+        self.width = width
+        self.height = height
+        self.compression_level = compression_level
+        self.threads = max(1, threads)
+        self.rows_written = 0
+        self._adler = 1
+        self._pending = deque()
+        self._executor = ThreadPoolExecutor(max_workers=self.threads) if self.threads > 1 else None
+        ihdr = struct.pack(">IIBBBBB", width, height, 8, 6, 0, 0, 0)
+        self.target.write(PNG_SIGNATURE + _chunk(b"IHDR", ihdr) + _chunk(b"IDAT", ZLIB_HEADER))
+
+    def write_band(self, band: np.ndarray) -> None:
+        """
+        Add the next band of rows to the image.
+
+        Parameters
+        ----------
+        band : numpy.ndarray
+            uint8 array of shape (rows, width, 4) holding RGBA pixels. The array must not be
+            changed until the writer is closed, or the band has been written
+
+        Raises
+        ------
+        ValueError
+            If the band has the wrong shape, or would extend past the bottom of the image
+        """
+        if band.ndim != 3 or band.shape[1] != self.width or band.shape[2] != 4 or band.dtype != np.uint8:
+            raise ValueError(f"Expected a uint8 array of shape (rows, {self.width}, 4)")
+        if self.rows_written + band.shape[0] > self.height:
+            raise ValueError("Band extends past the bottom of the image")
+        self.rows_written += band.shape[0]
+        last = self.rows_written == self.height
+        band = np.ascontiguousarray(band)
+        if self._executor is None:
+            self._write_compressed(_compress_band(band, self.compression_level, last))
+            return
+        self._pending.append(self._executor.submit(_compress_band, band, self.compression_level, last))
+        while len(self._pending) > self.threads:
+            self._write_compressed(self._pending.popleft().result())
+
+    def _write_compressed(self, result: Tuple[bytes, int, int]) -> None:
+        data, adler, length = result
+        self._adler = _adler32_combine(self._adler, adler, length)
+        self.target.write(_chunk(b"IDAT", data))
+
+    def close(self) -> None:
+        """
+        Finish the image. Every row must have been written.
+
+        Raises
+        ------
+        ValueError
+            If fewer rows than the image height were written
+        """
+        try:
+            while self._pending:
+                self._write_compressed(self._pending.popleft().result())
+        finally:
+            if self._executor is not None:
+                self._executor.shutdown()
+                self._executor = None
+        if self.rows_written != self.height:
+            raise ValueError(f"Only {self.rows_written} of {self.height} rows were written")
+        self.target.write(_chunk(b"IDAT", struct.pack(">I", self._adler)) + _chunk(b"IEND", b""))
@@ -0,0 +1,295 @@
+"""
+Recording and replay of interactive sessions, for measuring interactive latency.
+
+TraceRecorder wraps a Gw instance and records each key_press, mouse_event, apply_command and
+set_canvas_size call with its timing, as an interactive server produces them. replay drives a
+new Gw instance through a recorded trace offline, producing a frame after each event in the
+same way as the demo servers, and reports event-to-encoded-frame latency percentiles with a
+breakdown by stage.
+
+Canonical traces for the test data are in tests/traces. Run them from the command line with:
+
+>>> python -m gwplot.trace tests/traces/*.json
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from typing import Any, Dict, Iterable, List, Optional, Union
+
+__all__ = ["TraceRecorder", "load_trace", "replay", "compare_reports", "TRACE_VERSION", "RECORDED_EVENTS"]
+
+TRACE_VERSION = 1
+RECORDED_EVENTS = ("key_press", "mouse_event", "apply_command", "set_canvas_size")
+STAGES = ("event", "draw", "encode")
+
+
+class TraceRecorder:
+    """
+    Record interaction events sent to a Gw instance.
+
+    The recorder forwards every attribute to the wrapped instance, so it can be used in its
+    place by a server. The session state is captured with Gw.snapshot when recording starts.
+
+    Parameters
+    ----------
+    gw : Gw
+        Instance receiving the events
+    name : str, optional
+        Name stored in the trace
+
+    Examples
+    --------
+    >>> plot = TraceRecorder(Gw("ref.fa"))
+    >>> plot.key_press(GLFW.KEY_RIGHT, 0, GLFW.PRESS, 0)
+    >>> plot.save("session.json")
+    """
+    def __init__(self, gw, name: str = "") -> None:
+        self.gw = gw
+        self.name = name
+        self.setup = {"snapshot": gw.snapshot()}
+        self.events: List[Dict[str, Any]] = []
+        self._t0 = time.perf_counter()
+
+    def __getattr__(self, name: str) -> Any:
+        attr = getattr(self.gw, name)
+        if name not in RECORDED_EVENTS:
+            return attr
+
+        def record(*args):
+            self.events.append({"t": round(time.perf_counter() - self._t0, 6), "op": name, "args": list(args)})
+            return attr(*args)
+        return record
+
+    def trace(self) -> Dict[str, Any]:
+        """
+        The recorded trace as a JSON-serialisable dict.
+
+        Returns
+        -------
+        dict
+            Keys version, name, setup and events
+        """
+        return {"version": TRACE_VERSION, "name": self.name, "setup": self.setup, "events": list(self.events)}
+
+    def save(self, path: str) -> None:
+        """
+        Write the recorded trace to a JSON file.
+
+        Parameters
+        ----------
+        path : str
+            Output path
+        """
+        with open(path, "w") as f:
+            json.dump(self.trace(), f)
+
+
+def load_trace(path: str) -> Dict[str, Any]:
+    """
+    Read a trace from a JSON file. Relative data paths in the setup are resolved against the
+    directory containing the trace.
+
+    Parameters
+    ----------
+    path : str
+        Trace file
+
+    Returns
+    -------
+    dict
+        The trace
+
+    Raises
+    ------
+    ValueError
+        If the trace version is not supported
+    """
+    with open(path) as f:
+        trace = json.load(f)
+    if trace.get("version") != TRACE_VERSION:
+        raise ValueError(f"Unsupported trace version {trace.get('version')}")
+    if not trace.get("name"):
+        trace["name"] = os.path.splitext(os.path.basename(path))[0]
+    base_dir = os.path.dirname(os.path.abspath(path))
+    setup = trace["setup"]
+    if "snapshot" not in setup:
+        resolve = lambda p: p if os.path.isabs(p) else os.path.join(base_dir, p)
+        setup["reference"] = resolve(setup["reference"])
+        setup["bams"] = [resolve(p) for p in setup.get("bams", [])]
+        setup["tracks"] = [resolve(p) for p in setup.get("tracks", [])]
+    return trace
+
+
+def _make_gw(setup: Dict[str, Any]):
+    from gwplot import Gw
+
+    if "snapshot" in setup:
+        return Gw.from_snapshot(setup["snapshot"])
+    width, height = setup.get("canvas_size", (1200, 600))
+    gw = Gw(setup["reference"], canvas_width=width, canvas_height=height, **setup.get("settings", {}))
+    for path in setup["bams"]:
+        gw.add_bam(path)
+    for path in setup["tracks"]:
+        gw.add_track(path)
+    for chrom, start, end in setup["regions"]:
+        gw.add_region(chrom, start, end)
+    return gw
+
+
+def _percentiles(values: List[float]) -> Dict[str, float]:
+    if not values:
+        return {"p50": 0.0, "p95": 0.0, "p99": 0.0, "mean": 0.0, "max": 0.0}
+    values = sorted(values)
+
+    def percentile(q):
+        k = (len(values) - 1) * q
+        lo = int(k)
+        hi = min(lo + 1, len(values) - 1)
+        return values[lo] + (values[hi] - values[lo]) * (k - lo)
+    return {"p50": percentile(0.50), "p95": percentile(0.95), "p99": percentile(0.99),
+            "mean": sum(values) / len(values), "max": values[-1]}
+
+
+def replay(trace: Union[str, Dict[str, Any]], realtime: bool = False, quality: int = 80,
+           repeat: int = 1) -> Dict[str, Any]:
+    """
+    Drive a new Gw instance through a trace and measure event-to-encoded-frame latency.
+
+    After each event, a frame is drawn and JPEG encoded if the instance needs redrawing, as the
+    demo servers do. Mouse button presses only produce a frame on release. A first frame is drawn
+    before timing starts.
+
+    Parameters
+    ----------
+    trace : str or dict
+        Trace file path, or a trace from load_trace or TraceRecorder.trace
+    realtime : bool, optional
+        Wait between events as in the recording. By default events are sent back to back
+    quality : int, optional
+        JPEG quality
+    repeat : int, optional
+        Number of times to replay the events
+
+    Returns
+    -------
+    dict
+        name, events, frames, latency (percentiles of event-to-frame time in milliseconds, for
+        events producing a frame) and stages (percentiles of each stage in milliseconds)
+    """
+    if isinstance(trace, str):
+        trace = load_trace(trace)
+    gw = _make_gw(trace["setup"])
+    gw.draw()
+    gw.encode_as_jpeg(quality)
+    gw.flush_log()
+
+    from gwplot import GLFW
+
+    latency = []
+    stages = {s: [] for s in STAGES}
+    n_events = 0
+    for _ in range(repeat):
+        t_start = time.perf_counter()
+        for event in trace["events"]:
+            if realtime:
+                wait = event["t"] - (time.perf_counter() - t_start)
+                if wait > 0:
+                    time.sleep(wait)
+            op, args = event["op"], list(event["args"])
+            if op == "key_press" and args[1] is None:  # Scancodes are platform specific
+                args[1] = GLFW.get_key_scancode(args[0])
+            t0 = time.perf_counter()
+            getattr(gw, op)(*args)
+            t1 = time.perf_counter()
+            stages["event"].append(t1 - t0)
+            n_events += 1
+            if op == "mouse_event" and args[3] == GLFW.PRESS:
+                continue
+            if not (gw.redraw or gw.clear_buffer):
+                continue
+            gw.draw()
+            t2 = time.perf_counter()
+            gw.encode_as_jpeg(quality)
+            t3 = time.perf_counter()
+            stages["draw"].append(t2 - t1)
+            stages["encode"].append(t3 - t2)
+            latency.append(t3 - t0)
+        gw.flush_log()
+    del gw
+
+    to_ms = lambda values: [v * 1000 for v in values]
+    return {"name": trace.get("name", ""), "events": n_events, "frames": len(latency),
+            "latency": _percentiles(to_ms(latency)),
+            "stages": {s: _percentiles(to_ms(v)) for s, v in stages.items()}}
+
+
+def compare_reports(report: Dict[str, Any], baseline: Dict[str, Any], tolerance: float = 0.25,
+                    keys: Iterable[str] = ("p50", "p95")) -> List[str]:
+    """
+    Compare replay latency with a baseline report.
+
+    Parameters
+    ----------
+    report : dict
+        Report from replay
+    baseline : dict
+        Earlier report for the same trace
+    tolerance : float, optional
+        Allowed fractional increase in latency
+    keys : iterable of str, optional
+        Latency percentiles to compare
+
+    Returns
+    -------
+    list of str
+        A description of each percentile that is slower than the baseline by more than tolerance
+    """
+    regressions = []
+    for key in keys:
+        now, before = report["latency"][key], baseline["latency"][key]
+        if before > 0 and now > before * (1 + tolerance):
+            regressions.append(f"{report['name']} {key} {now:.1f} ms (baseline {before:.1f} ms)")
+    return regressions
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Replay interaction traces and report latency")
+    parser.add_argument("traces", nargs="+", help="Trace files")
+    parser.add_argument("--realtime", action="store_true", help="Wait between events as recorded")
+    parser.add_argument("--repeat", type=int, default=1)
+    parser.add_argument("--output", help="Write the reports to a JSON file")
+    parser.add_argument("--baseline", help="JSON file of earlier reports to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.25)
+    args = parser.parse_args(argv)
+
+    reports = []
+    for path in args.traces:
+        report = replay(path, realtime=args.realtime, repeat=args.repeat)
+        reports.append(report)
+        lat = report["latency"]
+        print(f"{report['name']}: {report['events']} events, {report['frames']} frames, "
+              f"p50 {lat['p50']:.1f} ms, p95 {lat['p95']:.1f} ms, p99 {lat['p99']:.1f} ms")
+        for stage in STAGES:
+            s = report["stages"][stage]
+            print(f"    {stage:<7} p50 {s['p50']:.1f} ms, p95 {s['p95']:.1f} ms, p99 {s['p99']:.1f} ms")
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(reports, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = {r["name"]: r for r in json.load(f)}
+        regressions = []
+        for report in reports:
+            if report["name"] in baseline:
+                regressions += compare_reports(report, baseline[report["name"]], args.tolerance)
+        for line in regressions:
+            print("Slower than baseline: " + line)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,158 @@
+"""
+Automatic indexing of large annotation tracks.
+
+Unindexed GFF3/GTF/BED/VCF files are parsed in full by GW every time they are added. For large
+annotations, indexed_track builds a bgzipped, tabix-indexed copy on first use and returns its path,
+so GW only loads the features overlapping the regions being viewed. Indexed copies are kept in a
+cache directory and are shared by every Gw instance in the process, and across processes.
+Gw.add_track only uses indexed copies when index_tracks is set, or index=True is passed.
+"""
+import hashlib
+import os
+import threading
+from typing import Dict, Optional, Tuple
+
+import pysam
+
+__all__ = ["indexed_track", "default_cache_dir", "TRACK_INDEX_MIN_SIZE"]
+
+TRACK_INDEX_MIN_SIZE = 4 * 1024 * 1024
+"""Unindexed tracks smaller than this (in bytes) are loaded directly"""
+
+# tabix preset, and the chromosome and start columns used for sorting
+TRACK_FORMATS = {
+    ".gff": ("gff", 0, 3),
+    ".gff3": ("gff", 0, 3),
+    ".gtf": ("gff", 0, 3),
+    ".bed": ("bed", 0, 1),
+    ".vcf": ("vcf", 0, 1),
+}
+
+_indexed: Dict[Tuple[str, int, int], str] = {}
+_locks: Dict[Tuple[str, int, int], threading.Lock] = {}
+_locks_lock = threading.Lock()
+
+
+def default_cache_dir() -> str:
+    """
+    The directory used to store indexed tracks. Set the GWPLOT_CACHE_DIR environment
+    variable to override the default of ~/.cache/gwplot/tracks.
+
+    Returns
+    -------
+    str
+        Cache directory path
+    """
+    cache_dir = os.environ.get("GWPLOT_CACHE_DIR")
+    if not cache_dir:
+        cache_dir = os.path.join(os.path.expanduser("~"), ".cache", "gwplot")
+    return os.path.join(cache_dir, "tracks")
+
+
+def _key_lock(key: Tuple[str, int, int]) -> threading.Lock:
+    # One lock per indexed copy, so building one index does not hold up unrelated files
+    with _locks_lock:
+        return _locks.setdefault(key, threading.Lock())
+
+
+def track_format(path: str) -> Optional[Tuple[str, int, int]]:
+    """
+    The tabix preset and sort columns for an uncompressed track file, or None if the
+    file type is not supported.
+    """
+    return TRACK_FORMATS.get(os.path.splitext(path)[1].lower())
+
+
+def _write_sorted(path: str, out_path: str, chrom_col: int, start_col: int) -> None:
+    # Header lines are kept in order at the top. Records are grouped by chromosome in
+    # order of first appearance, then sorted by start position, as required by tabix
+    header = []
+    records = []
+    chrom_order = {}
+    with open(path, "r") as f:
+        for line in f:
+            if line.startswith("##FASTA"):
+                break
+            if not line.strip():
+                continue
+            if line.startswith(("#", "track", "browser")):
+                if not records:
+                    header.append(line)
+                continue
+            fields = line.split("\t", start_col + 1)
+            if len(fields) <= start_col:
+                continue
+            chrom = fields[chrom_col]
+            if chrom not in chrom_order:
+                chrom_order[chrom] = len(chrom_order)
+            records.append((chrom_order[chrom], int(fields[start_col]), line))
+    records.sort(key=lambda r: (r[0], r[1]))
+    with open(out_path, "w") as f:
+        f.writelines(header)
+        for _, _, line in records:
+            f.write(line if line.endswith("\n") else line + "\n")
+
+
+def _build_index(path: str, out_path: str, preset: str, chrom_col: int, start_col: int) -> None:
+    # Files are written under a temporary name then moved into place, so concurrent
+    # sessions never see a partially written index
+    tmp_text = f"{out_path[:-3]}.{os.getpid()}.{threading.get_ident()}.tmp"
+    tmp_gz = tmp_text + ".gz"
+    try:
+        _write_sorted(path, tmp_text, chrom_col, start_col)
+        pysam.tabix_compress(tmp_text, tmp_gz, force=True)
+        pysam.tabix_index(tmp_gz, preset=preset, force=True, index=tmp_gz + ".tbi")
+        os.replace(tmp_gz, out_path)
+        os.replace(tmp_gz + ".tbi", out_path + ".tbi")
+    finally:
+        for p in (tmp_text, tmp_gz, tmp_gz + ".tbi"):
+            if os.path.exists(p):
+                os.remove(p)
+
+
+def indexed_track(path: str, cache_dir: Optional[str] = None,
+                  min_size: int = TRACK_INDEX_MIN_SIZE) -> str:
+    """
+    Return the path of an indexed copy of a track file, building the index on first use.
+
+    The original path is returned for compressed or unsupported files, and for files
+    smaller than min_size. Indexed copies are keyed by the file path, size and modification
+    time, so an edited file is re-indexed automatically.
+
+    Parameters
+    ----------
+    path : str
+        Path to a GFF3, GTF, BED or VCF file
+    cache_dir : str, optional
+        Directory used to store indexed copies. Defaults to default_cache_dir()
+    min_size : int, optional
+        Files smaller than this (in bytes) are not indexed
+
+    Returns
+    -------
+    str
+        Path to the track file that should be loaded
+
+    Examples
+    --------
+    >>> gw.add_track(indexed_track("genes.gff3", min_size=0))
+    """
+    fmt = track_format(path)
+    if fmt is None or not os.path.isfile(path):
+        return path
+    st = os.stat(path)
+    if st.st_size < min_size:
+        return path
+    real_path = os.path.realpath(path)
+    key = (real_path, st.st_size, st.st_mtime_ns)
+    with _key_lock(key):
+        if key in _indexed and os.path.exists(_indexed[key]):
+            return _indexed[key]
+        cache_dir = cache_dir or default_cache_dir()
+        digest = hashlib.sha1(repr(key).encode("utf-8")).hexdigest()[:16]
+        out_path = os.path.join(cache_dir, f"{digest}_{os.path.basename(path)}.gz")
+        if not (os.path.exists(out_path) and os.path.exists(out_path + ".tbi")):
+            os.makedirs(cache_dir, exist_ok=True)
+            _build_index(real_path, out_path, *fmt)
+        _indexed[key] = out_path
+        return out_path
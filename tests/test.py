@@ -1,7 +1,6 @@
-
 import unittest
 import os
-from gwplot import Gw, GwPalette
+from gwplot import Gw, GwPalette, GLFW, set_core_budget, core_budget
 import numpy as np
 import matplotlib.pyplot as plt
 from PIL import Image
@@ -65,6 +64,16 @@ class TestConstruct(unittest.TestCase):
         gw.save_png("out.png")
         print("test_run_save_png done")
 
+    def test_save_tiled_png(self):
+        g = Gw(fa, canvas_width=600, canvas_height=400)
+        g.add_bam(root + "/small.bam")
+        g.add_region("chr1", 1, 20000)
+        g.save_tiled_png("tiled.png", width=1500, height=1000, band_height=96, threads=3)
+        with Image.open("tiled.png") as img:
+            assert img.size == (1500, 1000)
+            img.load()
+        print("test_save_tiled_png done")
+
     def test_to_ndarray(self):
         arr = np.array(gw)
         assert arr.shape[0] > 0
@@ -87,6 +96,172 @@ class TestConstruct(unittest.TestCase):
         # plt.show()
         print("test_run_draw_image done")
 
+    def test_encode_vector(self):
+        import io
+        pdf = gw.encode_as_pdf()
+        assert pdf.startswith(b"%PDF")
+        svg = gw.encode_as_svg()
+        assert b"<svg" in svg
+        buf = io.BytesIO()
+        gw.save_svg(buf)
+        assert b"<svg" in buf.getvalue()
+        print("test_encode_vector done")
+
+    def test_array_track(self):
+        g = Gw(fa, canvas_width=1200, canvas_height=600)
+        g.add_region("chr1", 1, 20000)
+        starts = np.arange(0, 20000, 500)
+        g.add_array_track("chr1", starts, starts + 400, np.linspace(0, 1, len(starts)), name="scores")
+        g.add_feature_track("chr1", np.array([100, 5000]), np.array([900, 7000]),
+                            names=["a", "b"], strands=["+", "-"])
+        g.draw()
+        before = [i for i in g.items_in_rect(0, 0, 1200, 600) if i["type"] == "feature" and i["track"] == 0]
+        assert len(before) > 1 and len({i["value"] for i in before}) > 1
+        g.update_array_track(0, np.ones(len(starts))).draw()
+        # The blocks GW draws are copied from the track when drawing, so they must carry the new values
+        after = [i for i in g.items_in_rect(0, 0, 1200, 600) if i["type"] == "feature" and i["track"] == 0]
+        assert len(after) == len(before)
+        assert all(i["value"] == 1 and i["name"] == "1" for i in after)
+        self.assertRaises(ValueError, g.update_array_track, 1, np.ones(2))
+        self.assertRaises(ValueError, g.update_array_track, 0, np.ones(3))
+        g.remove_track(1)
+        assert g.snapshot()["tracks"] == []
+        print("test_array_track done")
+
+    def test_hit_test(self):
+        g = Gw(fa, canvas_width=1200, canvas_height=600)
+        g.add_bam(root + "/small.bam")
+        g.add_region("chr1", 1, 20000)
+        g.draw()
+        items = g.items_in_rect(0, 0, 1200, 600)
+        reads = [i for i in items if i["type"] == "read"]
+        assert len(reads) > 0
+        assert all(r["row"] == 0 and r["col"] == 0 for r in reads)
+        assert g.hit_test(-10, -10) is None
+        # The middle of the canvas is near position 10000; walk down it until a read is hit
+        hits = [g.hit_test(600, y) for y in range(0, 600, 2)]
+        hits = [h for h in hits if h and h["type"] == "read"]
+        assert len(hits) > 0
+        read = hits[0]
+        assert read["chrom"] == "chr1" and read["pos"] - 500 <= 10000 <= read["end"] + 500
+        assert any(r["qname"] == read["qname"] and r["pos"] == read["pos"] for r in reads)
+        g.set_canvas_size(800, 400)
+        with self.assertRaises(RuntimeError):
+            g.hit_test(600, 300)
+        g.draw()
+        assert g.hit_test(-10, -10) is None
+        g.key_press(GLFW.KEY_RIGHT, GLFW.get_key_scancode(GLFW.KEY_RIGHT), GLFW.PRESS, 0)
+        with self.assertRaises(RuntimeError):
+            g.hit_test(400, 200)
+        print("test_hit_test done")
+
+    def test_hit_test_track(self):
+        # Pixels painted by the gff3 track are found by comparing with an identical layout whose
+        # only track has nothing in view, then looked up with hit_test
+        def render(add):
+            g = Gw(fa, canvas_width=1200, canvas_height=600)
+            g.add_region("chr1", 1, 20000)
+            add(g)
+            return g, g.draw().array().copy()
+        g, img = render(lambda g: g.add_track(root + "/test.gff3"))
+        _, empty = render(lambda g: g.add_feature_track("chr1", np.array([50000]), np.array([50100])))
+        assert img.shape == empty.shape
+        x = 1200 * 7000 // 20000  # Inside the transcripts spanning 2903-10817
+        rows = np.flatnonzero(np.any(img[:, x] != empty[:, x], axis=1))
+        assert len(rows) > 0
+        hits = [g.hit_test(x, y) for y in rows]
+        features = [h for h in hits if h and h["type"] == "feature"]
+        assert len(features) > 0
+        assert all(f["chrom"] == "chr1" and f["start"] <= 7000 <= f["end"] for f in features)
+        assert g.hit_test(x, 0) is None
+        print("test_hit_test_track done")
+
+    def test_log_since(self):
+        g = Gw(fa)
+        g.add_bam(root + "/small.bam")
+        g.add_region("chr1", 1, 20000)
+        g.draw()
+        g.flush_log()
+        start = g.log_cursor
+        g.apply_command("count")
+        entries, cursor = g.log_since(start)
+        assert cursor > start and len(entries) == cursor - start
+        assert [e["seq"] for e in entries] == list(range(start, cursor))
+        assert all(e["kind"] == "message" for e in entries)
+        assert any("Total\t" in e["payload"] for e in entries)
+        assert g.flush_log() == "".join(e["text"] for e in entries)
+        assert g.log_since(cursor) == ([], cursor)
+        g.set_log_capacity(3)
+        for i in range(5):
+            g.apply_command("count")
+        entries, new_cursor = g.log_since(cursor)
+        assert len(entries) == 3 and new_cursor - cursor >= 5
+        assert [e["seq"] for e in entries] == list(range(new_cursor - 3, new_cursor))
+        print("test_log_since done")
+
+    def test_read_filter_draw(self):
+        g = Gw(fa, canvas_width=1200, canvas_height=600)
+        g.add_bam(root + "/small.bam")
+        g.add_region("chr1", 1, 20000)
+        g.apply_command("filter mapq >= 20")
+        g.set_read_filter(min_mapq=20)
+        g.draw()
+        assert len(g.fetch_stats) == 1 and g.fetch_stats[0]["reads"] > 0  # Fetched with the filter
+        reads = [i for i in g.items_in_rect(0, 0, 1200, 600) if i["type"] == "read"]
+        assert len(reads) > 0 and all(r["mapq"] >= 20 for r in reads)
+        g.clear_read_filter()
+        assert len(g.snapshot()["filters"]) == 1  # The same filter added by apply_command is kept
+        print("test_read_filter_draw done")
+
+    def test_interaction_quality(self):
+        g = Gw(fa, canvas_width=1200, canvas_height=600)
+        g.add_bam(root + "/small.bam")
+        g.add_region("chr1", 1, 20000)
+        g.set_interaction_quality(scale=0.5, settle_time=60)
+        data, scale = g.encode_frame()
+        assert scale == 1.0 and g.settle_delay is None
+        g.key_press(GLFW.KEY_RIGHT, GLFW.get_key_scancode(GLFW.KEY_RIGHT), GLFW.PRESS, 0)
+        data, scale = g.encode_frame()
+        assert scale == 0.5 and data[:2] == b"\xff\xd8"
+        assert g.settle_delay > 0 and g.settle() is None
+        g.set_interaction_quality(scale=0.5, settle_time=0)
+        assert g.settle()[:2] == b"\xff\xd8"
+        assert g.settle_delay is None
+        print("test_interaction_quality done")
+
+    def test_snapshot(self):
+        import json
+        g = Gw(fa, theme="igv", ylim=40)
+        g.add_bam(root + "/small.bam")
+        g.add_track(root + "/test.gff3")
+        g.add_region("chr1", 1, 20000)
+        g.add_region("chr1", 30000, 40000)
+        g.set_read_filter(min_mapq=10)
+        g.set_active_region_index(0)
+        state = json.loads(json.dumps(g.snapshot()))
+        g2 = Gw.from_snapshot(state)
+        assert g2.snapshot() == state
+        assert g2.ylim == 40 and g2.theme == "igv"
+        g2.draw()
+        print("test_snapshot done")
+
+    def test_adaptive_threads(self):
+        g = Gw(fa, threads="auto")
+        g.add_bam(root + "/small.bam")
+        g.add_region("chr1", 1, 20000)
+        g.draw()
+        stats = g.draw_stats
+        assert g.threads == "auto" and stats["adaptive"]
+        assert 1 <= stats["threads"] <= core_budget()["budget"]
+        assert core_budget()["in_use"] == 0
+        self.addCleanup(set_core_budget, core_budget()["budget"])  # The budget is shared by the process
+        set_core_budget(1)
+        g.load_alignments().draw()
+        assert g.draw_stats["threads"] == 1
+        g.set_threads(2).draw()
+        assert g.threads == 2 and not g.draw_stats["adaptive"]
+        print("test_adaptive_threads done")
+
     def test_set_paint(self):
         gw.set_paint_ARBG(GwPalette.NORMAL_READ, 255, 0, 0, 255)
         print("test_set_paint done")
@@ -114,6 +289,281 @@ class TestConstruct(unittest.TestCase):
     #     print(bam_itr)
     #     print("test_pysam done")
 
+class TestTrackIndex(unittest.TestCase):
+    """ Test automatic indexing of tracks"""
+    def test_indexed_track(self):
+        import tempfile
+        from gwplot.track_index import indexed_track
+        with tempfile.TemporaryDirectory() as cache_dir:
+            path = indexed_track(root + "/test.gff3", cache_dir=cache_dir, min_size=0)
+            assert path.endswith("test.gff3.gz")
+            assert os.path.exists(path + ".tbi")
+            assert indexed_track(root + "/test.gff3", cache_dir=cache_dir, min_size=0) == path
+            assert indexed_track(root + "/test.gff3", cache_dir=cache_dir) == root + "/test.gff3"
+            g = Gw(fa)
+            g.add_track(path)
+            g.add_region("chr1", 1, 20000)
+            g.draw()
+            os.environ["GWPLOT_CACHE_DIR"] = cache_dir
+            try:
+                g = Gw(fa)
+                assert not g.index_tracks
+                g.add_track(root + "/test.gff3", index=True)
+                assert g.snapshot()["tracks"] == [root + "/test.gff3"]
+                assert os.listdir(os.path.join(cache_dir, "tracks"))
+                g.add_region("chr1", 1, 20000)
+                g.draw()
+            finally:
+                del os.environ["GWPLOT_CACHE_DIR"]
+        print("test_indexed_track done")
+
+
+class TestSoak(unittest.TestCase):
+    """ Check long-running sessions for leaks. Set GWPLOT_SOAK_CYCLES to run for longer"""
+    def test_soak(self):
+        from gwplot.soak import run_soak
+        cycles = int(os.environ.get("GWPLOT_SOAK_CYCLES", 50))
+        report = run_soak(cycles=cycles, sample_every=max(1, cycles // 25))
+        assert report["growth"]["leaks"] == []
+        print("test_soak done")
+
+    def test_instances_released(self):
+        # Each Gw holds open bam and reference handles, so any instance not freed shows up as fds
+        from gwplot.soak import process_stats, check_growth
+        samples = []
+        for i in range(60):
+            g = Gw(fa, canvas_width=400, canvas_height=300)
+            g.add_bam(root + "/small.bam")
+            g.add_region("chr1", 1, 20000)
+            g.draw()
+            del g
+            if i % 3 == 0:
+                samples.append(process_stats())
+        assert check_growth(samples)["leaks"] == []
+        print("test_instances_released done")
+
+    def test_clear(self):
+        g = Gw(fa)
+        g.add_bam(root + "/small.bam")
+        g.add_track(root + "/test.gff3")
+        g.add_region("chr1", 1, 20000)
+        g.clear()
+        state = g.snapshot()
+        assert state["tracks"] == [] and state["regions"] == []
+        assert state["bams"] == [root + "/small.bam"]
+        print("test_clear done")
+
+
+class TestTrace(unittest.TestCase):
+    """ Replay canonical interaction traces and recorded sessions"""
+    def test_replay(self):
+        import glob
+        from gwplot.trace import TraceRecorder, replay
+        for path in sorted(glob.glob(root + "/traces/*.json")):
+            report = replay(path)
+            assert report["frames"] > 0
+            assert report["latency"]["p50"] <= report["latency"]["p99"]
+        g = Gw(fa, canvas_width=800, canvas_height=400)
+        g.add_bam(root + "/small.bam")
+        g.add_region("chr1", 1, 20000)
+        plot = TraceRecorder(g, name="recorded")
+        plot.apply_command("chr1:1000-3000")
+        plot.key_press(GLFW.KEY_RIGHT, GLFW.get_key_scancode(GLFW.KEY_RIGHT), GLFW.PRESS, 0)
+        plot.draw()
+        trace = plot.trace()
+        assert [e["op"] for e in trace["events"]] == ["apply_command", "key_press"]
+        report = replay(trace)
+        assert report["events"] == 2
+        print("test_replay done")
+
+
+class TestServer(unittest.TestCase):
+    """ Serve sessions from worker processes with stand-in clients"""
+    def test_session_server(self):
+        from gwplot.server import SessionServer, SessionNotFound, run_load
+        from gwplot.trace import load_trace
+        trace = load_trace(root + "/traces/scroll.json")
+        with SessionServer(workers=2, max_sessions=4, max_pending=2) as server:
+            sid = server.create_session(trace["setup"])
+            result = server.handle(sid, "key_press", GLFW.KEY_RIGHT, None, GLFW.PRESS, 0)
+            assert result["frame"][:2] == b"\xff\xd8"
+            server.close_session(sid)
+            with self.assertRaises(SessionNotFound):
+                server.handle(sid, "refresh")
+            report = run_load(server, trace, clients=6)
+            assert report["failed"] == 0 and report["frames"] > 0
+            metrics = server.metrics()
+            assert metrics["requests"] >= report["events"]
+            assert all(w["alive"] for w in metrics["workers"])
+            assert server.health()["ok"] and server.sessions == []
+        print("test_session_server done")
+
+
+class TestPysam(unittest.TestCase):
+    """ Test adding alignments from pysam"""
+    def test_pysam_copy(self):
+        if not have_pysam:
+            return
+        region = ("chr1", 1, 20000)
+        g = Gw(fa)
+        g.add_bam(root + "/small.bam")
+        g.add_region(*region)
+        af = pysam.AlignmentFile(root + "/small.bam")
+        g.add_pysam_alignments(af.fetch(*region), copy=True)
+        af.close()
+        g.draw()
+        assert g.array().shape[0] > 0
+        assert g.alignment_bytes > 0
+        g.view_region("chr1", 1, 5000)  # Drops the collection, and with it the copied reads
+        assert g.alignment_bytes == 0
+        g.clear_alignments()
+        print("test_pysam_copy done")
+
+    def test_pysam_collections(self):
+        if not have_pysam:
+            return
+        region = ("chr1", 1, 20000)
+        g = Gw(fa)
+        g.add_bam(root + "/small.bam").add_bam(root + "/small.bam")
+        g.add_region(*region)
+        af = pysam.AlignmentFile(root + "/small.bam")
+        g.add_pysam_collections([(af.fetch(*region, multiple_iterators=True), 0, i) for i in range(2)],
+                                copy=True, sort_reads_by="strand", threads=2)
+        af.close()
+        g.draw()
+        with self.assertRaises(ValueError):
+            g.add_pysam_alignments([], sort_reads_by="name")
+        print("test_pysam_collections done")
+
+    def test_read_filter(self):
+        if not have_pysam:
+            return
+        region = ("chr1", 1, 20000)
+        g = Gw(fa)
+        g.add_bam(root + "/small.bam")
+        g.add_region(*region)
+        g.apply_command("filter pos > 10")
+        g.set_read_filter(min_mapq=20, exclude_flags=1024, tags={"NM": 0})
+        assert g.read_filter.min_mapq == 20
+        assert "mapq >= 20" in g.read_filter.expressions()
+        af = pysam.AlignmentFile(root + "/small.bam")
+        g.add_pysam_alignments(af.fetch(*region), copy=True)
+        af.close()
+        g.draw()
+        g.clear_read_filter()
+        assert g.read_filter is None
+        assert any("pos > 10" in f for f in g.snapshot()["filters"])  # Filters from apply_command are kept
+        with self.assertRaises(ValueError):
+            g.set_read_filter(tags={"HPX": 1})
+        with self.assertRaises(ValueError):
+            g.set_read_filter(tags={"RG": "a or b"})
+        print("test_read_filter done")
+
+    def test_invalidate(self):
+        if not have_pysam:
+            return
+        g = Gw(fa)
+        g.add_bam(root + "/small.bam").add_bam(root + "/small.bam")
+        g.add_region("chr1", 1, 20000)
+        g.add_region("chr1", 1, 20000)
+        af = pysam.AlignmentFile(root + "/small.bam")
+        g.add_pysam_collections([(af.fetch("chr1", 1, 20000, multiple_iterators=True), c, r)
+                                 for c in range(2) for r in range(2) if (c, r) != (1, 1)], copy=True)
+        g.draw()
+        assert not g.invalidated["full"]
+        g.add_pysam_alignments(af.fetch("chr1", 1, 20000), col=1, row=1, copy=True)
+        af.close()
+        assert g.invalidated["panels"] == [(1, 1)]
+        partial = g.draw().array().copy()
+        assert g.invalidated["panels"] == []
+        full = g.invalidate().draw().array()
+        assert np.array_equal(partial, full)
+        g.invalidate(col=0).invalidate(tracks=True)
+        assert g.invalidated["regions"] == [0] and g.invalidated["tracks"]
+        with self.assertRaises(IndexError):
+            g.invalidate(col=2)
+        print("test_invalidate done")
+
+
+class TestLoadAlignments(unittest.TestCase):
+    """ Test concurrent loading of alignments from several bam files"""
+    def test_load_alignments(self):
+        g = Gw(fa)
+        for i in range(3):
+            g.add_bam(root + "/small.bam")
+        g.add_region("chr1", 1, 20000)
+        g.add_region("chr1", 10000, 11000)
+        g.load_alignments(io_threads=3, threads=2)
+        assert len(g.fetch_stats) == 6
+        assert all(s["reads"] > 0 for s in g.fetch_stats)
+        g.draw()
+        # Only the reads of the removed bam are released, the other collections still use theirs
+        loaded = g.alignment_bytes
+        g.remove_bam(2)
+        assert 0 < g.alignment_bytes < loaded
+        g.draw()
+        print("test_load_alignments done")
+
+
+class TestRenderGrid(unittest.TestCase):
+    """ Test rendering many loci onto one canvas"""
+    def test_render_grid(self):
+        g = Gw(fa, canvas_width=1200, canvas_height=800)
+        g.add_bam(root + "/small.bam")
+        g.add_region("chr1", 1, 20000)
+        regions = g.snapshot()["regions"]
+        g.render_grid(["chr1:1-5000", ("chr1", 10000, 12000), "chr1:15000-16000"], cols=2, rows=2)
+        assert g.array().shape == (800, 1200, 4)
+        assert g.snapshot()["regions"] == regions
+        pages = [p.array().copy() for p in g.iter_grid_pages(root + "/test.vcf", cols=2, rows=1)]
+        assert len(pages) > 0
+        print("test_render_grid done")
+
+
+class TestDrawProgressive(unittest.TestCase):
+    """ Test drawing a preview frame before the full-detail frame"""
+    def test_draw_progressive(self):
+        g = Gw(fa)
+        g.add_bam(root + "/small.bam")
+        g.add_region("chr1", 1, 20000)
+        frames = [f.array().copy() for f in g.draw_progressive(preview_reads=50)]
+        assert len(frames) == 2
+        assert len(list(g.draw_progressive())) == 1  # Reads are already loaded
+        full_reads = g.draw_stats["reads"]
+        g.clear_alignments()
+        frames = g.draw_progressive(preview_reads=10)
+        next(frames)
+        assert g.draw_stats["reads"] < full_reads
+        frames.close()  # The consumer stops after the preview
+        assert g.draw().draw_stats["reads"] == full_reads
+        print("test_draw_progressive done")
+
+
+class TestPdfReport(unittest.TestCase):
+    """ Test multi-page PDF reports"""
+    def test_pdf_report(self):
+        g = Gw(fa)
+        g.add_bam(root + "/small.bam")
+        with g.pdf_report("report.pdf", title="Review") as report:
+            for start in range(1, 15000, 5000):
+                report.add_page("chr1", start, start + 2000)
+            report.add_page("chr1", 15000, 16000, title="last")
+        assert report.page_count == 4
+        with open("report.pdf", "rb") as f:
+            assert f.read(5) == b"%PDF-"
+        with self.assertRaises(RuntimeError):
+            report.add_page("chr1", 1, 1000)
+        report = g.pdf_report("closed.pdf")
+        report.add_page("chr1", 1, 2000).add_page("chr1", 5000, 7000)
+        report.close()
+        report.close()  # Closing twice does nothing
+        assert report.page_count == 2
+        with open("closed.pdf", "rb") as f:
+            data = f.read()
+        assert data.startswith(b"%PDF-") and data.rstrip().endswith(b"%%EOF")
+        print("test_pdf_report done")
+
+
 def main():
     unittest.main()
 